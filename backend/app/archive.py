@@ -0,0 +1,247 @@
+# backend/app/archive.py
+"""Tiered retention for the batches collection.
+
+Three tiers:
+
+hot
+    batches younger than ``RETENTION_HOT_DAYS`` (and every batch not yet
+    anchored) stay in ``batches`` as before;
+warm
+    older anchored batches are moved, one file per (user, device, UTC day),
+    into compressed NDJSON archives under ``ARCHIVE_DIR`` (zstd when
+    ``zstandard`` is installed, gzip otherwise), each line being the full
+    batch document with its per-file source roots inline;
+summary
+    every archive file gets one document in ``batch_summaries`` with the
+    counts, time and id range, the SHA-256 of the file and a Merkle root
+    over the archived batch roots, so totals stay cheap to query and any
+    archive can be checked against its summary.
+
+The hot collection (and its indexes) is therefore bounded by the retention
+window, while the summaries grow by one small document per device per day.
+Device MMR nodes are kept, so MMR proofs of archived batches still work.
+
+Run it from cron or a systemd timer::
+
+    cd backend && python -m app.archive --hot-days 30
+"""
+import argparse
+import gzip
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId, json_util
+
+from app import compact, merkle, metrics
+from app.db import batches_collection, sources_collection, summaries_collection
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    HAS_ZSTD = False
+
+RETENTION_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", "30"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+SUMMARY_SCHEME = "v1-sha256"  # Merkle scheme of the per-archive root over batch roots
+
+archived_total = metrics.register(metrics.Counter(
+    "logchain_archived_batches_total", "Batches moved from the hot collection into archive files"))
+
+
+def _open(path, mode):
+    if path.endswith(".zst"):
+        if not HAS_ZSTD:
+            raise RuntimeError("Archive is zstd-compressed but 'zstandard' is not installed")
+        if "w" in mode:
+            return zstandard.open(path, mode, cctx=zstandard.ZstdCompressor(level=10))
+        return zstandard.open(path, mode)
+    return gzip.open(path, mode)
+
+
+def _sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def archive_path(user_id, device_id, day, part):
+    ext = ".ndjson.zst" if HAS_ZSTD else ".ndjson.gz"
+    suffix = f".{part}" if part else ""
+    return os.path.join(str(user_id), device_id or "_", f"{day}{suffix}{ext}")
+
+
+def summary_root(batch_roots):
+    return merkle.compute_merkle_root(list(batch_roots), SUMMARY_SCHEME)
+
+
+def read_archive(summary, base_dir=None):
+    """Yield the batch documents stored in ``summary``'s archive file, in order."""
+    path = os.path.join(base_dir or ARCHIVE_DIR, summary["path"])
+    with _open(path, "rt") as f:
+        for line in f:
+            if line.strip():
+                yield json_util.loads(line)
+
+
+def find_archived_batch(batch_id, user_id, base_dir=None):
+    """Look up an archived batch by ``_id``, or None.
+
+    Archive files hold one UTC day, and the day is the one in the ObjectId,
+    so only that day's summaries whose id range covers ``batch_id`` are
+    candidates (one index range, empty for days not archived yet); their
+    (small, per-device-day) files are scanned for the document.
+    """
+    batch_id = ObjectId(batch_id)
+    day = batch_id.generation_time.strftime("%Y-%m-%d")
+    candidates = summaries_collection.find(
+        {"user_id": ObjectId(user_id), "day": day, "min_id": {"$lte": batch_id}, "max_id": {"$gte": batch_id}}
+    )
+    for summary in candidates:
+        for doc in read_archive(summary, base_dir):
+            if doc["_id"] == batch_id:
+                doc["archived"] = summary["_id"]
+                return doc
+    return None
+
+
+def verify_archive(summary, base_dir=None):
+    """Recompute the file hash, batch count and root of an archive and compare with its summary."""
+    path = os.path.join(base_dir or ARCHIVE_DIR, summary["path"])
+    if not os.path.exists(path):
+        return {"file_present": False, "sha256_ok": False, "count_ok": False, "root_ok": False, "valid": False}
+    sha_ok = _sha256_file(path) == summary["sha256"]
+    try:
+        roots = [doc["merkle_root"] for doc in read_archive(summary, base_dir)]
+    except Exception:  # corrupt compression frame or JSON line
+        roots = []
+    count_ok = len(roots) == summary["count"]
+    root_ok = bool(roots) and summary_root(roots) == summary["root"]
+    return {
+        "file_present": True,
+        "sha256_ok": sha_ok,
+        "count_ok": count_ok,
+        "root_ok": root_ok,
+        "valid": sha_ok and count_ok and root_ok,
+    }
+
+
+def _write_group(user_id, device_id, day, docs, base_dir):
+    """Write one archive file plus its summary (state "pending" until the hot copies are gone)."""
+    part = summaries_collection.count_documents({"user_id": user_id, "device_id": device_id, "day": day})
+    rel = archive_path(user_id, device_id, day, part)
+    path = os.path.join(base_dir, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    ids = [d["_id"] for d in docs]
+    sources = {s["batch"]: compact.decode_sources(s["sources"]) for s in sources_collection.find({"batch": {"$in": ids}})}
+    tmp = os.path.join(os.path.dirname(path), ".tmp-" + os.path.basename(path))  # keeps the extension
+    with _open(tmp, "wt") as f:
+        for doc in docs:
+            if doc["_id"] in sources:
+                doc = dict(doc, sources=sources[doc["_id"]])
+            f.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n")
+    os.replace(tmp, path)
+
+    summary = {
+        "user_id": user_id,
+        "device_id": device_id,
+        "day": day,
+        "part": part,
+        "path": rel,
+        "sha256": _sha256_file(path),
+        "bytes": os.path.getsize(path),
+        "count": len(docs),
+        "size_total": sum(d.get("size") or 0 for d in docs),
+        "root": summary_root(d["merkle_root"] for d in docs),
+        "root_scheme": SUMMARY_SCHEME,
+        "min_id": min(ids),
+        "max_id": max(ids),
+        "first_created_at": docs[0]["created_at"],
+        "last_created_at": docs[-1]["created_at"],
+        "tx_hashes": sorted({d["tx_hash"] for d in docs if d.get("tx_hash")}),
+        "state": "pending",
+        "archived_at": datetime.utcnow(),
+    }
+    summary["_id"] = summaries_collection.insert_one(summary).inserted_id
+    return summary
+
+
+def _drop_hot(summary, base_dir):
+    """Delete the hot copies of an archive's batches and mark its summary complete."""
+    ids = [doc["_id"] for doc in read_archive(summary, base_dir)]
+    batches_collection.delete_many({"_id": {"$in": ids}})
+    sources_collection.delete_many({"batch": {"$in": ids}})
+    summaries_collection.update_one({"_id": summary["_id"]}, {"$set": {"state": "complete"}})
+    return len(ids)
+
+
+def recover(base_dir=None):
+    """Finish archives interrupted between writing the summary and deleting the hot copies."""
+    base_dir = base_dir or ARCHIVE_DIR
+    users = set()
+    for summary in summaries_collection.find({"state": "pending"}):
+        _drop_hot(summary, base_dir)
+        users.add(summary["user_id"])
+    return users
+
+
+def run(hot_days=RETENTION_HOT_DAYS, base_dir=None, now=None):
+    """Archive anchored batches older than ``hot_days``; returns a per-run report.
+
+    Works one UTC day at a time (via the ``anchored, _id`` index), so memory
+    is bounded by a single day of batches. Archive files always hold the
+    hex (v1) form of the documents, whatever ``BATCH_SCHEMA`` the hot
+    collection uses.
+    """
+    from app import cache  # imported late: the CLI should not need the API's settings
+
+    base_dir = base_dir or ARCHIVE_DIR
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=hot_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    users = recover(base_dir)
+    report = {"cutoff": cutoff.isoformat() + "Z", "archives": 0, "batches": 0, "bytes": 0}
+
+    oldest = batches_collection.find_one(
+        {"anchored": 1, "_id": {"$lt": compact.id_bound(cutoff)}}, sort=[("_id", 1)], projection={"created_at": 1}
+    )
+    day_start = compact.id_time(oldest).replace(hour=0, minute=0, second=0, microsecond=0) if oldest else cutoff
+    while day_start < cutoff:
+        day_end = day_start + timedelta(days=1)
+        groups = {}
+        for doc in batches_collection.find(
+            {"anchored": 1, "_id": {"$gte": compact.id_bound(day_start), "$lt": compact.id_bound(day_end)}}
+        ).sort("_id", 1):
+            groups.setdefault((doc["user_id"], doc.get("device_id")), []).append(compact.decode_batch(doc))
+        for (user_id, device_id), docs in groups.items():
+            summary = _write_group(user_id, device_id, day_start.strftime("%Y-%m-%d"), docs, base_dir)
+            _drop_hot(summary, base_dir)
+            users.add(user_id)
+            report["archives"] += 1
+            report["batches"] += summary["count"]
+            report["bytes"] += summary["bytes"]
+        day_start = day_end
+
+    for user_id in users:
+        cache.bump(user_id, cache.BATCHES)
+    archived_total.inc(amount=report["batches"])
+    report["users"] = len(users)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move old anchored batches into compressed archives")
+    parser.add_argument("--hot-days", type=int, default=RETENTION_HOT_DAYS, help="days of batches to keep in MongoDB")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+    report = run(args.hot_days, args.archive_dir)
+    print(f"Archived {report['batches']} batches into {report['archives']} files "
+          f"({report['bytes']} bytes, cutoff {report['cutoff']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# backend/app/cache.py
+"""Per-user data versions, ETags and a small in-process response cache.
+
+Each user document carries ``data_versions``, a counter per kind of data
+(``batches``, ``devices``) bumped by every write to that kind. Read
+endpoints derive their ETag from the versions they depend on, so a poll with
+a matching ``If-None-Match`` is answered with ``304`` after one indexed user
+lookup, and a poll with a stale ETag is usually served from the cache below
+instead of re-querying and re-serialising.
+
+Versions live in MongoDB, so several API workers agree on them; the cache is
+per process and keyed by ETag, so it can never serve data older than the
+version it was asked for. Builders whose reads may be routed to a secondary
+(see ``app.db.reads``) run in a causally consistent session started before
+the version lookup, which keeps that guarantee.
+"""
+import contextlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+from bson import ObjectId
+from fastapi import Request, Response
+
+from app import db, fastjson, metrics
+from app.db import users_collection
+
+BATCHES = "batches"
+DEVICES = "devices"
+
+
+def bump(user_id, *kinds):
+    """Increment the user's version of each of ``kinds`` after a write."""
+    users_collection.update_one(
+        {"_id": ObjectId(user_id)},
+        {"$inc": {f"data_versions.{kind}": 1 for kind in kinds}},
+    )
+
+
+def versions(user_id, session=None):
+    doc = users_collection.find_one({"_id": ObjectId(user_id)}, projection={"data_versions": 1}, session=session)
+    return (doc or {}).get("data_versions") or {}
+
+
+def make_etag(user_id, route, kinds, extra="", session=None):
+    current = versions(user_id, session)
+    key = "|".join([str(user_id), route, extra] + [f"{k}={current.get(k, 0)}" for k in kinds])
+    return 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:20] + '"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes
+    tags = [t.strip() for t in header.split(",")]
+    return etag.removeprefix("W/") in [t.removeprefix("W/") for t in tags]
+
+
+class ResponseCache:
+    """LRU of serialised JSON bodies keyed by ETag."""
+
+    def __init__(self, size=512):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            body = self._items.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag, body):
+        with self._lock:
+            self._items[etag] = body
+            self._items.move_to_end(etag)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+conditional_requests = metrics.register(metrics.Counter(
+    "logchain_conditional_requests_total", "Versioned GETs by outcome (not_modified, cache_hit, built)", ("route", "outcome")))
+
+
+def conditional_json(request: Request, user_id, kinds, build, extra="", op_class=None):
+    """Serve ``build()`` as JSON with an ETag over the user's ``kinds`` versions.
+
+    Returns ``304`` when the client already has the current representation,
+    a cached body when this process built it before, and otherwise calls
+    ``build`` and caches the result. With an ``op_class`` (``db.ANALYTICS``,
+    ``db.LISTING``) ``build`` is called as ``build(session)`` and should pass
+    the session to its ``db.reads(..., op_class)`` queries.
+    """
+    route = request.scope.get("route")
+    route = getattr(route, "path", request.url.path)
+    extra = f"{extra}|{request.url.query}"
+    with (db.read_session(op_class) if op_class else contextlib.nullcontext()) as session:
+        etag = make_etag(user_id, route, kinds, extra, session)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            conditional_requests.inc(route, "not_modified")
+            return Response(status_code=304, headers=headers)
+        body = response_cache.get(etag)
+        if body is None:
+            data = build(session) if op_class else build()
+            body = fastjson.dumps(data)
+            response_cache.put(etag, body)
+            conditional_requests.inc(route, "built")
+        else:
+            conditional_requests.inc(route, "cache_hit")
+    return Response(content=body, media_type="application/json", headers=headers)
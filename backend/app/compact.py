@@ -0,0 +1,299 @@
+# backend/app/compact.py
+"""Compact (v2) storage schema for batches, batch sources and MMR nodes.
+
+v1 documents keep 32-byte values as ``0x``-prefixed hex strings (66 bytes
+plus BSON overhead each) and a ``created_at`` that repeats the timestamp
+already inside the ObjectId ``_id``. v2 documents store:
+
+- ``merkle_root``, ``tx_hash``, source ``root`` and MMR node ``hash`` as
+  BinData(32);
+- ``ipfs_cid`` as the binary CID (CIDv0 multihash or CIDv1 bytes) when it is
+  a canonical base58btc / base32 CID, and as the original string otherwise;
+- no ``created_at`` when it falls within the second of ``_id`` (the
+  ObjectId's own resolution); an explicit one is kept.
+
+Both versions can live side by side: every read goes through
+``decode_batch`` / ``decode_sources`` (and ``MMRStore.get``), so the API keeps
+returning hex strings, and time ordering and ranges use ``_id``, which both
+versions have. ``BATCH_SCHEMA`` selects the format of new writes (set it to
+1 while older API processes are still running).
+
+Existing collections are rewritten in bulk, resumably, with::
+
+    cd backend && python -m app.compact --batch-size 1000
+
+Documents still in v1 form are found by field type, so v2 needs no version
+marker. Progress is kept per collection in the ``migrations`` collection,
+so an interrupted run continues after the last converted ``_id``.
+"""
+import argparse
+import base64
+import os
+from datetime import datetime, timedelta
+
+import bson
+from bson import Binary, ObjectId
+from pymongo import UpdateOne
+
+from app.db import batches_collection, db, mmr_nodes_collection, sources_collection
+
+BATCH_SCHEMA = int(os.getenv("BATCH_SCHEMA", "2"))
+SCHEMA_VERSION = 2
+migrations_collection = db["migrations"]
+
+_B58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def _b58decode(text):
+    num = 0
+    for char in text:
+        num = num * 58 + _B58.index(char)
+    raw = num.to_bytes((num.bit_length() + 7) // 8, "big")
+    return b"\0" * (len(text) - len(text.lstrip("1"))) + raw
+
+
+def _b58encode(data):
+    num = int.from_bytes(data, "big")
+    out = ""
+    while num:
+        num, rem = divmod(num, 58)
+        out = _B58[rem] + out
+    return "1" * (len(data) - len(data.lstrip(b"\0"))) + out
+
+
+def to_bin(value):
+    """32-byte hex (``0x``-prefixed or bare, as older anchors stored tx hashes) -> BinData(32).
+
+    Anything else is returned unchanged.
+    """
+    if isinstance(value, str):
+        digits = value[2:] if value[:2] in ("0x", "0X") else value
+        if len(digits) == 64:
+            try:
+                return Binary(bytes.fromhex(digits))
+            except ValueError:
+                pass
+    return value
+
+
+def hash_query(value):
+    """Filter matching a root or hash stored in any form (BinData, ``0x`` hex, bare hex), or None if invalid."""
+    raw = to_bin(value)
+    if not isinstance(raw, bytes):
+        return None
+    digits = raw.hex()
+    return {"$in": [raw, "0x" + digits, digits, value]}
+
+
+def to_hex(value):
+    """Inverse of ``to_bin``: bytes -> ``0x`` hex, strings and None unchanged."""
+    if isinstance(value, bytes):
+        return "0x" + value.hex()
+    return value
+
+
+def cid_to_bin(cid):
+    """Binary form of a canonical CIDv0 (``Qm...``) or base32 CIDv1 (``b...``), else the string."""
+    if not isinstance(cid, str) or not cid:
+        return cid
+    try:
+        if cid.startswith("Qm"):
+            raw = _b58decode(cid)
+        elif cid.startswith("b"):
+            raw = base64.b32decode(cid[1:].upper() + "=" * (-len(cid[1:]) % 8))
+        else:
+            return cid
+    except (ValueError, base64.binascii.Error):
+        return cid
+    return Binary(raw) if cid_to_str(raw) == cid else cid
+
+
+def cid_to_str(value):
+    if not isinstance(value, bytes):
+        return value
+    if value[:1] == b"\x12":  # sha2-256 multihash: CIDv0
+        return _b58encode(value)
+    return "b" + base64.b32encode(value).decode().lower().rstrip("=")
+
+
+def id_time(doc):
+    """Creation time of a document: ``created_at`` if stored, else its ObjectId's (naive UTC)."""
+    created_at = doc.get("created_at")
+    if isinstance(created_at, datetime):
+        return created_at
+    return doc["_id"].generation_time.replace(tzinfo=None)
+
+
+def id_bound(when):
+    """ObjectId usable as a ``$gte`` / ``$lt`` bound for documents created at ``when``."""
+    return ObjectId.from_datetime(when)
+
+
+def encode_batch(doc):
+    """v2 form of a v1 (or v2) batch document."""
+    doc = dict(doc)
+    for field in ("merkle_root", "tx_hash"):
+        if field in doc:
+            doc[field] = to_bin(doc[field])
+    if "ipfs_cid" in doc:
+        doc["ipfs_cid"] = cid_to_bin(doc["ipfs_cid"])
+    created_at = doc.get("created_at")
+    if "_id" in doc and isinstance(created_at, datetime):
+        if abs(created_at - doc["_id"].generation_time.replace(tzinfo=None)) < timedelta(seconds=1):
+            del doc["created_at"]
+    return doc
+
+
+def decode_batch(doc):
+    """API/v1 view of a batch document of either version (hex strings, ``created_at`` filled in)."""
+    if doc is None:
+        return None
+    doc = dict(doc)
+    for field in ("merkle_root", "tx_hash"):
+        if field in doc:
+            doc[field] = to_hex(doc[field])
+    if "ipfs_cid" in doc:
+        doc["ipfs_cid"] = cid_to_str(doc["ipfs_cid"])
+    if "created_at" not in doc and isinstance(doc.get("_id"), ObjectId):
+        doc["created_at"] = id_time(doc)
+    return doc
+
+
+def encode_sources(sources):
+    return [dict(s, root=to_bin(s["root"])) for s in sources]
+
+
+def decode_sources(sources):
+    return [dict(s, root=to_hex(s["root"])) for s in sources]
+
+
+def writes_v2():
+    return BATCH_SCHEMA >= SCHEMA_VERSION
+
+
+def for_write(doc):
+    """A new batch document in the configured ``BATCH_SCHEMA``."""
+    return encode_batch(doc) if writes_v2() else doc
+
+
+def hash_for_write(value):
+    """A root or tx hash to ``$set`` on a batch, in the configured ``BATCH_SCHEMA``."""
+    return to_bin(value) if writes_v2() else value
+
+
+def sources_for_write(sources):
+    return encode_sources(sources) if writes_v2() else sources
+
+
+# === Migration ===
+
+def _batch_update(doc):
+    new = encode_batch(doc)
+    changed = {k: v for k, v in new.items() if k != "_id" and (k not in doc or doc[k] != v)}
+    update = {"$set": changed} if changed else {}
+    unset = {k: "" for k in doc if k not in new}
+    if unset:
+        update["$unset"] = unset
+    return new, update
+
+
+def _sources_update(doc):
+    new = dict(doc, sources=encode_sources(doc["sources"]))
+    return new, {"$set": {"sources": new["sources"]}}
+
+
+def _node_update(doc):
+    new = dict(doc, hash=to_bin("0x" + doc["hash"]))
+    return new, {"$set": {"hash": new["hash"]}}
+
+
+# (name, collection, filter matching documents still in v1 form, converter)
+MIGRATIONS = [
+    ("batches", batches_collection, {"$or": [
+        {"merkle_root": {"$type": "string"}}, {"tx_hash": {"$type": "string"}},
+        # Only a created_at that encode_batch drops (within the second of _id); others are kept on purpose
+        {"created_at": {"$type": "date"}, "$expr": {"$lt": [
+            {"$abs": {"$subtract": ["$created_at", {"$toDate": "$_id"}]}}, 1000,
+        ]}},
+    ]}, _batch_update),
+    ("batch_sources", sources_collection, {"sources.root": {"$type": "string"}}, _sources_update),
+    ("mmr_nodes", mmr_nodes_collection, {"hash": {"$type": "string"}}, _node_update),
+]
+
+# Superseded by the (user_id, _id) / (anchored, _id) indexes once created_at is gone
+LEGACY_INDEXES = ["user_id_1_created_at_-1", "anchored_1_created_at_-1"]
+
+
+def migrate_collection(name, collection, pending, convert, batch_size=1000, dry_run=False, log=print):
+    """Convert one collection to v2 in ``_id`` order, checkpointing after every bulk write.
+
+    A run resumes an interrupted pass after its last converted ``_id``; once a
+    pass has completed, the next run starts a new one, picking up whatever
+    processes running with ``BATCH_SCHEMA=1`` wrote in the meantime.
+    """
+    state_id = f"compact-v2:{name}"
+    state = migrations_collection.find_one({"_id": state_id}) or {
+        "_id": state_id, "last_id": None, "passes": 0, "docs": 0, "bytes_before": 0, "bytes_after": 0}
+    if state.get("done"):
+        state.update(last_id=None, done=False)
+    while True:
+        query = dict(pending)
+        if state["last_id"] is not None:
+            query["_id"] = {"$gt": state["last_id"]}
+        docs = list(collection.find(query).sort("_id", 1).limit(batch_size))
+        if not docs:
+            break
+        ops = []
+        for doc in docs:
+            new, update = convert(doc)
+            if not update:
+                continue  # already v2 (e.g. converted by a concurrent writer since the query)
+            state["bytes_before"] += len(bson.encode(doc))
+            state["bytes_after"] += len(bson.encode(new))
+            # Only the converted fields are $set, so a concurrent anchor's update is kept
+            ops.append(UpdateOne({"_id": doc["_id"]}, update))
+        if ops and not dry_run:
+            collection.bulk_write(ops, ordered=False)
+        state["docs"] += len(ops)
+        state["last_id"] = docs[-1]["_id"]
+        if not dry_run:
+            migrations_collection.replace_one({"_id": state_id}, state, upsert=True)
+        log(f"{name}: {state['docs']} documents, {state['bytes_before']} -> {state['bytes_after']} bytes")
+    state["done"] = True
+    state["passes"] += 1
+    state["finished_at"] = datetime.utcnow()
+    if not dry_run:
+        migrations_collection.replace_one({"_id": state_id}, state, upsert=True)
+    return state
+
+
+def migrate(batch_size=1000, dry_run=False, drop_legacy_indexes=True, log=print):
+    """Convert every collection; returns the per-collection progress documents."""
+    report = {
+        name: migrate_collection(name, collection, pending, convert, batch_size, dry_run, log)
+        for name, collection, pending, convert in MIGRATIONS
+    }
+    if drop_legacy_indexes and not dry_run:
+        existing = set(batches_collection.index_information())
+        for index in LEGACY_INDEXES:
+            if index in existing:
+                batches_collection.drop_index(index)
+                log(f"batches: dropped index {index}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite batches, sources and MMR nodes in the compact v2 schema")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per bulk write / checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="report the size change without writing")
+    parser.add_argument("--keep-legacy-indexes", action="store_true", help="keep the created_at indexes")
+    args = parser.parse_args()
+    report = migrate(args.batch_size, args.dry_run, not args.keep_legacy_indexes)
+    for name, state in report.items():
+        saved = state["bytes_before"] - state["bytes_after"]
+        print(f"{name}: {state['docs']} documents, {saved} bytes saved "
+              f"({saved / state['bytes_before']:.0%})" if state["bytes_before"] else f"{name}: nothing to do")
+
+
+if __name__ == "__main__":
+    main()
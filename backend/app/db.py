@@ -1,31 +1,126 @@
 # backend/app/db.py
-from pymongo import MongoClient
+from pymongo import MongoClient, read_preferences
+from pymongo.read_preferences import ReadPreference
+import contextlib
 import os
 from dotenv import load_dotenv
 
+from app.metrics import MongoCommandListener
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017")
 DB_NAME = os.getenv("DB_NAME", "logchain")
 
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, event_listeners=[MongoCommandListener()])
 db = client[DB_NAME]
 
 batches_collection = db["batches"]
 users_collection = db["users"]
 devices_collection = db["devices"]
+sources_collection = db["batch_sources"]  # per-file subtree roots of each batch
+mmr_nodes_collection = db["mmr_nodes"]  # per-device Merkle Mountain Range over batch roots
+mmr_checkpoints_collection = db["mmr_checkpoints"]  # anchored MMR roots
+summaries_collection = db["batch_summaries"]  # one per archive file of old batches
+anchor_txs_collection = db["anchor_txs"]  # anchor transactions followed by app.receipts
+
+# Read routing. Writes, ownership checks and anything read back to decide a
+# write always use the primary; the two classes of heavy read below can be sent
+# to replica-set secondaries instead (any pymongo read preference mode name).
+ANALYTICS = "analytics"  # dashboard aggregates
+LISTING = "listing"  # batch/device/archive listings (with per-device totals) and exports
+READ_PREFERENCE_ANALYTICS = os.getenv("READ_PREFERENCE_ANALYTICS", "primary")
+READ_PREFERENCE_LISTING = os.getenv("READ_PREFERENCE_LISTING", "primary")
+# Secondaries lagging further than this are not read from (MongoDB's minimum is 90 s; -1 = no bound)
+MAX_STALENESS_SECONDS = int(os.getenv("MAX_STALENESS_SECONDS", "90"))
+
+_MODES = {
+    "primarypreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondarypreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest,
+}
+
+
+def read_preference(mode, max_staleness=MAX_STALENESS_SECONDS):
+    mode = mode.replace("_", "").lower()
+    if mode == "primary":
+        return ReadPreference.PRIMARY
+    if mode not in _MODES:
+        raise ValueError(f"Unknown read preference {mode!r}")
+    return _MODES[mode](max_staleness=max_staleness)
+
+
+read_preferences_by_class = {
+    ANALYTICS: read_preference(READ_PREFERENCE_ANALYTICS),
+    LISTING: read_preference(READ_PREFERENCE_LISTING),
+}
+_readers = {}
+
+
+def reads(collection, op_class):
+    """``collection`` with the read preference of ``op_class`` (the collection itself on the primary)."""
+    preference = read_preferences_by_class[op_class]
+    if preference == ReadPreference.PRIMARY:
+        return collection
+    key = (collection.name, op_class)
+    if key not in _readers:
+        _readers[key] = collection.with_options(read_preference=preference)
+    return _readers[key]
+
+
+def read_session(op_class):
+    """Causally consistent session for reads of ``op_class`` that may go to a secondary.
+
+    Reading the user's data versions on the primary inside the session and then
+    querying a secondary with it makes the secondary wait until it has applied
+    everything up to that read, so a response built there is never older than
+    the versions (and ETag) it is cached under. On the primary no session is
+    needed and ``None`` is yielded.
+    """
+    if read_preferences_by_class[op_class] == ReadPreference.PRIMARY:
+        return contextlib.nullcontext()
+    return client.start_session(causal_consistency=True)
 
 # Create indexes for better query performance
 def create_indexes():
     """Create database indexes for optimal query performance"""
     try:
-        # Index for batches: user_id + created_at (for sorting)
-        batches_collection.create_index([("user_id", 1), ("created_at", -1)])
+        # Index for batches: user_id + _id (for sorting by creation time; ObjectIds grow with it)
+        batches_collection.create_index([("user_id", 1), ("_id", -1)])
         # Index for batches: device_id (for device-specific queries)
         batches_collection.create_index([("device_id", 1)])
-        # Index for batches: anchored + created_at (for filtering anchored batches)
-        batches_collection.create_index([("anchored", 1), ("created_at", -1)])
+        # Index for a device's latest batch (duplicate root check)
+        batches_collection.create_index([("user_id", 1), ("device_id", 1), ("_id", -1)])
+        # Idempotent batch submission: one batch per client-supplied key and device
+        batches_collection.create_index(
+            [("user_id", 1), ("device_id", 1), ("idempotency_key", 1)],
+            unique=True, partialFilterExpression={"idempotency_key": {"$type": "string"}},
+        )
+        # Index for batches: anchored + _id (for filtering anchored batches by age)
+        batches_collection.create_index([("anchored", 1), ("_id", -1)])
+        # Indexes for reverse lookups (auditors start from a root, a tx hash or a block range)
+        batches_collection.create_index([("user_id", 1), ("merkle_root", 1)])
+        batches_collection.create_index(
+            [("user_id", 1), ("tx_hash", 1)], partialFilterExpression={"anchored": 1}
+        )
+        batches_collection.create_index(
+            [("user_id", 1), ("tx_block", 1), ("_id", 1)], partialFilterExpression={"anchored": 1}
+        )
+        # Index for batch sources: one document per batch
+        sources_collection.create_index([("batch", 1)], unique=True)
+        # Index for MMR nodes: one node per position per device (serialises appends)
+        mmr_nodes_collection.create_index([("user_id", 1), ("device_id", 1), ("pos", 1)], unique=True)
+        # Index for MMR checkpoints: latest checkpoint per device
+        mmr_checkpoints_collection.create_index([("user_id", 1), ("device_id", 1), ("leaf_count", -1)])
+        # Indexes for batch summaries: per device/day listing, and archived batch lookup by id range
+        summaries_collection.create_index([("user_id", 1), ("device_id", 1), ("day", 1), ("part", 1)], unique=True)
+        summaries_collection.create_index([("user_id", 1), ("day", 1), ("min_id", 1)])
+        summaries_collection.create_index([("user_id", 1), ("tx_hashes", 1)])
         
+        # Index for anchor transactions: the tracker's in-flight set
+        anchor_txs_collection.create_index([("state", 1)])
+
         # Index for devices: user_id
         devices_collection.create_index([("user_id", 1)])
         # Index for devices: user_id + device_id (for device lookup)
@@ -1,40 +1,34 @@
 # backend/app/eth.py
 import json
 import os
+import threading
 from solcx import install_solc, compile_standard
 from web3 import Web3
+from web3.exceptions import BlockNotFound, TransactionNotFound
 from web3.middleware.proof_of_authority import ExtraDataToPOAMiddleware
 from dotenv import load_dotenv
 
+from app.rpcpool import ProviderPool
+
 load_dotenv()
 
 # === Environment Setup ===
-WEB3_PROVIDER = os.getenv("WEB3_PROVIDER_URL")
+# Comma-separated RPC URLs; calls go to the fastest healthy one
+WEB3_PROVIDER_URLS = [u.strip() for u in (os.getenv("WEB3_PROVIDER_URLS") or os.getenv("WEB3_PROVIDER_URL") or "").split(",") if u.strip()]
+WEB3_HEALTH_INTERVAL = int(os.getenv("WEB3_HEALTH_INTERVAL", "15"))  # seconds between endpoint health checks
 PRIVATE_KEY = os.getenv("DEPLOYER_PRIVATE_KEY")
 PUBLIC_ADDRESS = os.getenv("DEPLOYER_ADDRESS")
 CHAIN_ID = int(os.getenv("CHAIN_ID", "11155111"))  # Sepolia default
 CONTRACT_ADDRESS_FILE = os.getenv("CONTRACT_ADDRESS_FILE", "./deployed_contract_addr.txt")
 
 # === Web3 Setup ===
-# Don't raise on import if provider is missing or unreachable. Create a lazy
-# w3 that can be checked by callers. This prevents the whole app from
-# crashing on import in environments where a provider isn't configured.
+# The pool connects lazily, so importing this module never blocks on (or
+# gives up on) a slow node; w3 is None only when no RPC URL is configured.
 w3 = None
-if WEB3_PROVIDER:
-    try:
-        _w3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER))
-        # Only keep if connected
-        if _w3.is_connected():
-            w3 = _w3
-            # Inject PoA middleware for networks that need it
-            try:
-                w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-            except Exception:
-                # If the middleware isn't available/needed, ignore
-                pass
-    except Exception:
-        # Leave w3 as None; callers should handle missing provider
-        w3 = None
+if WEB3_PROVIDER_URLS:
+    w3 = Web3(ProviderPool(WEB3_PROVIDER_URLS, health_interval=WEB3_HEALTH_INTERVAL))
+    # Inject PoA middleware for networks that need it
+    w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
 
 # === Solidity Compiler Setup ===
 SOLC_VERSION = "0.8.17"
@@ -109,30 +103,138 @@ def load_contract_instance(abi, contract_address):
     )
 
 
-def anchor_root(contract, root_hex: str, batch_id: str = "", ipfs_cid: str = ""):
+_send_lock = threading.Lock()
+
+
+def send_anchor(contract, root_hex: str, batch_id: str = "", ipfs_cid: str = ""):
     """
-    Anchor Merkle root on-chain.
-    Calls: anchor(bytes32 root, string batchId, string ipfsCid)
+    Send anchor(bytes32 root, string batchId, string ipfsCid) without waiting for it to be mined.
+    Returns the ``0x`` tx hash; ``app.receipts`` follows it to confirmation.
     """
     if w3 is None:
         raise RuntimeError("Web3 provider not configured. Cannot anchor root.")
 
     acct = w3.eth.account.from_key(PRIVATE_KEY)
-    nonce = w3.eth.get_transaction_count(acct.address)
+    # Several anchors can be in flight at once: take nonces from the pending
+    # state, one sender at a time
+    with _send_lock:
+        nonce = w3.eth.get_transaction_count(acct.address, "pending")
+        tx = contract.functions.anchor(root_hex, batch_id, ipfs_cid).build_transaction(
+            {
+                "from": acct.address,
+                "nonce": nonce,
+                "chainId": CHAIN_ID,
+            }
+        )
+        signed = acct.sign_transaction(tx)
+        tx_hash = signed.hash
+        try:
+            w3.eth.send_raw_transaction(signed.raw_transaction)
+        except Exception as e:
+            # After a timeout the pool resends to another node, which may already have this tx
+            if not _accepted_anyway(tx_hash, e):
+                raise
+            print(f"Warning: Anchor tx {tx_hash.hex()} was already accepted ({e})")
+    print(f"📤 Anchoring TX: {tx_hash.hex()}")
+    return "0x" + tx_hash.hex().removeprefix("0x")
 
-    tx = contract.functions.anchor(root_hex, batch_id, ipfs_cid).build_transaction(
-        {
-            "from": acct.address,
-            "nonce": nonce,
-            "chainId": CHAIN_ID,
-        }
-    )
 
-    signed = acct.sign_transaction(tx)
-    tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)  # ✅ fixed
-    print(f"📤 Anchoring TX: {tx_hash.hex()}")
+def _accepted_anyway(tx_hash, error):
+    """Whether a raw-tx send that raised ``error`` still left ``tx_hash`` with the network."""
+    message = str(error).lower()
+    if "already known" in message or "known transaction" in message:
+        return True
+    # "nonce too low" or a transport error: the first node may have taken exactly this tx
+    try:
+        return tx_known(tx_hash)
+    except Exception:
+        return False
+
 
+def anchor_root(contract, root_hex: str, batch_id: str = "", ipfs_cid: str = ""):
+    """
+    Anchor Merkle root on-chain and wait for the receipt (scripts; the API uses send_anchor).
+    Calls: anchor(bytes32 root, string batchId, string ipfsCid)
+    """
+    tx_hash = send_anchor(contract, root_hex, batch_id, ipfs_cid)
     receipt = w3.eth.wait_for_transaction_receipt(tx_hash, timeout=600)
     print(f"✅ Anchored in block {receipt.blockNumber}")
 
-    return tx_hash.hex(), receipt
+    return tx_hash, receipt
+
+
+# === Chain reads for the receipt tracker ===
+
+def _hex(value):
+    return "0x" + bytes(value).hex()
+
+
+def block(number="latest"):
+    """``{number, hash, parent_hash, transactions}`` of a block (tx hashes only), or None."""
+    try:
+        b = w3.eth.get_block(number)
+    except BlockNotFound:
+        return None
+    return {
+        "number": b["number"],
+        "hash": _hex(b["hash"]),
+        "parent_hash": _hex(b["parentHash"]),
+        "transactions": [_hex(t) for t in b["transactions"]],
+    }
+
+
+def receipt(tx_hash):
+    """``{status, block, block_hash}`` of a mined transaction, or None."""
+    try:
+        r = w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionNotFound:
+        return None
+    return {"status": r["status"], "block": r["blockNumber"], "block_hash": _hex(r["blockHash"])}
+
+
+def tx_known(tx_hash):
+    """Whether the node still knows the transaction (mined or in its mempool)."""
+    try:
+        w3.eth.get_transaction(tx_hash)
+        return True
+    except TransactionNotFound:
+        return False
+
+
+BATCH_ANCHORED_TOPIC = Web3.keccak(text="BatchAnchored(address,bytes32,string,string,uint256,uint256)")
+
+
+def anchored_roots(tx_hash, contract_address):
+    """Block number and ``0x`` roots of the ``BatchAnchored`` events of a mined anchor tx.
+
+    One receipt lookup instead of a scan of the contract's storage; returns
+    None when the transaction is unknown (e.g. dropped in a reorg) or reverted.
+    """
+    if w3 is None:
+        raise RuntimeError("Web3 provider not configured. Cannot fetch receipts.")
+    try:
+        receipt = w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionNotFound:
+        return None
+    if receipt.status != 1:
+        return None
+    roots = {
+        "0x" + log["topics"][2].hex().removeprefix("0x")
+        for log in receipt.logs
+        if log["address"].lower() == contract_address.lower()
+        and len(log["topics"]) == 3 and log["topics"][0] == BATCH_ANCHORED_TOPIC
+    }
+    return receipt.blockNumber, roots
+
+
+def latest_block():
+    """Number of the latest block (None without a provider)."""
+    return None if w3 is None else w3.eth.block_number
+
+
+def base_fee_gwei():
+    """Base fee of the latest block in gwei (None without a provider or on pre-London chains)."""
+    if w3 is None:
+        return None
+    fee = w3.eth.get_block("latest").get("baseFeePerGas")
+    return None if fee is None else fee / 1e9
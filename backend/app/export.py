@@ -0,0 +1,113 @@
+# backend/app/export.py
+"""Streaming export of a user's batch history.
+
+Rows come from a MongoDB cursor (with a caller-chosen ``batch_size``) and,
+optionally, from the archive files of ``app.archive``; they are encoded as
+NDJSON or CSV into chunks of about ``CHUNK_BYTES`` and optionally gzipped on
+the fly. Nothing holds more than one cursor batch plus one chunk, so memory
+stays flat however long the history is. Exports are listing reads, so they
+follow ``READ_PREFERENCE_LISTING`` (bounded by ``MAX_STALENESS_SECONDS``).
+"""
+import csv
+import io
+import zlib
+from datetime import datetime, timezone
+
+from bson import ObjectId
+
+from app import archive, compact, fastjson
+from app.db import LISTING, batches_collection, reads, summaries_collection
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def naive_utc(value):
+    """MongoDB stores naive UTC datetimes; normalise aware query parameters to match."""
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _in_range(created_at, start, end):
+    return (start is None or created_at >= start) and (end is None or created_at < end)
+
+
+def iter_batches(user_id, device_id=None, anchored=None, start=None, end=None, include_archived=False, batch_size=500,
+                 projection=None):
+    """Yield the user's batch documents oldest first: archived ones, then the hot collection (with ``projection``)."""
+    user_id = ObjectId(user_id)
+    start, end = naive_utc(start), naive_utc(end)
+    if include_archived and anchored != 0:  # archived batches are all anchored
+        query = {"user_id": user_id}
+        if device_id is not None:
+            query["device_id"] = device_id
+        if start is not None:
+            query["last_created_at"] = {"$gte": start}
+        if end is not None:
+            query["first_created_at"] = {"$lt": end}
+        for summary in reads(summaries_collection, LISTING).find(query).sort("first_created_at", 1).batch_size(batch_size):
+            for doc in archive.read_archive(summary):
+                if _in_range(doc["created_at"], start, end):
+                    yield dict(doc, archived=True)
+
+    query = {"user_id": user_id}
+    if device_id is not None:
+        query["device_id"] = device_id
+    if anchored is not None:
+        query["anchored"] = anchored
+    if start is not None or end is not None:
+        query["_id"] = {k: compact.id_bound(v) for k, v in (("$gte", start), ("$lt", end)) if v is not None}
+    for doc in reads(batches_collection, LISTING).find(query, projection).sort("_id", 1).batch_size(batch_size):
+        yield compact.decode_batch(doc)
+
+
+def ndjson_rows(rows):
+    for row in rows:
+        yield fastjson.dumps(row).decode() + "\n"
+
+
+def csv_rows(rows):
+    buf = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buf, fieldnames=list(row), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+
+
+def chunked(pieces, size=CHUNK_BYTES):
+    """Join small strings into ~``size``-byte encoded chunks."""
+    parts, length = [], 0
+    for piece in pieces:
+        parts.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield "".join(parts).encode()
+            parts, length = [], 0
+    if parts:
+        yield "".join(parts).encode()
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def stream(rows, fmt="ndjson", gzip=False):
+    """Encode serialised rows as a stream of byte chunks."""
+    pieces = csv_rows(rows) if fmt == "csv" else ndjson_rows(rows)
+    chunks = chunked(pieces)
+    return gzipped(chunks) if gzip else chunks
+
+
+def filename(fmt, gzip=False):
+    return f"batches-{datetime.utcnow():%Y%m%dT%H%M%SZ}.{fmt}" + (".gz" if gzip else "")
@@ -1,28 +1,63 @@
 # backend/app/main.py
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import os
 
-from app.db import users_collection, devices_collection, batches_collection
-from app import schemas
-from datetime import datetime, timedelta
-from app.eth import compile_contract, load_contract_instance, anchor_root
+from app.db import users_collection, devices_collection, batches_collection, sources_collection
+from app.db import mmr_nodes_collection, mmr_checkpoints_collection, summaries_collection, anchor_txs_collection
+from app.db import ANALYTICS, LISTING, reads
+from app import schemas, merkle, metrics, mmr, cache, scheduler, archive, export, compact, eth, receipts
+from app.fastjson import FastJSONResponse
+from datetime import datetime, timedelta, timezone
+from app.eth import compile_contract, load_contract_instance, send_anchor, base_fee_gwei, anchored_roots, latest_block
 from app.auth import create_access_token, hash_password, verify_password
 from app.utils import get_current_user
 
 load_dotenv()
 
-app = FastAPI(title="LogChain API")
+# Run the anchoring scheduler in this process (enable it in exactly one API worker)
+ANCHOR_SCHEDULER = os.getenv("ANCHOR_SCHEDULER", "0") == "1"
+# Follow anchor transactions to confirmation in this process; set to 0 in every API worker but one
+RECEIPT_TRACKER = os.getenv("RECEIPT_TRACKER", "1") == "1"
+# A batch or checkpoint still "sending" after this long belongs to a process that died mid-send and is released
+ANCHOR_CLAIM_TIMEOUT_S = int(os.getenv("ANCHOR_CLAIM_TIMEOUT_S", "300"))
+# Answer a batch whose root equals the device's previous one with that batch instead of storing it again
+DEDUP_CONSECUTIVE_ROOTS = os.getenv("DEDUP_CONSECUTIVE_ROOTS", "1") == "1"
+
+@asynccontextmanager
+async def lifespan(app):
+    tracking = RECEIPT_TRACKER and contract_instance is not None
+    if ANCHOR_SCHEDULER:
+        anchor_scheduler.start()
+    if tracking:
+        receipt_tracker.start()
+    yield
+    if tracking:
+        receipt_tracker.stop()
+    if ANCHOR_SCHEDULER:
+        anchor_scheduler.stop()
+
+app = FastAPI(title="LogChain API", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.register(metrics.Gauge(
+    "logchain_anchor_pending_batches", "Batches stored but not yet anchored",
+    func=lambda: batches_collection.count_documents({"anchored": 0}),
+))
 
 # === Contract Setup ===
 CONTRACT_PATH = os.path.join(os.path.dirname(__file__), "..", "contracts", "LogAnchor.sol")
@@ -44,46 +79,135 @@ def init_contract():
 
 init_contract()
 
+# === Metrics ===
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # === Utility ===
+# Fields serialize_batch reads; listings fetch only these (the BatchOut shape)
+BATCH_OUT_FIELDS = {
+    field: 1 for field in (
+        "batch_id", "device_id", "merkle_root", "merkle_scheme", "ipfs_cid", "size",
+        "source_count", "mmr_index", "anchored", "tx_hash", "tx_block", "created_at",
+    )
+}
+
 def serialize_batch(doc):
-    """Convert MongoDB document to serializable dict"""
+    """Convert a MongoDB batch document (v1 or v2 schema) to a serializable dict in the BatchOut shape"""
     created_at = doc.get("created_at")
+    if created_at is None and isinstance(doc.get("_id"), ObjectId):
+        created_at = compact.id_time(doc)
     # Convert datetime to ISO format string if it's a datetime object
     if created_at and isinstance(created_at, datetime):
         created_at = created_at.isoformat() + "Z"  # Add Z to indicate UTC
-    # Only include fields that are needed to reduce payload size
+    # Only include fields that are needed to reduce payload size; decoded in place, without copying the document
     return {
         "id": str(doc["_id"]),
         "batch_id": doc.get("batch_id"),
         "device_id": doc.get("device_id"),
-        "merkle_root": doc.get("merkle_root"),
-        "ipfs_cid": doc.get("ipfs_cid"),
+        "merkle_root": compact.to_hex(doc.get("merkle_root")),
+        "merkle_scheme": doc.get("merkle_scheme", merkle.LEGACY_SCHEME),
+        "ipfs_cid": compact.cid_to_str(doc.get("ipfs_cid")),
         "size": doc.get("size"),
+        "source_count": doc.get("source_count"),
+        "mmr_index": doc.get("mmr_index"),
         "anchored": doc.get("anchored", 0),
-        "tx_hash": doc.get("tx_hash"),
+        "tx_hash": compact.to_hex(doc.get("tx_hash")),
         "tx_block": doc.get("tx_block"),
         "created_at": created_at,
+        "archived": bool(doc.get("archived")),
     }
 
+def find_batch(batch_id, current_user, projection=None):
+    """Batch by id from the hot collection, falling back to the user's archives"""
+    doc = batches_collection.find_one({"_id": ObjectId(batch_id)}, projection=projection)
+    if doc is None:
+        doc = archive.find_archived_batch(batch_id, current_user)
+    return compact.decode_batch(doc)
+
+def duplicate_batch(doc, b, reason):
+    """Response for a submission that repeats ``doc``; a reused key with a different root is a conflict"""
+    existing = compact.decode_batch(doc)
+    if existing["merkle_root"].lower() != b.merkle_root.lower():
+        raise HTTPException(status_code=409, detail="idempotency_key already used for a different merkle_root")
+    if existing.get("device_id") and existing.get("mmr_index") is None:
+        # The first request stored the batch but failed before appending it to the device's MMR
+        append_to_mmr(existing)
+        cache.bump(existing["user_id"], cache.BATCHES)
+    metrics.batches_deduplicated.inc(reason)
+    return {**serialize_batch(existing), "deduplicated": True}
+
+def append_to_mmr(batch):
+    """Append the batch root to its device's MMR so its batches form one verifiable sequence"""
+    store = mmr.MMRStore(mmr_nodes_collection, batch["user_id"], batch["device_id"], binary=compact.writes_v2())
+    batch["mmr_index"] = store.append(batch["merkle_root"])
+    batches_collection.update_one({"_id": batch["_id"]}, {"$set": {"mmr_index": batch["mmr_index"]}})
+
 # === Routes ===
 
-@app.post("/batches", response_model=schemas.BatchOut, tags=["Batch"])
+@app.post("/batches", response_model=schemas.BatchCreated, tags=["Batch"])
 def create_batch(b: schemas.BatchCreate, current_user=Depends(get_current_user)):
+    """Store a batch; a retried idempotency_key or an unchanged root for the device returns the existing batch"""
     if not b.merkle_root.startswith("0x") or len(b.merkle_root) != 66:
         raise HTTPException(status_code=400, detail="Invalid merkle_root format")
+    scheme = b.merkle_scheme or merkle.LEGACY_SCHEME
+    if scheme not in merkle.SCHEMES:
+        raise HTTPException(status_code=400, detail=f"Unsupported merkle_scheme: {scheme}")
+    sources = None
+    if b.sources:
+        sources = merkle.sort_sources([s.model_dump() for s in b.sources])
+        try:
+            batch_root = merkle.compute_batch_root(sources, scheme)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid sources: {e}")
+        if batch_root.lower() != b.merkle_root.lower():
+            raise HTTPException(status_code=400, detail="merkle_root does not match the per-source roots")
+
+    same_key = {"user_id": ObjectId(current_user), "device_id": b.device_id, "idempotency_key": b.idempotency_key}
+    if b.idempotency_key:
+        existing = batches_collection.find_one(same_key)
+        if existing is not None:
+            return duplicate_batch(existing, b, "idempotency_key")
+    if b.device_id and DEDUP_CONSECUTIVE_ROOTS:
+        # Unchanged logs re-sent (e.g. after an agent restart) hash to the device's last root
+        last = batches_collection.find_one(
+            {"user_id": ObjectId(current_user), "device_id": b.device_id}, sort=[("_id", -1)]
+        )
+        if last is not None and compact.to_hex(last["merkle_root"]).lower() == b.merkle_root.lower():
+            return duplicate_batch(last, b, "same_root")
 
     batch_doc = {
+        "_id": ObjectId(),
         "batch_id": b.batch_id,
         "device_id": b.device_id,
         "merkle_root": b.merkle_root,
+        "merkle_scheme": scheme,
         "ipfs_cid": b.ipfs_cid,
         "size": b.size,
         "anchored": 0,
         "user_id": ObjectId(current_user),
         "created_at": datetime.utcnow(),
     }
-    result = batches_collection.insert_one(batch_doc)
-    batch_doc["_id"] = result.inserted_id
+    if sources:
+        batch_doc["source_count"] = len(sources)
+    if b.idempotency_key:
+        batch_doc["idempotency_key"] = b.idempotency_key
+    try:
+        result = batches_collection.insert_one(compact.for_write(batch_doc))
+    except DuplicateKeyError:
+        # A concurrent retry with the same key got there first
+        return duplicate_batch(batches_collection.find_one(same_key), b, "idempotency_key")
+    if sources:
+        # Kept out of the batch document so listings never load them
+        sources_collection.insert_one(
+            {"batch": result.inserted_id, "user_id": ObjectId(current_user), "sources": compact.sources_for_write(sources)}
+        )
+    if b.device_id:
+        # If this fails the batch stays stored without mmr_index; the client's retry completes it
+        append_to_mmr(batch_doc)
+    cache.bump(current_user, cache.BATCHES)
     return serialize_batch(batch_doc)
 
 
@@ -92,7 +216,7 @@ def anchor_batch(batch_id: str, current_user=Depends(get_current_user)):
     if contract_instance is None:
         raise HTTPException(status_code=500, detail="Contract not configured or deployed")
 
-    batch = batches_collection.find_one({"_id": ObjectId(batch_id)})
+    batch = compact.decode_batch(batches_collection.find_one({"_id": ObjectId(batch_id)}))
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     # Verify batch belongs to current user
@@ -101,37 +225,213 @@ def anchor_batch(batch_id: str, current_user=Depends(get_current_user)):
     if batch.get("anchored") == 1:
         return {"status": "already anchored", "tx_hash": batch.get("tx_hash")}
 
+    if batch.get("anchor_state") == "sending":
+        release_stale_claims({"_id": ObjectId(batch_id)}, checkpoints=False)
+    # Claim the batch so concurrent requests (or the scheduler) don't send a second tx for it
+    claimed = batches_collection.update_one(
+        {"_id": ObjectId(batch_id), "anchored": 0, "anchor_state": {"$exists": False}},
+        {"$set": {"anchor_state": "sending", "sending_since": datetime.utcnow()}},
+    )
+    if not claimed.modified_count:
+        return {"status": batch.get("anchor_state") or "already anchored", "tx_hash": batch.get("tx_hash")}
     try:
-        tx_hash, receipt = anchor_root(contract_instance, batch["merkle_root"], batch.get("batch_id") or "", batch.get("ipfs_cid") or "")
-        batches_collection.update_one(
-            {"_id": ObjectId(batch_id)},
-            {"$set": {"anchored": 1, "tx_hash": tx_hash, "tx_block": receipt.blockNumber}}
-        )
-        return {"status": "anchored", "tx_hash": tx_hash, "blockNumber": receipt.blockNumber}
+        tx_hash = send_anchor(contract_instance, batch["merkle_root"], batch.get("batch_id") or "", batch.get("ipfs_cid") or "")
     except Exception as e:
+        batches_collection.update_one({"_id": ObjectId(batch_id)}, {"$unset": {"anchor_state": "", "sending_since": ""}})
+        metrics.anchors_total.inc("error")
         raise HTTPException(status_code=500, detail=str(e))
+    batches_collection.update_one(
+        {"_id": ObjectId(batch_id)},
+        {"$set": {"tx_hash": compact.hash_for_write(tx_hash), "anchor_state": "submitted"}, "$unset": {"sending_since": ""}}
+    )
+    track_anchor_tx(tx_hash, current_user, batch=ObjectId(batch_id))
+    cache.bump(current_user, cache.BATCHES)
+    metrics.anchors_total.inc("submitted")
+    # The receipt tracker marks the batch anchored once the tx has ANCHOR_CONFIRMATIONS blocks
+    return {"status": "submitted", "tx_hash": tx_hash}
 
 
 @app.get("/batches", response_model=list[schemas.BatchOut], tags=["Batch"])
-def list_batches(current_user=Depends(get_current_user), limit: int = 1000):
-    # Limit results to prevent large payloads, sort by created_at descending
-    docs = batches_collection.find({"user_id": ObjectId(current_user)}).sort("created_at", -1).limit(limit)
-    return [serialize_batch(d) for d in docs]
+def list_batches(request: Request, current_user=Depends(get_current_user), limit: int = 1000):
+    def build(session):
+        # Limit results to prevent large payloads, newest first (ObjectIds grow with creation time)
+        docs = reads(batches_collection, LISTING).find({"user_id": ObjectId(current_user)}, BATCH_OUT_FIELDS, session=session)
+        return [serialize_batch(d) for d in docs.sort("_id", -1).limit(limit)]
+    return cache.conditional_json(request, current_user, [cache.BATCHES], build, op_class=LISTING)
+
+@app.get("/batches/export", tags=["Batch"])
+def export_batches(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = False,
+    device_id: str = None,
+    anchored: int = Query(None, ge=0, le=1),
+    start: datetime = None,
+    end: datetime = None,
+    include_archived: bool = False,
+    batch_size: int = Query(500, ge=1, le=10000),
+    current_user=Depends(get_current_user),
+):
+    """Stream the full batch history, oldest first, as NDJSON or CSV (optionally gzipped)"""
+    docs = export.iter_batches(current_user, device_id, anchored, start, end, include_archived, batch_size, BATCH_OUT_FIELDS)
+    rows = (serialize_batch(d) for d in docs)
+    media_type = "application/gzip" if gzip else export.FORMATS[format]
+    return StreamingResponse(
+        export.stream(rows, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(format, gzip)}"'},
+    )
+
+# === LOOKUP ROUTES ===
+# Reverse lookups for auditors, always scoped to the caller's batches and served
+# from the (user_id, merkle_root / tx_hash / tx_block) indexes. Results are paged
+# with ?after= (the previous page's "next") so a checkpoint covering thousands of
+# batches never comes back in one response.
+
+LOOKUP_MAX_LIMIT = 1000
+
+LOOKUP_FIELDS = {**BATCH_OUT_FIELDS, "user_id": 1, "mmr_checkpoint": 1}
+
+def lookup_page(query, sort, limit, cursor_of):
+    docs = list(batches_collection.find(query, LOOKUP_FIELDS).sort(sort).limit(limit + 1))
+    more = len(docs) > limit
+    docs = docs[:limit]
+    return docs, (cursor_of(docs[-1]) if more else None)
+
+def verification_status(docs, verify):
+    """Stored anchoring state of each batch and, with ``verify``, its anchor tx checked on-chain.
+
+    On-chain checks read one receipt per distinct tx hash (MMR checkpoints
+    anchor many batches in one tx) instead of scanning the contract.
+    """
+    if verify and contract_instance is None:
+        raise HTTPException(status_code=500, detail="Contract not configured or deployed")
+    checkpoints, receipts = {}, {}
+    head = latest_block() if verify else None
+    results = []
+    for doc in docs:
+        batch = serialize_batch(doc)
+        status = {"anchored": bool(batch["anchored"]), "mmr_root": None}
+        if doc.get("mmr_checkpoint"):
+            key = (doc.get("device_id"), doc["mmr_checkpoint"])
+            if key not in checkpoints:
+                checkpoints[key] = mmr_checkpoints_collection.find_one(
+                    {"user_id": doc["user_id"], "device_id": key[0], "leaf_count": key[1]}, projection={"root": 1}
+                )
+            status["mmr_root"] = checkpoints[key]["root"] if checkpoints[key] else None
+        if verify and batch["tx_hash"]:
+            if batch["tx_hash"] not in receipts:
+                receipts[batch["tx_hash"]] = anchored_roots(batch["tx_hash"], contract_instance.address)
+            found = receipts[batch["tx_hash"]]
+            roots = {batch["merkle_root"].lower(), (status["mmr_root"] or "").lower()}
+            status["anchored_onchain"] = bool(found and roots & found[1])
+            status["onchain_block"] = found[0] if found else None
+            status["confirmations"] = head - found[0] + 1 if found and head is not None else None
+        results.append({**batch, "verification": status})
+    return results
+
+@app.get("/batches/by-root/{root}", tags=["Lookup"])
+def lookup_by_root(
+    root: str,
+    verify: bool = False,
+    limit: int = Query(100, ge=1, le=LOOKUP_MAX_LIMIT),
+    after: str = None,
+    current_user=Depends(get_current_user),
+):
+    """The caller's batches with this Merkle root, with their verification status"""
+    match = compact.hash_query(root)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Invalid merkle_root format")
+    query = {"user_id": ObjectId(current_user), "merkle_root": match}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    docs, cursor = lookup_page(query, [("_id", 1)], limit, lambda d: str(d["_id"]))
+    return FastJSONResponse({"batches": verification_status(docs, verify), "next": cursor})
+
+@app.get("/batches/by-tx/{tx_hash}", tags=["Lookup"])
+def lookup_by_tx(
+    tx_hash: str,
+    verify: bool = False,
+    include_archived: bool = False,
+    limit: int = Query(100, ge=1, le=LOOKUP_MAX_LIMIT),
+    after: str = None,
+    current_user=Depends(get_current_user),
+):
+    """The caller's batches anchored by this transaction (a single batch or a whole MMR checkpoint)"""
+    match = compact.hash_query(tx_hash)
+    if match is None:
+        raise HTTPException(status_code=400, detail="Invalid tx hash format")
+    query = {"user_id": ObjectId(current_user), "anchored": 1, "tx_hash": match}
+    if after:
+        query["_id"] = {"$gt": ObjectId(after)}
+    if not include_archived:
+        docs, cursor = lookup_page(query, [("_id", 1)], limit, lambda d: str(d["_id"]))
+        return FastJSONResponse({"batches": verification_status(docs, verify), "next": cursor})
+
+    # One _id-ordered page over both tiers: the first limit + 1 hot matches, merged with the archived ones
+    docs = list(batches_collection.find(query, LOOKUP_FIELDS).sort("_id", 1).limit(limit + 1))
+    hot_ids = {d["_id"] for d in docs}
+    # Archive summaries list their tx hashes and id range, so only files with matches past the cursor are read
+    hex_forms = [v for v in match["$in"] if isinstance(v, str)]
+    summaries = {"user_id": ObjectId(current_user), "tx_hashes": {"$in": hex_forms}}
+    if after:
+        summaries["max_id"] = {"$gt": ObjectId(after)}
+    for summary in summaries_collection.find(summaries):
+        docs.extend(
+            dict(d, archived=summary["_id"]) for d in archive.read_archive(summary)
+            if d.get("tx_hash") in hex_forms and d["_id"] not in hot_ids and (not after or d["_id"] > ObjectId(after))
+        )
+    docs.sort(key=lambda d: d["_id"])
+    cursor = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    docs = docs[:limit]
+    return FastJSONResponse({"batches": verification_status(docs, verify), "next": cursor})
+
+@app.get("/batches/by-block", tags=["Lookup"])
+def lookup_by_block(
+    from_block: int = Query(..., ge=0),
+    to_block: int = Query(None, ge=0),
+    verify: bool = False,
+    limit: int = Query(100, ge=1, le=LOOKUP_MAX_LIMIT),
+    after: str = None,
+    current_user=Depends(get_current_user),
+):
+    """The caller's batches anchored in blocks from_block..to_block (inclusive), in chain order"""
+    to_block = from_block if to_block is None else to_block
+    if to_block < from_block:
+        raise HTTPException(status_code=400, detail="to_block must not be below from_block")
+    query = {"user_id": ObjectId(current_user), "anchored": 1, "tx_block": {"$gte": from_block, "$lte": to_block}}
+    if after:
+        block, _, last_id = after.partition(":")
+        query["$or"] = [
+            {"tx_block": {"$gt": int(block)}},
+            {"tx_block": int(block), "_id": {"$gt": ObjectId(last_id)}},
+        ]
+    docs, cursor = lookup_page(query, [("tx_block", 1), ("_id", 1)], limit, lambda d: f"{d['tx_block']}:{d['_id']}")
+    return FastJSONResponse({"batches": verification_status(docs, verify), "next": cursor})
 
 @app.get("/dashboard/stats", tags=["Dashboard"])
-def dashboard_stats(current_user=Depends(get_current_user)):
+def dashboard_stats(request: Request, current_user=Depends(get_current_user)):
     """Optimized endpoint for dashboard - returns aggregated stats and recent batches only"""
+    # Online counts depend on the clock as well as the data, so the ETag also rolls over every minute
+    minute = int(datetime.utcnow().timestamp() // 60)
+    return cache.conditional_json(
+        request, current_user, [cache.BATCHES, cache.DEVICES],
+        lambda session: build_dashboard_stats(current_user, session), extra=str(minute), op_class=ANALYTICS,
+    )
+
+def build_dashboard_stats(current_user, session=None):
     user_id = ObjectId(current_user)
+    batches = reads(batches_collection, ANALYTICS)
+    devices = reads(devices_collection, ANALYTICS)
     
     # Use aggregation pipeline to get all batch stats in ONE query (much faster)
-    batch_stats = list(batches_collection.aggregate([
+    batch_stats = list(batches.aggregate([
         {"$match": {"user_id": user_id}},
         {"$group": {
             "_id": None,
             "totalBatches": {"$sum": 1},
             "anchoredBatches": {"$sum": {"$cond": [{"$eq": ["$anchored", 1]}, 1, 0]}},
         }}
-    ]))
+    ], session=session))
     
     if batch_stats:
         stats_result = batch_stats[0]
@@ -142,31 +442,43 @@ def dashboard_stats(current_user=Depends(get_current_user)):
         total_batches = 0
         anchored_batches = 0
         pending_batches = 0
+
+    # Archived batches (all anchored) are counted from their summaries
+    archived_stats = list(reads(summaries_collection, ANALYTICS).aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "batches": {"$sum": "$count"}}}
+    ], session=session))
+    if archived_stats:
+        total_batches += archived_stats[0]["batches"]
+        anchored_batches += archived_stats[0]["batches"]
     
     # Get total devices count (indexed query)
-    total_devices = devices_collection.count_documents({"user_id": user_id})
+    total_devices = devices.count_documents({"user_id": user_id}, session=session)
     
     # Get online devices count (last_seen within 6 minutes) - use indexed query
     six_min_ago = datetime.utcnow() - timedelta(minutes=6)
-    online_devices = devices_collection.count_documents({
+    online_devices = devices.count_documents({
         "user_id": user_id,
         "last_seen": {"$gte": six_min_ago}
-    })
+    }, session=session)
     
     # Get most recent anchored batch and recent batches in parallel
     # Use find_one with index for fast lookup
-    last_anchored_batch = batches_collection.find_one(
+    last_anchored_batch = batches.find_one(
         {"user_id": user_id, "anchored": 1, "tx_hash": {"$ne": None}},
-        sort=[("created_at", -1)],
-        projection={"batch_id": 1, "created_at": 1, "_id": 0}
+        sort=[("_id", -1)],
+        projection={"batch_id": 1, "created_at": 1},
+        session=session,
     )
+    last_anchored_batch = compact.decode_batch(last_anchored_batch)
     
     # Get only recent batches for activity feed (last 10) - already indexed
-    recent_batches = batches_collection.find(
+    recent_batches = batches.find(
         {"user_id": user_id},
-        sort=[("created_at", -1)],
+        sort=[("_id", -1)],
         limit=10,
-        projection={"batch_id": 1, "device_id": 1, "merkle_root": 1, "anchored": 1, "tx_hash": 1, "created_at": 1, "size": 1, "ipfs_cid": 1, "_id": 1}
+        projection={"batch_id": 1, "device_id": 1, "merkle_root": 1, "merkle_scheme": 1, "anchored": 1, "tx_hash": 1, "created_at": 1, "size": 1, "ipfs_cid": 1, "_id": 1},
+        session=session,
     )
     
     recent_batches_list = []
@@ -191,7 +503,7 @@ def dashboard_stats(current_user=Depends(get_current_user)):
 
 @app.get("/batches/{batch_id}", response_model=schemas.BatchOut, tags=["Batch"])
 def get_batch(batch_id: str, current_user=Depends(get_current_user)):
-    doc = batches_collection.find_one({"_id": ObjectId(batch_id)})
+    doc = find_batch(batch_id, current_user)
     if not doc:
         raise HTTPException(status_code=404, detail="Batch not found")
     # Verify batch belongs to current user
@@ -220,7 +532,7 @@ def verify_batch(batch_id: str, current_user=Depends(get_current_user)):
     if contract_instance is None:
         raise HTTPException(status_code=500, detail="Contract not configured or deployed")
 
-    batch = batches_collection.find_one({"_id": ObjectId(batch_id)})
+    batch = find_batch(batch_id, current_user)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     # Verify batch belongs to current user
@@ -231,6 +543,15 @@ def verify_batch(batch_id: str, current_user=Depends(get_current_user)):
     if not root_hex:
         raise HTTPException(status_code=400, detail="Batch missing merkle_root")
 
+    # Batches anchored through a device MMR checkpoint are on-chain via the checkpoint root
+    mmr_root = None
+    if batch.get("mmr_checkpoint"):
+        checkpoint = mmr_checkpoints_collection.find_one(
+            {"user_id": batch["user_id"], "device_id": batch.get("device_id"), "leaf_count": batch["mmr_checkpoint"]}
+        )
+        mmr_root = checkpoint["root"] if checkpoint else None
+    targets = {root_hex.lower()} | ({mmr_root.lower()} if mmr_root else set())
+
     try:
         total = contract_instance.functions.totalBatches().call()
         anchored_onchain = False
@@ -245,7 +566,7 @@ def verify_batch(batch_id: str, current_user=Depends(get_current_user)):
             # convert bytes32 → 0x-prefixed hex string
             onchain_hex = "0x" + onchain_root.hex().lower()
 
-            if onchain_hex == root_hex.lower():
+            if onchain_hex in targets:
                 anchored_onchain = True
                 found_index = i
                 break
@@ -257,12 +578,522 @@ def verify_batch(batch_id: str, current_user=Depends(get_current_user)):
             "db_anchored_flag": batch.get("anchored", 0),
             "tx_hash": batch.get("tx_hash"),
             "tx_block": batch.get("tx_block"),
+            "mmr_root": mmr_root,
             "found_index": found_index
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def get_batch_sources(batch):
+    if "sources" in batch:  # archived batches carry their sources inline
+        return batch["sources"]
+    doc = sources_collection.find_one({"batch": batch["_id"]}, projection={"sources": 1})
+    return compact.decode_sources(doc["sources"]) if doc else []
+
+@app.get("/batches/{batch_id}/sources", tags=["Batch"])
+def list_batch_sources(batch_id: str, path: str = None, current_user=Depends(get_current_user)):
+    """Per-file roots of a batch; with ?path=, that file's entry plus its inclusion proof under the batch root"""
+    batch = find_batch(batch_id, current_user, projection={"user_id": 1, "merkle_root": 1, "merkle_scheme": 1})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Verify batch belongs to current user
+    if batch.get("user_id") != ObjectId(current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    sources = get_batch_sources(batch)
+    scheme = batch.get("merkle_scheme", merkle.LEGACY_SCHEME)
+    if path is None:
+        return {"merkle_root": batch["merkle_root"], "merkle_scheme": scheme, "sources": sources}
+    source = next((s for s in sources if s["path"] == path), None)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Source not found in batch")
+    return {
+        "merkle_root": batch["merkle_root"],
+        "merkle_scheme": scheme,
+        "source": source,
+        "proof": merkle.source_proof(sources, path, scheme),
+    }
+
+@app.post("/batches/{batch_id}/proof/verify", tags=["Batch"])
+def verify_line_proof(batch_id: str, body: schemas.ProofVerify, current_user=Depends(get_current_user)):
+    """Check a single log line's inclusion proof against the batch root, using the batch's Merkle scheme"""
+    batch = find_batch(batch_id, current_user)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Verify batch belongs to current user
+    if batch.get("user_id") != ObjectId(current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    scheme = batch.get("merkle_scheme", merkle.LEGACY_SCHEME)
+    try:
+        if body.path is None:
+            valid = merkle.verify_proof(body.line, body.proof, batch["merkle_root"], scheme)
+        else:
+            # Line -> file root, then file -> batch root
+            sources = get_batch_sources(batch)
+            source = next((s for s in sources if s["path"] == body.path), None)
+            if source is None:
+                raise HTTPException(status_code=404, detail="Source not found in batch")
+            valid = merkle.verify_proof(body.line, body.proof, source["root"], scheme) and merkle.verify_source_proof(
+                source["path"], source["root"], source["lines"],
+                merkle.source_proof(sources, source["path"], scheme), batch["merkle_root"], scheme,
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "batch_id": batch.get("batch_id"),
+        "merkle_root": batch.get("merkle_root"),
+        "merkle_scheme": scheme,
+        "valid": valid,
+    }
+
+
+# === ARCHIVE ROUTES ===
+
+def serialize_summary(doc):
+    return {
+        "id": str(doc["_id"]),
+        "device_id": doc.get("device_id"),
+        "day": doc["day"],
+        "part": doc.get("part", 0),
+        "count": doc["count"],
+        "size_total": doc.get("size_total"),
+        "root": doc["root"],
+        "root_scheme": doc.get("root_scheme"),
+        "sha256": doc["sha256"],
+        "bytes": doc.get("bytes"),
+        "first_created_at": doc["first_created_at"].isoformat() + "Z",
+        "last_created_at": doc["last_created_at"].isoformat() + "Z",
+        "tx_hashes": doc.get("tx_hashes", []),
+    }
+
+def get_summary(summary_id, current_user):
+    summary = summaries_collection.find_one({"_id": ObjectId(summary_id)})
+    if not summary:
+        raise HTTPException(status_code=404, detail="Archive not found")
+    # Verify archive belongs to current user
+    if summary.get("user_id") != ObjectId(current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+    return summary
+
+@app.get("/archives", tags=["Archive"])
+def list_archives(device_id: str = None, start: str = None, end: str = None, current_user=Depends(get_current_user)):
+    """Summaries of archived batches, one per device and day (filter days with ?start=&end=, YYYY-MM-DD)"""
+    query = {"user_id": ObjectId(current_user)}
+    if device_id is not None:
+        query["device_id"] = device_id
+    if start or end:
+        query["day"] = {k: v for k, v in (("$gte", start), ("$lte", end)) if v}
+    docs = reads(summaries_collection, LISTING).find(query).sort([("day", -1), ("device_id", 1), ("part", 1)])
+    return [serialize_summary(d) for d in docs]
+
+@app.get("/archives/{summary_id}/batches", response_model=list[schemas.BatchOut], tags=["Archive"])
+def list_archived_batches(summary_id: str, current_user=Depends(get_current_user)):
+    """Restore the batches of one archive file"""
+    summary = get_summary(summary_id, current_user)
+    try:
+        return FastJSONResponse([serialize_batch(dict(d, archived=True)) for d in archive.read_archive(summary)])
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="Archive file missing")
+
+@app.get("/archives/{summary_id}/verify", tags=["Archive"])
+def verify_archive(summary_id: str, current_user=Depends(get_current_user)):
+    """Check an archive file against its summary: file hash, batch count and root over the batch roots"""
+    summary = get_summary(summary_id, current_user)
+    return {**serialize_summary(summary), **archive.verify_archive(summary)}
+
+
+# === DEVICE MMR ROUTES ===
+
+def serialize_checkpoint(doc):
+    if not doc:
+        return None
+    created_at = doc.get("created_at")
+    if created_at and isinstance(created_at, datetime):
+        created_at = created_at.isoformat() + "Z"
+    return {
+        "leaf_count": doc["leaf_count"],
+        "root": doc["root"],
+        "tx_hash": doc.get("tx_hash"),
+        "tx_block": doc.get("tx_block"),
+        "state": doc.get("state", "confirmed"),
+        "created_at": created_at,
+    }
+
+def latest_checkpoint(current_user, device_id, min_leaf_count=0):
+    return mmr_checkpoints_collection.find_one(
+        {"user_id": ObjectId(current_user), "device_id": device_id, "leaf_count": {"$gte": min_leaf_count}},
+        sort=[("leaf_count", -1)],
+    )
+
+def device_mmr(current_user, device_id):
+    store = mmr.MMRStore(mmr_nodes_collection, ObjectId(current_user), device_id, binary=compact.writes_v2())
+    leaf_count = store.leaf_count()
+    if not leaf_count:
+        raise HTTPException(status_code=404, detail="No batches recorded for this device")
+    return store, leaf_count
+
+@app.get("/devices/{device_id}/mmr", tags=["Device"])
+def get_device_mmr(device_id: str, current_user=Depends(get_current_user)):
+    """Current MMR root and peaks over the device's batch roots, plus the last anchored checkpoint"""
+    store, leaf_count = device_mmr(current_user, device_id)
+    root, peaks = store.root(leaf_count)
+    return {
+        "device_id": device_id,
+        "scheme": mmr.SCHEME,
+        "leaf_count": leaf_count,
+        "root": root,
+        "peaks": peaks,
+        "checkpoint": serialize_checkpoint(latest_checkpoint(current_user, device_id)),
+    }
+
+@app.post("/devices/{device_id}/mmr/anchor", tags=["Device"])
+def anchor_device_mmr(device_id: str, current_user=Depends(get_current_user)):
+    """Anchor the device's current MMR root; covers every batch appended since the last checkpoint"""
+    if contract_instance is None:
+        raise HTTPException(status_code=500, detail="Contract not configured or deployed")
+    store, leaf_count = device_mmr(current_user, device_id)
+    return anchor_mmr_checkpoint(current_user, device_id, store, leaf_count)
+
+def anchor_mmr_checkpoint(current_user, device_id, store, leaf_count):
+    """Anchor the MMR root at ``leaf_count`` leaves for the batches below it not already in a tx"""
+    release_stale_claims({"user_id": ObjectId(current_user), "device_id": device_id})
+    last = latest_checkpoint(current_user, device_id)
+    if last and last["leaf_count"] >= leaf_count:
+        return {"status": "already anchored" if last.get("state", "confirmed") == "confirmed" else last["state"],
+                "checkpoint": serialize_checkpoint(last)}
+
+    root, _peaks = store.root(leaf_count)
+    # Record the checkpoint and claim its batches before sending: if this process dies
+    # mid-send, release_stale_claims() hands them back after ANCHOR_CLAIM_TIMEOUT_S
+    now = datetime.utcnow()
+    checkpoint = {
+        "user_id": ObjectId(current_user),
+        "device_id": device_id,
+        "leaf_count": leaf_count,
+        "root": root,
+        "tx_hash": None,
+        "tx_block": None,
+        "state": "sending",
+        "sending_since": now,
+        "created_at": now,
+    }
+    mmr_checkpoints_collection.insert_one(checkpoint)
+    # Batches under this checkpoint (and not already in another in-flight tx) count as anchored once it confirms
+    covered = {"user_id": ObjectId(current_user), "device_id": device_id, "anchored": 0,
+               "anchor_state": {"$exists": False}, "mmr_index": {"$lt": leaf_count}}
+    result = batches_collection.update_many(
+        covered, {"$set": {"anchor_state": "sending", "sending_since": now, "mmr_checkpoint": leaf_count}},
+    )
+    claimed = {"user_id": ObjectId(current_user), "device_id": device_id, "anchor_state": "sending", "mmr_checkpoint": leaf_count}
+    try:
+        tx_hash = send_anchor(contract_instance, root, f"mmr:{device_id}:{leaf_count}", "")
+    except Exception as e:
+        mmr_checkpoints_collection.delete_one({"_id": checkpoint["_id"]})
+        batches_collection.update_many(claimed, {"$unset": {"anchor_state": "", "sending_since": "", "mmr_checkpoint": ""}})
+        metrics.anchors_total.inc("error")
+        raise HTTPException(status_code=500, detail=str(e))
+    metrics.anchors_total.inc("submitted")
+
+    checkpoint.update(tx_hash=tx_hash, state="submitted")
+    del checkpoint["sending_since"]
+    mmr_checkpoints_collection.update_one(
+        {"_id": checkpoint["_id"]}, {"$set": {"tx_hash": tx_hash, "state": "submitted"}, "$unset": {"sending_since": ""}},
+    )
+    batches_collection.update_many(
+        claimed,
+        {"$set": {"tx_hash": compact.hash_for_write(tx_hash), "anchor_state": "submitted"}, "$unset": {"sending_since": ""}},
+    )
+    track_anchor_tx(tx_hash, current_user, checkpoint=checkpoint["_id"])
+    cache.bump(current_user, cache.BATCHES)
+    return {"status": "submitted", "checkpoint": serialize_checkpoint(checkpoint), "batches_covered": result.modified_count}
+
+@app.get("/devices/{device_id}/mmr/consistency", tags=["Device"])
+def device_mmr_consistency(device_id: str, old: int, new: int = None, current_user=Depends(get_current_user)):
+    """Proof that the device's MMR at ``new`` leaves extends the one at ``old`` leaves (no batch dropped or reordered)"""
+    store, leaf_count = device_mmr(current_user, device_id)
+    new = leaf_count if new is None else new
+    if not 0 < old <= new <= leaf_count:
+        raise HTTPException(status_code=400, detail=f"Need 0 < old <= new <= {leaf_count}")
+    return {
+        "device_id": device_id,
+        "scheme": mmr.SCHEME,
+        "old_root": store.root(old)[0],
+        "new_root": store.root(new)[0],
+        "proof": store.consistency_proof(old, new),
+    }
+
+@app.get("/batches/{batch_id}/mmr/proof", tags=["Batch"])
+def batch_mmr_proof(batch_id: str, leaf_count: int = None, current_user=Depends(get_current_user)):
+    """Inclusion proof of the batch root in its device's MMR; defaults to the first checkpoint covering it"""
+    batch = find_batch(batch_id, current_user, projection={"user_id": 1, "device_id": 1, "merkle_root": 1, "mmr_index": 1})
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Verify batch belongs to current user
+    if batch.get("user_id") != ObjectId(current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+    if batch.get("mmr_index") is None:
+        raise HTTPException(status_code=404, detail="Batch is not part of a device MMR")
+
+    store, current_count = device_mmr(current_user, batch["device_id"])
+    checkpoint = None
+    if leaf_count is None:
+        checkpoint = mmr_checkpoints_collection.find_one(
+            {"user_id": ObjectId(current_user), "device_id": batch["device_id"], "leaf_count": {"$gt": batch["mmr_index"]}},
+            sort=[("leaf_count", 1)],
+        )
+        leaf_count = checkpoint["leaf_count"] if checkpoint else current_count
+    if not batch["mmr_index"] < leaf_count <= current_count:
+        raise HTTPException(status_code=400, detail=f"leaf_count must be in ({batch['mmr_index']}, {current_count}]")
+    return {
+        "batch_id": batch_id,
+        "merkle_root": batch["merkle_root"],
+        "scheme": mmr.SCHEME,
+        "mmr_root": store.root(leaf_count)[0],
+        "proof": store.inclusion_proof(batch["mmr_index"], leaf_count),
+        "checkpoint": serialize_checkpoint(checkpoint),
+    }
+
+
+# === ANCHOR SCHEDULING ===
+
+def to_timestamp(value):
+    return value.replace(tzinfo=timezone.utc).timestamp() if isinstance(value, datetime) else None
+
+def user_anchor_policy(user_id):
+    doc = users_collection.find_one({"_id": ObjectId(user_id)}, projection={"anchor_policy": 1})
+    return scheduler.merge_policy((doc or {}).get("anchor_policy"))
+
+def release_stale_claims(query, checkpoints=True):
+    """Hand back batches (and checkpoints) claimed for sending longer than ANCHOR_CLAIM_TIMEOUT_S ago"""
+    cutoff = datetime.utcnow() - timedelta(seconds=ANCHOR_CLAIM_TIMEOUT_S)
+    # Claims from before sending_since was recorded have none and count as stale
+    released = batches_collection.update_many(
+        {**query, "anchor_state": "sending", "sending_since": {"$not": {"$gte": cutoff}}},
+        {"$unset": {"anchor_state": "", "sending_since": "", "mmr_checkpoint": ""}},
+    )
+    if checkpoints:
+        mmr_checkpoints_collection.delete_many({**query, "state": "sending", "sending_since": {"$lt": cutoff}})
+    if released.modified_count:
+        print(f"Warning: Released {released.modified_count} batch(es) left 'sending' by an interrupted anchor")
+    return released.modified_count
+
+def list_pending_batches():
+    """Unanchored batches grouped by tenant, oldest first"""
+    release_stale_claims({})
+    pending = {}
+    docs = batches_collection.find(
+        {"anchored": 0, "anchor_state": {"$exists": False}},
+        projection={"user_id": 1, "device_id": 1, "mmr_index": 1, "created_at": 1},
+    ).sort("_id", 1)
+    for doc in docs:
+        pending.setdefault(str(doc["user_id"]), []).append((to_timestamp(compact.id_time(doc)), doc))
+    return pending
+
+def submit_pending_batches(user_id, batches, reason):
+    """Anchor a tenant's pending batches: one MMR checkpoint per device, one tx per batch otherwise"""
+    devices = sorted({b["device_id"] for b in batches if b.get("mmr_index") is not None})
+    sends = [(f"device {d}", lambda d=d: anchor_device_mmr(d, current_user=user_id)) for d in devices]
+    sends += [(f"batch {b['_id']}", lambda b=b: anchor_batch(str(b["_id"]), current_user=user_id))
+              for b in batches if b.get("mmr_index") is None]
+    failed = 0
+    for what, send in sends:
+        # One failing device or batch must not hold back the tenant's others
+        try:
+            send()
+        except Exception as e:
+            failed += 1
+            print(f"Warning: Scheduled anchoring of {what} for user {user_id} failed: {getattr(e, 'detail', e)}")
+    print(f"Scheduled anchoring ({reason}): {len(batches)} batch(es) for user {user_id}, {failed} send(s) failed")
+
+anchor_scheduler = scheduler.AnchorScheduler(
+    list_pending=list_pending_batches,
+    submit=submit_pending_batches,
+    base_fee=base_fee_gwei,
+    get_policy=user_anchor_policy,
+)
+
+
+# === ANCHOR RECEIPTS ===
+# Anchor endpoints only send the transaction; app.receipts follows it through
+# mined -> confirmed (or back to submitted on a reorg, or dropped) and these
+# callbacks keep the batches, checkpoints and anchor_txs in step.
+
+def track_anchor_tx(tx_hash, user_id, batch=None, checkpoint=None):
+    try:
+        submitted_block = latest_block()
+    except Exception as e:
+        # The tx is already out: record it anyway, the tracker ages it from when it first sees it
+        print(f"Warning: Could not read the chain head for anchor tx {tx_hash}: {e}")
+        submitted_block = None
+    anchor_txs_collection.insert_one({
+        "_id": tx_hash,
+        "user_id": ObjectId(user_id),
+        "batch": batch,
+        "checkpoint": checkpoint,
+        "state": "submitted",
+        "submitted_at": datetime.utcnow(),
+        "submitted_block": submitted_block,
+        "block": None,
+        "block_hash": None,
+    })
+
+def list_in_flight_txs():
+    docs = anchor_txs_collection.find({"state": {"$in": ["submitted", "mined"]}})
+    return {d["_id"]: {"block": d["block"], "block_hash": d["block_hash"], "submitted_block": d.get("submitted_block")} for d in docs}
+
+def anchored_by(tx):
+    """Filter of the batches an anchor tx covers; a checkpoint's are matched by leaf count"""
+    if tx.get("batch") is not None:
+        return {"_id": tx["batch"]}
+    checkpoint = mmr_checkpoints_collection.find_one({"_id": tx["checkpoint"]}, projection={"device_id": 1, "leaf_count": 1})
+    if checkpoint is None:
+        return None
+    return {"user_id": tx["user_id"], "device_id": checkpoint["device_id"], "mmr_checkpoint": checkpoint["leaf_count"], "anchored": 0}
+
+def update_anchor_tx(tx_hash, expected, state, batch_update, checkpoint_update=None, before_batches=None, **fields):
+    """Move a tx from one of the ``expected`` states to ``state``; None (and no change) if it is in none of them"""
+    tx = anchor_txs_collection.find_one_and_update(
+        {"_id": tx_hash, "state": {"$in": expected}}, {"$set": {"state": state, **fields}},
+    )
+    if tx is None:
+        return None
+    covered = anchored_by(tx)
+    if covered is not None:
+        if before_batches is not None:
+            before_batches(covered)
+        batches_collection.update_many(covered, batch_update)
+    if tx.get("checkpoint") is not None and checkpoint_update is not None:
+        mmr_checkpoints_collection.update_one({"_id": tx["checkpoint"]}, checkpoint_update)
+    cache.bump(tx["user_id"], cache.BATCHES)
+    return tx
+
+def on_anchor_mined(tx_hash, block, block_hash):
+    update_anchor_tx(
+        tx_hash, ["submitted"], "mined",
+        {"$set": {"anchor_state": "mined", "tx_block": block}},
+        {"$set": {"state": "mined", "tx_block": block}},
+        block=block, block_hash=block_hash,
+    )
+
+def on_anchor_unmined(tx_hash):
+    update_anchor_tx(
+        tx_hash, ["mined"], "submitted",
+        {"$set": {"anchor_state": "submitted"}, "$unset": {"tx_block": ""}},
+        {"$set": {"state": "submitted", "tx_block": None}},
+        block=None, block_hash=None,
+    )
+
+def observe_time_to_anchor(covered):
+    for doc in batches_collection.find(covered, projection={"created_at": 1}):
+        metrics.time_to_anchor.observe((datetime.utcnow() - compact.id_time(doc)).total_seconds())
+
+def on_anchor_confirmed(tx_hash, block, confirmations):
+    tx = update_anchor_tx(
+        tx_hash, ["mined"], "confirmed",
+        {"$set": {"anchored": 1, "tx_block": block}, "$unset": {"anchor_state": ""}},
+        {"$set": {"state": "confirmed", "tx_block": block}},
+        before_batches=observe_time_to_anchor,
+        confirmations=confirmations, confirmed_at=datetime.utcnow(),
+    )
+    if tx is None:
+        return
+    metrics.anchors_total.inc("confirmed")
+    anchor_scheduler.observe_confirmation((datetime.utcnow() - tx["submitted_at"]).total_seconds())
+
+def on_anchor_dropped(tx_hash, reason):
+    tx = update_anchor_tx(
+        tx_hash, ["submitted", "mined"], "dropped",
+        {"$unset": {"anchor_state": "", "tx_hash": "", "tx_block": "", "mmr_checkpoint": ""}},
+        reason=reason,
+    )
+    if tx is None:
+        return
+    checkpoint = None
+    if tx.get("checkpoint") is not None:
+        checkpoint = mmr_checkpoints_collection.find_one_and_delete({"_id": tx["checkpoint"]})
+    metrics.anchors_total.inc(reason)
+    print(f"Warning: Anchor tx {tx_hash} {reason}; its batches are pending again")
+    if not ANCHOR_SCHEDULER:
+        # Nobody else will pick them up: send the same batch or checkpoint again right away
+        # (only that one, so batches an agent holds back with ANCHOR_EVERY stay pending)
+        user_id = str(tx["user_id"])
+        try:
+            if tx.get("batch") is not None:
+                anchor_batch(str(tx["batch"]), current_user=user_id)
+            elif checkpoint is not None:
+                store, _leaf_count = device_mmr(user_id, checkpoint["device_id"])
+                anchor_mmr_checkpoint(user_id, checkpoint["device_id"], store, checkpoint["leaf_count"])
+        except Exception as e:
+            print(f"Warning: Re-anchoring after {reason} tx failed: {e}")
+
+receipt_tracker = receipts.ReceiptTracker(
+    chain=eth,
+    list_in_flight=list_in_flight_txs,
+    on_mined=on_anchor_mined,
+    on_unmined=on_anchor_unmined,
+    on_confirmed=on_anchor_confirmed,
+    on_dropped=on_anchor_dropped,
+)
+
+@app.get("/anchor/policy", tags=["Anchor"])
+def get_anchor_policy(current_user=Depends(get_current_user)):
+    """The caller's anchoring policy (defaults merged with any overrides)"""
+    return {"scheduler_enabled": ANCHOR_SCHEDULER, **user_anchor_policy(current_user)}
+
+@app.put("/anchor/policy", tags=["Anchor"])
+def update_anchor_policy(policy: schemas.AnchorPolicy, current_user=Depends(get_current_user)):
+    """Override max delay, batch count threshold and/or fee budget for the caller's batches"""
+    updates = {f"anchor_policy.{k}": v for k, v in policy.model_dump().items() if v is not None}
+    if updates:
+        users_collection.update_one({"_id": ObjectId(current_user)}, {"$set": updates})
+    return {"scheduler_enabled": ANCHOR_SCHEDULER, **user_anchor_policy(current_user)}
+
+@app.get("/batches/{batch_id}/anchor/eta", tags=["Batch"])
+def batch_anchor_eta(batch_id: str, current_user=Depends(get_current_user)):
+    """Expected time-to-anchor of a pending batch under the caller's policy"""
+    batch = compact.decode_batch(batches_collection.find_one(
+        {"_id": ObjectId(batch_id)},
+        projection={"user_id": 1, "anchored": 1, "anchor_state": 1, "created_at": 1, "tx_hash": 1, "tx_block": 1},
+    ))
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Verify batch belongs to current user
+    if batch.get("user_id") != ObjectId(current_user):
+        raise HTTPException(status_code=403, detail="Access denied")
+    if batch.get("anchored") == 1:
+        return {"status": "anchored", "tx_hash": batch.get("tx_hash"), "tx_block": batch.get("tx_block")}
+    if batch.get("anchor_state"):
+        return {
+            "status": batch["anchor_state"],
+            "tx_hash": batch.get("tx_hash"),
+            "tx_block": batch.get("tx_block"),
+            "confirmations_required": receipts.CONFIRMATIONS,
+            "expected_time_to_anchor_s": round(anchor_scheduler.confirm_s, 1),
+        }
+
+    policy = user_anchor_policy(current_user)
+    created = to_timestamp(batch["created_at"])
+    result = {
+        "status": "pending",
+        "scheduler_enabled": ANCHOR_SCHEDULER,
+        "policy": policy,
+        "deadline": datetime.fromtimestamp(created + policy["max_delay_s"], timezone.utc).isoformat(),
+        "base_fee_gwei": anchor_scheduler.last_base_fee,
+        "expected_anchor_at": None,
+        "expected_time_to_anchor_s": None,
+    }
+    if ANCHOR_SCHEDULER:
+        pending = [
+            to_timestamp(compact.id_time(d))
+            for d in batches_collection.find({"user_id": ObjectId(current_user), "anchored": 0}, projection={"created_at": 1})
+        ]
+        expected = anchor_scheduler.expected_anchor_time(created, pending, policy)
+        result["expected_anchor_at"] = datetime.fromtimestamp(expected, timezone.utc).isoformat()
+        result["expected_time_to_anchor_s"] = round(expected - created, 1)
+    return result
+
 
 # === AUTH ROUTES ===
 
@@ -303,15 +1134,25 @@ def register_device(device: schemas.DeviceCreate, current_user=Depends(get_curre
         raise HTTPException(status_code=400, detail="Device ID already registered for your account")
     doc = {"user_id": ObjectId(current_user), "device_id": device.device_id, "name": device.name, "created_at": datetime.utcnow()}
     devices_collection.insert_one(doc)
-    users_collection.update_one({"_id": ObjectId(current_user)}, {"$push": {"devices": device.device_id}})
+    users_collection.update_one(
+        {"_id": ObjectId(current_user)},
+        {"$push": {"devices": device.device_id}, "$inc": {f"data_versions.{cache.DEVICES}": 1}},
+    )
     return {"status": "registered", "device_id": device.device_id}
 
 @app.get("/devices", tags=["Device"])
-def list_devices(current_user=Depends(get_current_user), include_batch_info: bool = False):
+def list_devices(request: Request, current_user=Depends(get_current_user), include_batch_info: bool = False):
+    kinds = [cache.DEVICES, cache.BATCHES] if include_batch_info else [cache.DEVICES]
+    return cache.conditional_json(
+        request, current_user, kinds, lambda session: build_device_list(current_user, include_batch_info, session), op_class=LISTING
+    )
+
+def build_device_list(current_user, include_batch_info, session=None):
     # Use projection to only fetch needed fields for better performance
-    devices = list(devices_collection.find(
+    devices = list(reads(devices_collection, LISTING).find(
         {"user_id": ObjectId(current_user)},
-        {"device_id": 1, "name": 1, "platform": 1, "version": 1, "last_seen": 1, "storage_bytes": 1}
+        {"device_id": 1, "name": 1, "platform": 1, "version": 1, "last_seen": 1, "storage_bytes": 1},
+        session=session,
     ))
     result = []
     for d in devices:
@@ -332,11 +1173,13 @@ def list_devices(current_user=Depends(get_current_user), include_batch_info: boo
         # Optionally include last batch info (for devices page optimization)
         if include_batch_info:
             # Get the most recent anchored batch for this device (optimized query)
-            last_batch = batches_collection.find_one(
+            last_batch = reads(batches_collection, LISTING).find_one(
                 {"user_id": ObjectId(current_user), "device_id": d.get("device_id"), "anchored": 1},
-                sort=[("created_at", -1)],
-                projection={"batch_id": 1, "merkle_root": 1, "created_at": 1, "size": 1}
+                sort=[("_id", -1)],
+                projection={"batch_id": 1, "merkle_root": 1, "created_at": 1, "size": 1},
+                session=session,
             )
+            last_batch = compact.decode_batch(last_batch)
             if last_batch:
                 device_result["last_anchor"] = {
                     "batch_id": last_batch.get("batch_id"),
@@ -345,12 +1188,18 @@ def list_devices(current_user=Depends(get_current_user), include_batch_info: boo
                 }
             
             # Get total logs count for this device (aggregate query)
-            total_logs = batches_collection.aggregate([
+            total_logs = reads(batches_collection, LISTING).aggregate([
                 {"$match": {"user_id": ObjectId(current_user), "device_id": d.get("device_id")}},
                 {"$group": {"_id": None, "total": {"$sum": "$size"}}}
-            ])
+            ], session=session)
             total_logs_list = list(total_logs)
             device_result["total_logs"] = total_logs_list[0]["total"] if total_logs_list else 0
+            archived_logs = list(reads(summaries_collection, LISTING).aggregate([
+                {"$match": {"user_id": ObjectId(current_user), "device_id": d.get("device_id")}},
+                {"$group": {"_id": None, "total": {"$sum": "$size_total"}}}
+            ], session=session))
+            if archived_logs:
+                device_result["total_logs"] += archived_logs[0]["total"]
         
         result.append(device_result)
     return result
@@ -373,6 +1222,7 @@ def device_heartbeat(hb: schemas.DeviceHeartbeat, current_user=Depends(get_curre
         {"$set": update},
         upsert=False,
     )
+    cache.bump(current_user, cache.DEVICES)
     return {"status": "ok", "device_id": hb.device_id}
 
 @app.delete("/devices/{device_id}", tags=["Device"])
@@ -388,7 +1238,7 @@ def delete_device(device_id: str, current_user=Depends(get_current_user)):
     # Remove device_id from user's devices list
     users_collection.update_one(
         {"_id": ObjectId(current_user)},
-        {"$pull": {"devices": device_id}}
+        {"$pull": {"devices": device_id}, "$inc": {f"data_versions.{cache.DEVICES}": 1}}
     )
     
     return {"status": "deleted", "device_id": device_id}
@@ -0,0 +1,302 @@
+# backend/app/metrics.py
+"""Lightweight Prometheus-style metrics for the API.
+
+Metrics are plain in-process counters/histograms guarded by one lock each,
+so recording costs a dict lookup and a few additions per event. ``render()``
+produces the Prometheus text exposition format served at ``/metrics``.
+"""
+import bisect
+import contextvars
+import os
+import resource
+import threading
+import time
+
+from pymongo import monitoring
+
+# Latency buckets in seconds (API routes, Mongo commands, RPC calls)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Time-to-anchor buckets in seconds (batch created -> anchored)
+ANCHOR_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 21600, 86400)
+
+_START_TIME = time.time()
+
+
+def _label_str(names, values):
+    if not names:
+        return ""
+    parts = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, count in items:
+            lines.append(f"{self.name}{_label_str(self.labels, values)} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is either set directly or computed at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name, help_text, labels=(), func=None):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.func = func
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        if self.func is not None:
+            try:
+                value = self.func()
+            except Exception:
+                return []
+            if value is not None:
+                lines.append(f"{self.name} {value}")
+            return lines
+        with self._lock:
+            items = sorted(self._values.items())
+        for values, value in items:
+            lines.append(f"{self.name}{_label_str(self.labels, values)} {value}")
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Counter whose (monotonic) value is computed at scrape time, e.g. the process CPU time."""
+
+    type_name = "counter"
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                labels = _label_str(self.labels + ("le",), values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_str(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_registry = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render():
+    """Render all registered metrics in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+
+# === HTTP ===
+http_request_duration = register(Histogram(
+    "logchain_http_request_duration_seconds", "API request latency by route", ("method", "route", "status")))
+http_mongo_commands = register(Counter(
+    "logchain_http_mongo_commands_total", "MongoDB commands issued while serving each route", ("method", "route")))
+http_rpc_calls = register(Counter(
+    "logchain_http_rpc_calls_total", "Web3 JSON-RPC calls made while serving each route", ("method", "route")))
+
+# Per-request op tally ({"mongo": n, "rpc": n}); the dict is shared with the threadpool copy of the context
+_request_ops = contextvars.ContextVar("logchain_request_ops", default=None)
+
+
+def _count_op(kind):
+    ops = _request_ops.get()
+    if ops is not None:
+        ops[kind] += 1
+
+# === MongoDB ===
+mongo_command_duration = register(Histogram(
+    "logchain_mongo_command_duration_seconds", "MongoDB command latency", ("command", "collection")))
+mongo_command_failures = register(Counter(
+    "logchain_mongo_command_failures_total", "Failed MongoDB commands", ("command", "collection")))
+mongo_server_commands = register(Counter(
+    "logchain_mongo_server_commands_total", "MongoDB commands by replica-set member (host:port)", ("server", "command")))
+
+# === Web3 ===
+rpc_duration = register(Histogram(
+    "logchain_rpc_duration_seconds", "Web3 JSON-RPC call latency", ("method",)))
+rpc_errors = register(Counter(
+    "logchain_rpc_errors_total", "Web3 JSON-RPC calls that raised or returned an error", ("method",)))
+
+# === Anchoring ===
+anchors_in_flight = register(Gauge(
+    "logchain_anchor_in_flight", "Anchor transactions sent but not yet confirmed"))
+anchors_total = register(Counter(
+    "logchain_anchor_total", "Anchor attempts by outcome", ("outcome",)))
+time_to_anchor = register(Histogram(
+    "logchain_time_to_anchor_seconds", "Time from batch creation to a confirmed anchor", buckets=ANCHOR_BUCKETS))
+
+# === Ingestion ===
+batches_deduplicated = register(Counter(
+    "logchain_batches_deduplicated_total", "Batch submissions answered with an existing batch", ("reason",)))
+
+
+# === Process ===
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return round(usage.ru_utime + usage.ru_stime, 3)
+
+
+def _open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+register(Gauge("process_resident_memory_bytes", "Resident memory size in bytes", func=_rss_bytes))
+register(CallbackCounter("process_cpu_seconds_total", "Total user and system CPU time in seconds", func=_cpu_seconds))
+register(Gauge("process_open_fds", "Number of open file descriptors", func=_open_fds))
+register(Gauge("process_threads", "Number of Python threads", func=threading.active_count))
+register(Gauge("process_start_time_seconds", "Start time of the process since the epoch", func=lambda: _START_TIME))
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Record every MongoDB command's latency via pymongo command monitoring."""
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._collections[event.request_id] = collection
+
+    def _pop(self, event):
+        with self._lock:
+            return self._collections.pop(event.request_id, "")
+
+    def succeeded(self, event):
+        _count_op("mongo")
+        mongo_server_commands.inc("%s:%s" % event.connection_id, event.command_name)
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name, self._pop(event))
+
+    def failed(self, event):
+        collection = self._pop(event)
+        _count_op("mongo")
+        mongo_command_duration.observe(event.duration_micros / 1e6, event.command_name, collection)
+        mongo_command_failures.inc(event.command_name, collection)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency (route templates, not raw paths)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+        ops = {"mongo": 0, "rpc": 0}
+        token = _request_ops.set(ops)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_ops.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope.get("method", "")
+            http_request_duration.observe(time.perf_counter() - start, method, route, status[0])
+            if ops["mongo"]:
+                http_mongo_commands.inc(method, route, amount=ops["mongo"])
+            if ops["rpc"]:
+                http_rpc_calls.inc(method, route, amount=ops["rpc"])
+
+
+def observe_rpc(method, func, *args, **kwargs):
+    """Time one JSON-RPC call made through ``func`` and record errors."""
+    _count_op("rpc")
+    start = time.perf_counter()
+    try:
+        response = func(*args, **kwargs)
+    except Exception:
+        rpc_errors.inc(method)
+        raise
+    finally:
+        rpc_duration.observe(time.perf_counter() - start, method)
+    if isinstance(response, dict) and response.get("error"):
+        rpc_errors.inc(method)
+    return response
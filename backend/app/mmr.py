@@ -0,0 +1,312 @@
+# backend/app/mmr.py
+"""Per-device Merkle Mountain Range over batch roots.
+
+Every batch a device sends is appended as a leaf, so the device's history is
+one append-only accumulator: its root commits to every batch root in order,
+an inclusion proof shows a batch sits at a given index, and a consistency
+proof shows a later root extends an earlier one (nothing dropped or
+reordered). Anchoring the MMR root periodically therefore covers all batches
+appended since the previous checkpoint.
+
+Nodes are numbered in post-order from 0 (leaves 0, 1, parent 2, leaves 3, 4,
+parent 5, grandparent 6, ...). Sizes in the API are leaf counts. Hashes:
+
+    leaf = SHA-256(0x10 || batch root)
+    node = SHA-256(0x11 || left || right)
+    root = SHA-256(0x12 || leaf count as 8-byte big-endian || peaks left to right)
+
+Proof siblings use the same ``[side, hex]`` pairs as ``merkle.py``.
+"""
+import hashlib
+
+from bson import Binary
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+SCHEME = "mmr-v1-sha256"
+
+_LEAF = b"\x10"
+_NODE = b"\x11"
+_ROOT = b"\x12"
+
+
+def _h(data):
+    return hashlib.sha256(data).digest()
+
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+def leaf_hash(batch_root):
+    return _h(_LEAF + _bytes(batch_root))
+
+
+def node_hash(left, right):
+    return _h(_NODE + _bytes(left) + _bytes(right))
+
+
+def bag_peaks(peak_hashes, leaf_count):
+    """0x-prefixed MMR root (None for an empty range)."""
+    if not leaf_count:
+        return None
+    return "0x" + _h(_ROOT + int(leaf_count).to_bytes(8, "big") + b"".join(_bytes(p) for p in peak_hashes)).hex()
+
+
+# === Position arithmetic ===
+
+def mmr_size(leaf_count):
+    """Number of nodes in an MMR with ``leaf_count`` leaves."""
+    return 2 * leaf_count - bin(leaf_count).count("1")
+
+
+def leaf_position(index):
+    return 2 * index - bin(index).count("1")
+
+
+def peaks(leaf_count):
+    """``(position, height)`` of every peak, left to right."""
+    out = []
+    offset = 0
+    for height in range(leaf_count.bit_length() - 1, -1, -1):
+        if leaf_count >> height & 1:
+            size = (1 << (height + 1)) - 1
+            out.append((offset + size - 1, height))
+            offset += size
+    return out
+
+
+def _height(pos):
+    pos += 1
+    while pos & (pos + 1):
+        pos -= (1 << (pos.bit_length() - 1)) - 1
+    return pos.bit_length() - 1
+
+
+def climb(pos, height, peak_pos):
+    """Sibling ``(side, position)`` pairs from node ``pos`` up to ``peak_pos``."""
+    path = []
+    while pos < peak_pos:
+        if _height(pos + 1) > height:
+            # right child: sibling on the left, parent right after us
+            path.append(("left", pos - (2 << height) + 1))
+            pos += 1
+        else:
+            path.append(("right", pos + (2 << height) - 1))
+            pos += 2 << height
+        height += 1
+    if pos != peak_pos:
+        raise ValueError("Node is not below the given peak")
+    return path
+
+
+def _peak_for(pos, leaf_count):
+    for index, (peak_pos, _) in enumerate(peaks(leaf_count)):
+        if pos <= peak_pos:
+            return index, peak_pos
+    raise IndexError(pos)
+
+
+def append_nodes(peak_hashes, leaf_count, batch_root):
+    """Nodes ``[(position, hash)]`` created by appending ``batch_root``.
+
+    ``peak_hashes`` are the current peaks (left to right), so an append only
+    needs O(log n) existing nodes.
+    """
+    return _climb_from_leaf(peak_hashes, leaf_count, leaf_hash(batch_root))
+
+
+def _climb_from_leaf(peak_hashes, leaf_count, node):
+    """``append_nodes`` for an already hashed leaf ``node``."""
+    pos = mmr_size(leaf_count)
+    created = [(pos, node)]
+    stack = [(_bytes(h), height) for h, (_pos, height) in zip(peak_hashes, peaks(leaf_count))]
+    height = 0
+    while stack and stack[-1][1] == height:
+        left, _ = stack.pop()
+        node = node_hash(left, node)
+        pos += 1
+        height += 1
+        created.append((pos, node))
+    return created
+
+
+# === Proofs ===
+
+def inclusion_positions(index, leaf_count):
+    """Positions needed to prove leaf ``index``: (sibling path, peak positions)."""
+    if not 0 <= index < leaf_count:
+        raise IndexError(index)
+    pos = leaf_position(index)
+    _i, peak_pos = _peak_for(pos, leaf_count)
+    return climb(pos, 0, peak_pos), [p for p, _ in peaks(leaf_count)]
+
+
+def consistency_positions(old_count, new_count):
+    """Positions proving the ``old_count``-leaf MMR is a prefix of the ``new_count`` one."""
+    if not 0 < old_count <= new_count:
+        raise ValueError("Consistency needs 0 < old_count <= new_count")
+    paths = []
+    for pos, height in peaks(old_count):
+        _i, peak_pos = _peak_for(pos, new_count)
+        paths.append(climb(pos, height, peak_pos))
+    return [p for p, _ in peaks(old_count)], paths, [p for p, _ in peaks(new_count)]
+
+
+def _check_path(node, expected, proof_path):
+    """Fold ``proof_path`` over ``node`` after checking its shape against ``expected``."""
+    if [side for side, _pos in expected] != [side for side, _hex in proof_path]:
+        return None
+    for side, sibling_hex in proof_path:
+        sibling = _bytes(sibling_hex)
+        node = node_hash(sibling, node) if side == "left" else node_hash(node, sibling)
+    return node
+
+
+def verify_inclusion(batch_root, proof, root):
+    """Check an inclusion proof ``{leaf_index, leaf_count, path, peaks}`` against ``root``."""
+    try:
+        index, count = proof["leaf_index"], proof["leaf_count"]
+        expected, peak_positions = inclusion_positions(index, count)
+        peak_hashes = [_bytes(p) for p in proof["peaks"]]
+        if len(peak_hashes) != len(peak_positions):
+            return False
+        node = _check_path(leaf_hash(batch_root), expected, proof["path"])
+        peak_index, _pos = _peak_for(leaf_position(index), count)
+    except (KeyError, IndexError, ValueError, TypeError):
+        return False
+    if node is None or node != peak_hashes[peak_index]:
+        return False
+    return bag_peaks(peak_hashes, count).lower() == root.lower()
+
+
+def verify_consistency(proof, old_root, new_root):
+    """Check a consistency proof ``{old_leaf_count, new_leaf_count, old_peaks, paths, new_peaks}``."""
+    try:
+        old_count, new_count = proof["old_leaf_count"], proof["new_leaf_count"]
+        old_positions, expected_paths, new_positions = consistency_positions(old_count, new_count)
+        old_peaks = [_bytes(p) for p in proof["old_peaks"]]
+        new_peaks = [_bytes(p) for p in proof["new_peaks"]]
+        if len(old_peaks) != len(old_positions) or len(new_peaks) != len(new_positions):
+            return False
+        if len(proof["paths"]) != len(old_peaks):
+            return False
+        if bag_peaks(old_peaks, old_count).lower() != old_root.lower():
+            return False
+        if bag_peaks(new_peaks, new_count).lower() != new_root.lower():
+            return False
+        for pos, node, expected, path in zip(old_positions, old_peaks, expected_paths, proof["paths"]):
+            peak_index, _pos = _peak_for(pos, new_count)
+            if _check_path(node, expected, path) != new_peaks[peak_index]:
+                return False
+    except (KeyError, IndexError, ValueError, TypeError):
+        return False
+    return True
+
+
+class MMRStore:
+    """MMR nodes of one (user, device) in a Mongo collection, one document per node.
+
+    The unique ``(user_id, device_id, pos)`` index makes concurrent appends
+    safe: the loser of a race fails on the leaf position and retries. An
+    append writes its leaf before its parents, so one interrupted midway
+    leaves a leaf without (all of) its parents; ``leaf_count`` finishes such
+    a tail from the stored nodes instead of letting every later append
+    collide with it. Node hashes are read as hex strings or BinData;
+    ``binary`` selects which form new nodes are written in.
+    """
+
+    def __init__(self, collection, user_id, device_id, binary=False):
+        self.collection = collection
+        self.key = {"user_id": user_id, "device_id": device_id}
+        self.binary = binary
+
+    def size(self):
+        """Number of stored nodes."""
+        last = self.collection.find_one(self.key, sort=[("pos", -1)], projection={"pos": 1})
+        return last["pos"] + 1 if last else 0
+
+    def leaf_count(self):
+        size = self.size()
+        # Post-order sizes are never ambiguous: find n with mmr_size(n) == size
+        count = 0
+        for height in range(size.bit_length(), -1, -1):
+            if mmr_size(count + (1 << height)) <= size:
+                count += 1 << height
+        if mmr_size(count) < size:
+            self._complete_append(count)
+            count += 1
+        return count
+
+    def _complete_append(self, count):
+        """Write the missing parents of the leaf stored after the first ``count`` leaves."""
+        peak_positions = [p for p, _ in peaks(count)]
+        leaf_pos = mmr_size(count)
+        hashes = self.get(peak_positions + [leaf_pos])
+        nodes = _climb_from_leaf([hashes[p] for p in peak_positions], count, hashes[leaf_pos])
+        for pos, node in nodes[1:]:
+            try:
+                self.collection.insert_one(self._node(pos, node))
+            except DuplicateKeyError:
+                pass  # same hash, written meanwhile by the interrupted append or another repair
+
+    def _node(self, pos, node):
+        return {**self.key, "pos": pos, "hash": Binary(node) if self.binary else node.hex()}
+
+    def get(self, positions):
+        """``{pos: hash bytes}`` for ``positions`` (one query)."""
+        positions = list(set(positions))
+        if not positions:
+            return {}
+        docs = self.collection.find({**self.key, "pos": {"$in": positions}}, projection={"pos": 1, "hash": 1})
+        found = {d["pos"]: bytes(h) if isinstance(h := d["hash"], bytes) else bytes.fromhex(h) for d in docs}
+        missing = set(positions) - set(found)
+        if missing:
+            raise LookupError(f"MMR nodes missing: {sorted(missing)[:5]}")
+        return found
+
+    def append(self, batch_root, retries=5):
+        """Append a batch root; returns its leaf index."""
+        for _attempt in range(retries):
+            count = self.leaf_count()
+            peak_positions = [p for p, _ in peaks(count)]
+            hashes = self.get(peak_positions)
+            nodes = append_nodes([hashes[p] for p in peak_positions], count, batch_root)
+            try:
+                self.collection.insert_many([self._node(pos, node) for pos, node in nodes], ordered=True)
+                return count
+            except (BulkWriteError, DuplicateKeyError):
+                continue
+        raise RuntimeError("Could not append to MMR: too many concurrent writers")
+
+    def root(self, leaf_count=None):
+        count = self.leaf_count() if leaf_count is None else leaf_count
+        if not count:
+            return None, []
+        peak_positions = [p for p, _ in peaks(count)]
+        hashes = self.get(peak_positions)
+        peak_hashes = [hashes[p] for p in peak_positions]
+        return bag_peaks(peak_hashes, count), [h.hex() for h in peak_hashes]
+
+    def inclusion_proof(self, index, leaf_count):
+        path, peak_positions = inclusion_positions(index, leaf_count)
+        hashes = self.get([pos for _side, pos in path] + peak_positions)
+        return {
+            "leaf_index": index,
+            "leaf_count": leaf_count,
+            "path": [[side, hashes[pos].hex()] for side, pos in path],
+            "peaks": [hashes[p].hex() for p in peak_positions],
+        }
+
+    def consistency_proof(self, old_count, new_count):
+        old_positions, paths, new_positions = consistency_positions(old_count, new_count)
+        wanted = old_positions + new_positions + [pos for path in paths for _side, pos in path]
+        hashes = self.get(wanted)
+        return {
+            "old_leaf_count": old_count,
+            "new_leaf_count": new_count,
+            "old_peaks": [hashes[p].hex() for p in old_positions],
+            "paths": [[[side, hashes[pos].hex()] for side, pos in path] for path in paths],
+            "new_peaks": [hashes[p].hex() for p in new_positions],
+        }
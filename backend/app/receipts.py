@@ -0,0 +1,196 @@
+# backend/app/receipts.py
+"""Block-driven tracker for in-flight anchor transactions.
+
+Instead of one ``wait_for_transaction_receipt`` polling loop per
+transaction, a single tracker follows the chain head: every tick it reads
+the latest block and each block it has not seen yet (one call per block,
+however many anchors are pending) and matches their transaction lists
+against the in-flight set. Only transactions found in a block cost an extra
+receipt lookup, so RPC load grows with the block rate, not with the number
+of anchors in flight.
+
+A transaction goes through:
+
+submitted
+    sent, not seen in a block yet;
+mined
+    included in a block (``on_mined``), waiting for ``ANCHOR_CONFIRMATIONS``
+    blocks on top of it;
+confirmed
+    deep enough (``on_confirmed``); the batches count as anchored from here;
+dropped
+    reverted, or gone from the node ``ANCHOR_DROP_AFTER_BLOCKS`` blocks after
+    it was sent (``on_dropped``); its batches are queued again.
+
+The hashes of recent blocks are kept, so when a new block does not build on
+the stored parent (or the head is replaced at the same height) the tracker
+walks back to the fork point. Transactions mined in the abandoned blocks go
+back to "submitted" (``on_unmined``), are looked for again in the new
+blocks, and are dropped if the node has forgotten them.
+
+Like ``app.scheduler`` it knows nothing about MongoDB: ``chain`` provides
+``block(number_or_"latest")``, ``receipt(tx)`` and ``tx_known(tx)`` (see
+``app.eth``), and ``list_in_flight()`` returns ``{tx: {"block",
+"block_hash", "submitted_block"}}`` for the unconfirmed transactions.
+"""
+import os
+import threading
+
+from app import metrics
+
+CONFIRMATIONS = int(os.getenv("ANCHOR_CONFIRMATIONS", "6"))
+POLL_SECONDS = float(os.getenv("RECEIPT_POLL_S", "4"))
+DROP_AFTER_BLOCKS = int(os.getenv("ANCHOR_DROP_AFTER_BLOCKS", "50"))
+MAX_BLOCKS_PER_TICK = 500  # after a long outage, catch up over several ticks
+
+reorgs_total = metrics.register(metrics.Counter(
+    "logchain_anchor_reorgs_total", "Chain reorganisations seen by the receipt tracker"))
+reorged_txs_total = metrics.register(metrics.Counter(
+    "logchain_anchor_reorged_txs_total", "Mined anchor transactions whose block was abandoned by a reorg"))
+tracked_blocks_total = metrics.register(metrics.Counter(
+    "logchain_receipt_tracker_blocks_total", "Blocks read by the receipt tracker"))
+
+
+class ReceiptTracker:
+    """Follow the chain and move anchor transactions through their states (see module docstring)."""
+
+    def __init__(self, chain, list_in_flight, on_mined, on_unmined, on_confirmed, on_dropped,
+                 confirmations=CONFIRMATIONS, interval=POLL_SECONDS, drop_after=DROP_AFTER_BLOCKS):
+        self.chain = chain
+        self.list_in_flight = list_in_flight
+        self.on_mined = on_mined
+        self.on_unmined = on_unmined
+        self.on_confirmed = on_confirmed
+        self.on_dropped = on_dropped
+        self.confirmations = max(1, confirmations)
+        self.interval = interval
+        self.drop_after = drop_after
+        self.window = self.confirmations + 64  # reorgs deeper than this are not followed
+        self.head = None
+        self.hashes = {}  # number -> hash of the recent canonical blocks
+        self._drop_checked = {}  # tx -> head at its last "still known?" check
+        self._first_seen = {}  # tx -> head when first listed, for txs sent without a known head
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _rewind(self, number, txs):
+        """Walk back from ``number`` to the last block still on the canonical chain."""
+        depth = 0
+        while number in self.hashes:
+            current = self.chain.block(number)
+            if current is not None and current["hash"] == self.hashes[number]:
+                break
+            del self.hashes[number]
+            number -= 1
+            depth += 1
+        for stale in [n for n in self.hashes if n > number]:  # above a head that went backwards
+            del self.hashes[stale]
+        for tx, info in txs.items():
+            if info["block"] is not None and info["block"] > number:
+                info.update(block=None, block_hash=None)
+                self.on_unmined(tx)
+                reorged_txs_total.inc()
+        reorgs_total.inc()
+        print(f"Warning: chain reorganisation of depth {depth} below block {number + depth}")
+        return number
+
+    def _scan(self, blk, txs):
+        self.hashes[blk["number"]] = blk["hash"]
+        tracked_blocks_total.inc()
+        included = set(blk["transactions"])
+        for tx, info in txs.items():
+            if info["block"] is None and tx in included:
+                self._resolve(tx, info)
+
+    def _resolve(self, tx, info):
+        found = self.chain.receipt(tx)
+        if found is None:
+            return
+        if not found["status"]:
+            info["dropped"] = True
+            self.on_dropped(tx, "reverted")
+            return
+        info.update(block=found["block"], block_hash=found["block_hash"])
+        self.on_mined(tx, found["block"], found["block_hash"])
+
+    def tick(self):
+        """Process new blocks; returns ``{"head", "blocks", "in_flight"}``."""
+        latest = self.chain.block("latest")
+        txs = self.list_in_flight()
+        metrics.anchors_in_flight.set(len(txs))
+        if latest is None:
+            return {"head": self.head, "blocks": 0, "in_flight": len(txs)}
+        head = latest["number"]
+
+        if self.head is None:
+            # (Re)started: transactions sent before may have been mined while nobody watched
+            for tx, info in txs.items():
+                if info["block"] is None:
+                    self._resolve(tx, info)
+            self.head = head - 1
+
+        if self.hashes.get(head, latest["hash"]) != latest["hash"]:
+            self.head = min(self.head, self._rewind(head, txs))
+
+        blocks = 0
+        number = self.head + 1
+        while number <= min(head, self.head + MAX_BLOCKS_PER_TICK):
+            blk = latest if number == head else self.chain.block(number)
+            if blk is None:
+                break
+            if number - 1 in self.hashes and blk["parent_hash"] != self.hashes[number - 1]:
+                number = self._rewind(number - 1, txs) + 1
+                continue
+            self._scan(blk, txs)
+            blocks += 1
+            number += 1
+        self.head = number - 1
+        for old in [n for n in self.hashes if n < self.head - self.window]:
+            del self.hashes[old]
+
+        for tx, info in txs.items():
+            if info.get("dropped"):
+                continue
+            if info["block"] is not None:
+                depth = self.head - info["block"] + 1
+                if depth < self.confirmations:
+                    continue
+                canonical = self.hashes.get(info["block"])
+                if canonical is None:  # older than the window (e.g. after a restart)
+                    blk = self.chain.block(info["block"])
+                    canonical = blk and blk["hash"]
+                if canonical == info["block_hash"]:
+                    self.on_confirmed(tx, info["block"], depth)
+                else:
+                    info.update(block=None, block_hash=None)
+                    self.on_unmined(tx)
+                    reorged_txs_total.inc()
+            elif self.head - (info.get("submitted_block") or self._first_seen.setdefault(tx, self.head)) >= self.drop_after:
+                # Still pending long after it was sent: drop it only once the node has forgotten it
+                if self.head - self._drop_checked.get(tx, -self.drop_after) >= self.drop_after:
+                    self._drop_checked[tx] = self.head
+                    if not self.chain.tx_known(tx):
+                        self.on_dropped(tx, "dropped")
+        for tx in [t for t in self._drop_checked if t not in txs]:
+            del self._drop_checked[tx]
+        for tx in [t for t in self._first_seen if t not in txs]:
+            del self._first_seen[tx]
+        return {"head": self.head, "blocks": blocks, "in_flight": len(txs)}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Warning: Receipt tracker tick failed: {e}")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
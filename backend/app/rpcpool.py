@@ -0,0 +1,213 @@
+# backend/app/rpcpool.py
+"""Pool of JSON-RPC endpoints behind a single web3 provider.
+
+``ProviderPool`` is configured with several RPC URLs (or ready-made
+providers, e.g. in-process EVMs for testing) and never touches the network
+when it is created. On first use it starts a background health checker that
+probes every endpoint with ``eth_blockNumber``, tracks a moving average of
+its latency and how far it lags the best block seen, and brings failed
+endpoints back once they answer again.
+
+Each call goes to the fastest healthy endpoint. Transport failures
+(connection refused/reset, timeouts, HTTP 5xx/429) mark the endpoint down
+and the call moves on to the next one, except for methods that could have
+side effects if sent twice (see ``UNSAFE_METHODS``), which are never resent.
+A signed ``eth_sendRawTransaction`` is resent too: the transaction is
+identified by its hash, so if the first node took it before timing out the
+next one answers "already known" (or "nonce too low" once it is mined),
+which ``eth.send_anchor`` recognises as success for that hash instead of
+signing a new transaction.
+"""
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.exceptions import ProviderConnectionError
+from web3.providers import BaseProvider
+
+from app import metrics
+from app.metrics import observe_rpc
+
+# Methods where the node signs/creates state itself; resending may duplicate the effect
+UNSAFE_METHODS = frozenset({"eth_sendTransaction", "personal_sendTransaction", "eth_signTransaction"})
+TRANSPORT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.HTTPError, ProviderConnectionError, OSError)
+
+endpoint_up = metrics.register(metrics.Gauge(
+    "logchain_rpc_endpoint_up", "1 if the RPC endpoint passed its last health check", ("endpoint",)))
+endpoint_latency = metrics.register(metrics.Gauge(
+    "logchain_rpc_endpoint_latency_seconds", "Moving average latency of the RPC endpoint", ("endpoint",)))
+failovers = metrics.register(metrics.Counter(
+    "logchain_rpc_failovers_total", "Calls moved to another endpoint after a transport error", ("endpoint",)))
+
+
+class InstrumentedHTTPProvider(Web3.HTTPProvider):
+    """HTTPProvider that records per-method RPC latency and errors."""
+
+    def make_request(self, method, params):
+        return observe_rpc(str(method), super().make_request, method, params)
+
+
+def endpoint_name(url):
+    """Label for metrics/logs: the host only, so API keys in the URL never leak."""
+    parsed = urlparse(url)
+    return f"{parsed.hostname}:{parsed.port}" if parsed.port else (parsed.hostname or url)
+
+
+def http_provider(url, timeout=10, pool_size=16):
+    """Keep-alive HTTP provider; the pool does the retrying, so web3's own retries are off."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return InstrumentedHTTPProvider(
+        url, request_kwargs={"timeout": timeout}, session=session, exception_retry_configuration=None
+    )
+
+
+class Endpoint:
+    def __init__(self, name, provider):
+        self.name = name
+        self.provider = provider
+        self.healthy = True  # optimistic until the first check or failure
+        self.latency = None
+        self.block = None
+        self.last_error = None
+        self.failures = 0  # consecutive
+        self.failovers = 0
+
+    def observe(self, seconds):
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        endpoint_latency.set(round(self.latency, 6), self.name)
+
+    def mark(self, healthy, error=None):
+        self.healthy = healthy
+        if healthy:
+            self.failures = 0
+        else:
+            self.failures += 1
+            self.last_error = error
+        endpoint_up.set(1 if healthy else 0, self.name)
+
+    def status(self):
+        return {
+            "endpoint": self.name,
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency * 1000, 2) if self.latency is not None else None,
+            "block": self.block,
+            "failures": self.failures,
+            "failovers": self.failovers,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderPool(BaseProvider):
+    """web3 provider routing each call to the lowest-latency healthy endpoint."""
+
+    def __init__(self, endpoints, health_interval=15, max_lag_blocks=5, timeout=10):
+        super().__init__()
+        self.endpoints = []
+        for i, ep in enumerate(endpoints):
+            if isinstance(ep, str):
+                self.endpoints.append(Endpoint(endpoint_name(ep), http_provider(ep, timeout)))
+            else:
+                self.endpoints.append(Endpoint(getattr(ep, "name", f"provider-{i}"), ep))
+        if not self.endpoints:
+            raise ValueError("ProviderPool needs at least one endpoint")
+        self.health_interval = health_interval
+        self.max_lag_blocks = max_lag_blocks
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- routing ---------------------------------------------------------
+
+    def _candidates(self):
+        """Healthy endpoints fastest first, then the unhealthy ones as a last resort."""
+        with self._lock:
+            ranked = sorted(self.endpoints, key=lambda e: (not e.healthy, e.latency if e.latency is not None else 0))
+        return ranked
+
+    def make_request(self, method, params):
+        self._ensure_health_checker()
+        last_error = None
+        for endpoint in self._candidates():
+            start = time.perf_counter()
+            try:
+                response = endpoint.provider.make_request(method, params)
+            except TRANSPORT_ERRORS as e:
+                with self._lock:
+                    endpoint.mark(False, f"{type(e).__name__}: {e}")
+                last_error = e
+                if str(method) in UNSAFE_METHODS:
+                    raise
+                endpoint.failovers += 1
+                failovers.inc(endpoint.name)
+                continue
+            with self._lock:
+                endpoint.observe(time.perf_counter() - start)
+                if not endpoint.healthy:
+                    endpoint.mark(True)
+            return response
+        raise ProviderConnectionError(f"All RPC endpoints failed for {method}: {last_error}")
+
+    def is_connected(self, show_traceback=False):
+        try:
+            self.make_request("eth_blockNumber", [])
+            return True
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+
+    # --- health checks ---------------------------------------------------
+
+    def check(self):
+        """Probe every endpoint once; returns the pool status."""
+        for endpoint in self.endpoints:
+            start = time.perf_counter()
+            try:
+                response = endpoint.provider.make_request("eth_blockNumber", [])
+                if response.get("error"):
+                    raise ProviderConnectionError(str(response["error"]))
+                result = response["result"]
+                block = int(result, 16) if isinstance(result, str) else int(result)
+            except Exception as e:
+                with self._lock:
+                    endpoint.mark(False, f"{type(e).__name__}: {e}")
+                continue
+            with self._lock:
+                endpoint.observe(time.perf_counter() - start)
+                endpoint.block = block
+                endpoint.mark(True)
+        with self._lock:
+            best = max((e.block for e in self.endpoints if e.healthy and e.block is not None), default=None)
+            for endpoint in self.endpoints:
+                if endpoint.healthy and best is not None and best - endpoint.block > self.max_lag_blocks:
+                    endpoint.mark(False, f"lagging {best - endpoint.block} blocks behind")
+        return self.status()
+
+    def status(self):
+        with self._lock:
+            return [e.status() for e in self.endpoints]
+
+    def _run(self):
+        while True:
+            self.check()
+            if self._stop.wait(self.health_interval):
+                return
+
+    def _ensure_health_checker(self):
+        if self._thread is not None or not self.health_interval:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rpc-health", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
@@ -0,0 +1,149 @@
+# backend/app/scheduler.py
+"""Gas-price-aware anchoring scheduler.
+
+Instead of sending one transaction the moment each batch arrives, pending
+batches are held per tenant and submitted together when one of the tenant's
+policy triggers fires:
+
+``max_batches``
+    this many batches are waiting;
+``max_delay``
+    the oldest waiting batch has been pending for ``max_delay_s`` seconds
+    (the latency SLA);
+``fee_below_budget``
+    the chain's base fee is at or below ``fee_budget_gwei`` (0 disables) and
+    the oldest batch has waited at least ``min_delay_s``, so cheap periods
+    still batch instead of sending a transaction every tick.
+
+The scheduler itself knows nothing about MongoDB or Web3: it is driven by
+callbacks, so the same code runs in the API process and in the simulation
+harness (``bench/sim_anchor_scheduler.py``).
+"""
+import os
+import threading
+import time
+
+from app import metrics
+
+DEFAULT_POLICY = {
+    "max_delay_s": int(os.getenv("ANCHOR_MAX_DELAY_S", "900")),
+    "max_batches": int(os.getenv("ANCHOR_MAX_BATCHES", "50")),
+    "fee_budget_gwei": float(os.getenv("ANCHOR_FEE_BUDGET_GWEI", "0")),
+    "min_delay_s": int(os.getenv("ANCHOR_MIN_DELAY_S", "300")),
+}
+TICK_SECONDS = int(os.getenv("ANCHOR_TICK_S", "30"))
+
+base_fee_gauge = metrics.register(metrics.Gauge(
+    "logchain_anchor_base_fee_gwei", "Base fee seen by the anchoring scheduler at its last tick"))
+scheduled_total = metrics.register(metrics.Counter(
+    "logchain_anchor_scheduled_total", "Scheduler submissions by trigger", ("reason",)))
+
+
+def merge_policy(overrides=None):
+    """Tenant policy: the defaults with any stored overrides applied."""
+    policy = dict(DEFAULT_POLICY)
+    for key, value in (overrides or {}).items():
+        if key in policy and value is not None:
+            policy[key] = value
+    return policy
+
+
+def decide(created, now, base_fee_gwei, policy):
+    """Return the trigger that fires for pending batches created at ``created`` (or None)."""
+    if not created:
+        return None
+    if len(created) >= policy["max_batches"]:
+        return "max_batches"
+    age = now - min(created)
+    if age >= policy["max_delay_s"]:
+        return "max_delay"
+    budget = policy.get("fee_budget_gwei") or 0
+    if budget and base_fee_gwei is not None and base_fee_gwei <= budget and age >= policy.get("min_delay_s", 0):
+        return "fee_below_budget"
+    return None
+
+
+class AnchorScheduler:
+    """Periodically submit pending batches per tenant according to their policies.
+
+    ``list_pending()`` returns ``{tenant: [(created_ts, batch), ...]}``,
+    ``submit(tenant, batches, reason)`` anchors them, ``base_fee()`` returns
+    the current base fee in gwei (or None) and ``get_policy(tenant)`` the
+    tenant's merged policy.
+    """
+
+    def __init__(self, list_pending, submit, base_fee, get_policy, interval=TICK_SECONDS, clock=time.time):
+        self.list_pending = list_pending
+        self.submit = submit
+        self.base_fee = base_fee
+        self.get_policy = get_policy
+        self.interval = interval
+        self.clock = clock
+        self.last_base_fee = None
+        self.last_tick = None
+        # Moving average of submit -> confirmation time, for time-to-anchor estimates
+        self.confirm_s = 15.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def tick(self, now=None):
+        """Run one scheduling pass; returns ``[(tenant, reason, count)]`` submitted."""
+        now = self.clock() if now is None else now
+        try:
+            self.last_base_fee = self.base_fee()
+        except Exception as e:
+            print(f"Warning: Could not read base fee: {e}")
+            self.last_base_fee = None
+        if self.last_base_fee is not None:
+            base_fee_gauge.set(self.last_base_fee)
+        self.last_tick = now
+
+        submitted = []
+        for tenant, pending in self.list_pending().items():
+            try:
+                policy = self.get_policy(tenant)
+                reason = decide([created for created, _batch in pending], now, self.last_base_fee, policy)
+                if not reason:
+                    continue
+                self.submit(tenant, [batch for _created, batch in pending], reason)
+            except Exception as e:
+                print(f"Warning: Scheduled anchoring failed for {tenant}: {e}")
+                continue
+            scheduled_total.inc(reason)
+            submitted.append((tenant, reason, len(pending)))
+        return submitted
+
+    def observe_confirmation(self, seconds):
+        """Feed the time an anchor took from submission to confirmation (see ``app.receipts``)."""
+        self.confirm_s = 0.8 * self.confirm_s + 0.2 * seconds
+
+    def expected_anchor_time(self, created, pending_created, policy, now=None):
+        """Estimated unix time at which a batch created at ``created`` will be anchored."""
+        now = self.clock() if now is None else now
+        next_tick = (self.last_tick or now) + self.interval
+        if decide(pending_created, max(now, next_tick), self.last_base_fee, policy):
+            submit_at = max(now, next_tick)
+        else:
+            # Latest case: the SLA deadline, rounded up to the tick after it
+            deadline = created + policy["max_delay_s"]
+            ticks = max(0, -(-(deadline - next_tick) // self.interval))
+            submit_at = next_tick + ticks * self.interval
+        return submit_at + self.confirm_s
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Warning: Anchor scheduler tick failed: {e}")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="anchor-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval)
@@ -1,30 +1,58 @@
 # backend/app/schemas.py
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional
 from datetime import datetime
 
+class SourceRoot(BaseModel):
+    path: str  # file path relative to the agent's LOG_DIR
+    root: str  # 0x-prefixed subtree root of the file's lines
+    lines: int
+
 class BatchCreate(BaseModel):
     batch_id: Optional[str] = None
     device_id: Optional[str] = None
     merkle_root: str  # 0x-prefixed hex 32-byte
+    merkle_scheme: Optional[str] = None  # defaults to the legacy scheme for old clients
     ipfs_cid: Optional[str] = None
     size: Optional[int] = None
+    sources: Optional[list[SourceRoot]] = None  # per-file roots; merkle_root is their batch root
+    idempotency_key: Optional[str] = Field(None, max_length=128)  # retries with the same key get the same batch
 
 class BatchOut(BaseModel):
     id: str
     batch_id: Optional[str]
     device_id: Optional[str]
     merkle_root: str
+    merkle_scheme: Optional[str] = None
     ipfs_cid: Optional[str]
     size: Optional[int]
+    source_count: Optional[int] = None
+    mmr_index: Optional[int] = None  # leaf index in the device's MMR
     anchored: int
     tx_hash: Optional[str]
     tx_block: Optional[int]
     created_at: Optional[datetime]
+    archived: bool = False  # served from an archive file rather than the hot collection
 
     class Config:
         from_attributes = True
 
+class BatchCreated(BatchOut):
+    deduplicated: bool = False  # answered with an existing batch (retried key or unchanged root)
+
+
+class ProofVerify(BaseModel):
+    line: str
+    proof: list[list[str]]  # [side, hex] pairs from leaf to root
+    path: Optional[str] = None  # for per-source batches: proof is against this file's root
+
+
+class AnchorPolicy(BaseModel):
+    max_delay_s: Optional[int] = Field(None, ge=0)  # latency SLA: anchor within this many seconds
+    max_batches: Optional[int] = Field(None, ge=1)  # anchor once this many batches are pending
+    fee_budget_gwei: Optional[float] = Field(None, ge=0)  # anchor early at or below this base fee; 0 disables
+    min_delay_s: Optional[int] = Field(None, ge=0)  # minimum wait before a fee-triggered early anchor
+
 
 class UserCreate(BaseModel):
     email: EmailStr
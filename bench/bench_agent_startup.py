@@ -0,0 +1,56 @@
+"""Startup time and RSS of the headless agent (``agent.py``).
+
+Imports the agent in a fresh interpreter ``--runs`` times and reports the
+import wall time, RSS after import, and any GUI modules that got loaded
+(there should be none).
+
+    python bench/bench_agent_startup.py --runs 10 --out startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from common import emit, percentile  # noqa: E402
+
+CLIENT_DIR = os.path.join(os.path.dirname(__file__), "..", "logChain-client")
+
+_PROBE = """
+import json, os, sys, time
+t0 = time.perf_counter()
+import agent
+elapsed = time.perf_counter() - t0
+with open("/proc/self/statm") as f:
+    rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+gui = sorted(m for m in sys.modules if m.split(".")[0] in ("tkinter", "_tkinter", "ttkbootstrap", "PIL"))
+print(json.dumps({"import_s": elapsed, "rss_bytes": rss, "modules": len(sys.modules), "gui_modules": gui}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure headless agent startup")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.check_output([sys.executable, "-c", _PROBE], cwd=CLIENT_DIR)
+        samples.append(json.loads(out))
+
+    import_times = [s["import_s"] for s in samples]
+    emit("agent_startup", {
+        "runs": args.runs,
+        "import_p50_ms": round(percentile(import_times, 50) * 1000, 2),
+        "import_max_ms": round(max(import_times) * 1000, 2),
+        "rss_mb": round(max(s["rss_bytes"] for s in samples) / 1e6, 1),
+        "modules_loaded": samples[-1]["modules"],
+        "gui_modules": samples[-1]["gui_modules"],
+    }, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""API hot-path benchmark for the FastAPI backend.
+
+Runs the app in-process through Starlette's TestClient against either a
+local mongod (``--mongo mongodb://...``) or an in-memory ``mongomock``
+stand-in (``--mongo mongomock``). With ``--evm`` the contract is deployed to
+an in-process EVM (web3's EthereumTesterProvider) so anchoring is measured
+too. Requires the backend requirements plus ``mongomock`` / ``eth-tester[py-evm]``
+for the in-memory options.
+
+    python bench/bench_api.py --mongo mongomock --evm --batches 10000 --out api.json
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from common import emit, latency_summary, peak_rss_mb  # noqa: E402
+
+
+def build_app(mongo, db_name):
+    """Import the backend against the requested database and return the modules."""
+    if mongo == "mongomock":
+        import mongomock
+        import pymongo
+
+        pymongo.MongoClient = mongomock.MongoClient
+    else:
+        os.environ["MONGO_URI"] = mongo
+    os.environ["DB_NAME"] = db_name
+
+    from app import db, eth, main
+
+    return db, eth, main
+
+
+def attach_evm(eth, main, provider=None):
+    """Deploy LogAnchor to an in-process EVM (or ``provider``) and point the app at it."""
+    from web3 import EthereumTesterProvider, Web3
+
+    provider = provider or EthereumTesterProvider()
+    w3 = Web3(provider)
+    eth.w3 = w3
+    eth.PRIVATE_KEY = provider.ethereum_tester.backend.account_keys[0]
+    eth.CHAIN_ID = w3.eth.chain_id
+
+    abi, bytecode = eth.compile_contract(main.CONTRACT_PATH)
+    contract = w3.eth.contract(abi=abi, bytecode=bytecode)
+    tx_hash = contract.constructor().transact({"from": w3.eth.accounts[0]})
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    main.abi = abi
+    main.contract_instance = eth.load_contract_instance(abi, receipt.contractAddress)
+
+
+def seed(db, user_id, batches, devices):
+    """Insert ``batches`` batches and ``devices`` devices for ``user_id`` directly."""
+    from bson import ObjectId
+
+    uid = ObjectId(user_id)
+    now = datetime.utcnow()
+    db.devices_collection.insert_many([
+        {"user_id": uid, "device_id": f"bench-dev-{i}", "name": f"bench-dev-{i}",
+         "created_at": now, "last_seen": now - timedelta(minutes=i % 10)}
+        for i in range(devices)
+    ])
+    docs = []
+    for i in range(batches):
+        anchored = 1 if i % 3 else 0
+        docs.append({
+            "batch_id": uuid.uuid4().hex[:8],
+            "device_id": f"bench-dev-{i % devices}",
+            "merkle_root": "0x" + os.urandom(32).hex(),
+            "ipfs_cid": None,
+            "size": 1000 + i % 500,
+            "anchored": anchored,
+            "tx_hash": "0x" + os.urandom(32).hex() if anchored else None,
+            "tx_block": 1000 + i if anchored else None,
+            "user_id": uid,
+            "created_at": now - timedelta(seconds=batches - i),
+        })
+        if len(docs) >= 10000:
+            db.batches_collection.insert_many(docs)
+            docs = []
+    if docs:
+        db.batches_collection.insert_many(docs)
+
+
+def measure(fn, ops, concurrency):
+    """Run ``fn`` ``ops`` times and return latency/throughput/CPU figures."""
+    samples = []
+    errors = 0
+
+    def one(_):
+        start = time.perf_counter()
+        ok = fn()
+        return time.perf_counter() - start, ok
+
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    wall_start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(one, range(ops)))
+    else:
+        outcomes = [one(i) for i in range(ops)]
+    elapsed = time.perf_counter() - wall_start
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+
+    for latency, ok in outcomes:
+        samples.append(latency)
+        errors += 0 if ok else 1
+    summary = latency_summary(samples, elapsed)
+    cpu = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+    summary["cpu_ms_per_op"] = round(cpu / ops * 1000, 3) if ops else None
+    summary["errors"] = errors
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend API hot paths")
+    parser.add_argument("--mongo", default="mongomock", help="'mongomock' or a MongoDB URI")
+    parser.add_argument("--db-name", default="logchain_bench")
+    parser.add_argument("--evm", action="store_true", help="deploy to an in-process EVM and bench anchoring")
+    parser.add_argument("--batches", type=int, default=10000, help="batches to seed")
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    db, eth, main_mod = build_app(args.mongo, args.db_name)
+    if args.mongo != "mongomock":
+        db.client.drop_database(args.db_name)
+        db.create_indexes()
+    if args.evm:
+        attach_evm(eth, main_mod)
+
+    from fastapi.testclient import TestClient
+    from app.auth import decode_token
+
+    client = TestClient(main_mod.app)
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    token = client.post("/signup", json={"email": email, "password": "benchpass"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = decode_token(token)["sub"]
+
+    seed_start = time.perf_counter()
+    seed(db, user_id, args.batches, args.devices)
+    seed_s = time.perf_counter() - seed_start
+
+    created = []
+
+    def create_batch():
+        res = client.post("/batches", headers=headers, json={
+            "batch_id": uuid.uuid4().hex[:8], "device_id": "bench-dev-0",
+            "merkle_root": "0x" + os.urandom(32).hex(), "size": 1000,
+        })
+        if res.status_code == 200:
+            created.append(res.json()["id"])
+        return res.status_code == 200
+
+    def get(path):
+        return lambda: client.get(path, headers=headers).status_code == 200
+
+    def build(path):
+        # A query string never seen before misses the response cache, so every call
+        # queries, serialises and encodes the listing (as the first poll after a write does)
+        counter = iter(range(10 ** 9))
+        sep = "&" if "?" in path else "?"
+        return lambda: client.get(f"{path}{sep}nocache={next(counter)}", headers=headers).status_code == 200
+
+    def revalidate(path):
+        # Poll with the ETag of the previous response, as the browser does
+        conditional = {**headers, "If-None-Match": client.get(path, headers=headers).headers["etag"]}
+        return lambda: client.get(path, headers=conditional).status_code == 304
+
+    results = {
+        "config": vars(args),
+        "seed_seconds": round(seed_s, 3),
+        "endpoints": {
+            "POST /batches": measure(create_batch, args.ops, args.concurrency),
+            "GET /batches": measure(get("/batches"), args.ops, args.concurrency),
+            "GET /batches?limit=100": measure(get("/batches?limit=100"), args.ops, args.concurrency),
+            "GET /batches (uncached)": measure(build("/batches"), args.ops, args.concurrency),
+            "GET /batches?limit=100 (uncached)": measure(build("/batches?limit=100"), args.ops, args.concurrency),
+            "GET /dashboard/stats": measure(get("/dashboard/stats"), args.ops, args.concurrency),
+            "GET /devices?include_batch_info=true": measure(
+                get("/devices?include_batch_info=true"), args.ops, args.concurrency),
+            "GET /batches (304)": measure(revalidate("/batches"), args.ops, args.concurrency),
+            "GET /dashboard/stats (304)": measure(revalidate("/dashboard/stats"), args.ops, args.concurrency),
+        },
+    }
+    if args.evm:
+        pending = list(created)
+
+        def anchor():
+            return client.post(f"/batches/{pending.pop()}/anchor", headers=headers).status_code == 200
+
+        results["endpoints"]["POST /batches/{id}/anchor"] = measure(anchor, min(args.ops, len(pending)), 1)
+    results["peak_rss_mb"] = peak_rss_mb()
+    emit("api", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Client hashing pipeline benchmark: read_logs + compute_merkle_root.
+
+Each corpus size runs in its own subprocess so peak RSS is measured per
+size. Sizes accept scientific notation (10^4 .. 10^8 lines):
+
+    python bench/bench_client.py --sizes 1e4,1e5,1e6 --out client.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "logChain-client"))
+
+from common import emit, peak_rss_mb  # noqa: E402
+from corpus import generate, parse_count  # noqa: E402
+
+
+def _run_case(corpus_dir, scheme, repeat, conn):
+    import client
+
+    client.LOG_DIR = corpus_dir
+    best_read = best_hash = None
+    lines = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        logs = client.read_logs()
+        read_s = time.perf_counter() - start
+        start = time.perf_counter()
+        client.compute_merkle_root(logs, scheme)
+        hash_s = time.perf_counter() - start
+        lines = len(logs)
+        del logs
+        best_read = read_s if best_read is None else min(best_read, read_s)
+        best_hash = hash_s if best_hash is None else min(best_hash, hash_s)
+    conn.send({
+        "lines": lines,
+        "read_s": round(best_read, 6),
+        "hash_s": round(best_hash, 6),
+        "read_lines_per_sec": round(lines / best_read) if best_read else None,
+        "hash_lines_per_sec": round(lines / best_hash) if best_hash else None,
+        "total_lines_per_sec": round(lines / (best_read + best_hash)) if lines else None,
+        "peak_rss_mb": peak_rss_mb(),
+    })
+    conn.close()
+
+
+def run_case(corpus_dir, scheme, repeat):
+    parent, child = multiprocessing.Pipe(duplex=False)
+    proc = multiprocessing.Process(target=_run_case, args=(corpus_dir, scheme, repeat, child))
+    proc.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"error": f"benchmark process exited with code {proc.exitcode}"}
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the client hashing pipeline")
+    parser.add_argument("--sizes", default="1e4,1e5,1e6", help="comma-separated line counts")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--scheme", default=None, help="Merkle scheme (default: client default)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    from merkle import DEFAULT_SCHEME
+
+    scheme = args.scheme or DEFAULT_SCHEME
+    results = []
+    for size in (parse_count(s) for s in args.sizes.split(",")):
+        corpus_dir = generate(size, args.files)
+        case = {"size": size, "scheme": scheme}
+        case.update(run_case(corpus_dir, scheme, args.repeat))
+        results.append(case)
+        print(json.dumps(case), file=sys.stderr)
+    emit("client", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare Merkle scheme throughput (lines/s) on a real log corpus.
+
+Usage:
+    python bench/bench_merkle_schemes.py [PATH ...] [--repeat N]
+
+PATH may be a file or a directory (read recursively); defaults to $LOG_DIR
+or /var/log. Prints one JSON object with results per scheme.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "logChain-client"))
+
+from merkle import SCHEMES, compute_merkle_root  # noqa: E402
+
+
+def load_corpus(paths):
+    lines = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, _dirs, files in os.walk(path):
+                for name in sorted(files):
+                    lines.extend(_read(os.path.join(dirpath, name)))
+        elif os.path.isfile(path):
+            lines.extend(_read(path))
+    return lines
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.readlines()
+    except OSError:
+        return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=[os.getenv("LOG_DIR", "/var/log")])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = load_corpus(args.paths)
+    if not lines:
+        sys.exit(f"No log lines found in {args.paths}")
+    total_bytes = sum(len(line.encode()) for line in lines)
+
+    results = {}
+    for scheme in SCHEMES:
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            root = compute_merkle_root(lines, scheme)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[scheme] = {
+            "root": root,
+            "seconds": round(best, 6),
+            "lines_per_sec": round(len(lines) / best),
+            "mb_per_sec": round(total_bytes / best / 1e6, 2),
+        }
+
+    print(json.dumps({"lines": len(lines), "bytes": total_bytes, "schemes": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Failover drill for the backend's RPC provider pool.
+
+Starts ``--nodes`` local JSON-RPC servers, each backed by its own in-process
+EVM (web3's EthereumTesterProvider) with a different artificial latency,
+points a ``ProviderPool`` at them and issues read calls from several threads.
+Partway through, the fastest node is killed (its server socket closed); later
+it is restarted on the same port. The report shows calls per endpoint, failed
+calls (should be 0), failovers and latency before/after the kill and after
+recovery. Requires ``eth-tester[py-evm]`` (see ``bench/requirements.txt``).
+
+    python bench/bench_rpc_pool.py --nodes 3 --calls 3000 --out rpc_pool.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from common import emit, latency_summary, peak_rss_mb  # noqa: E402
+
+
+class EvmNode:
+    """HTTP JSON-RPC stand-in for a node, backed by an in-process EVM."""
+
+    def __init__(self, port, delay):
+        from web3 import EthereumTesterProvider, Web3
+
+        self.port = port
+        self.delay = delay
+        self.provider = EthereumTesterProvider()
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._to_json = Web3.to_json
+        self.server = None
+        self.dead = False
+
+    def start(self):
+        node = self
+        self.dead = False
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like a real node
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if node.dead:
+                    # Drop kept-alive connections without answering, like a crashed node
+                    self.close_connection = True
+                    return
+                time.sleep(node.delay)
+                with node._lock:
+                    node.calls += 1
+                    response = node.provider.make_request(request["method"], request.get("params", []))
+                response["id"] = request.get("id")
+                body = node._to_json(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def kill(self):
+        self.dead = True
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+def run_phase(w3, calls, concurrency):
+    errors = []
+    samples = []
+
+    def one():
+        start = time.perf_counter()
+        try:
+            w3.eth.get_block("latest")
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            return
+        samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(calls):
+            pool.submit(one)
+    summary = latency_summary(samples, time.perf_counter() - start)
+    summary["errors"] = len(errors)
+    summary["first_error"] = errors[0] if errors else None
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kill-a-node failover drill for ProviderPool")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=3000, help="calls per phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base-delay", type=float, default=0.002, help="latency of the fastest node in seconds")
+    parser.add_argument("--health-interval", type=float, default=1.0)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    from web3 import Web3
+    from app.rpcpool import ProviderPool
+
+    nodes = [EvmNode(0, args.base_delay * (i + 1)).start() for i in range(args.nodes)]
+    pool = ProviderPool([n.url for n in nodes], health_interval=args.health_interval)
+    w3 = Web3(pool)
+    fastest = nodes[0]
+
+    results = {"config": vars(args), "phases": {}}
+    results["phases"]["all_up"] = run_phase(w3, args.calls, args.concurrency)
+    fastest.kill()
+    results["phases"]["fastest_killed"] = run_phase(w3, args.calls, args.concurrency)
+    results["status_after_kill"] = pool.status()
+    fastest.start()  # same port
+    time.sleep(args.health_interval * 2)
+    results["phases"]["recovered"] = run_phase(w3, args.calls, args.concurrency)
+    results["status_after_recovery"] = pool.status()
+    results["calls_per_node"] = {n.url: n.calls for n in nodes}
+    results["failovers"] = sum(e["failovers"] for e in results["status_after_recovery"])
+    pool.close()
+    results["peak_rss_mb"] = peak_rss_mb()
+    emit("rpc_pool", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
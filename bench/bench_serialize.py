@@ -0,0 +1,112 @@
+"""Response-path benchmark: batch listings with and without the fast JSON path.
+
+Serves the same in-memory batch documents (v2 schema, as read from MongoDB)
+through two routes of a bare FastAPI app, so only serialisation is measured:
+
+validated
+    the previous path: ``decode_batch`` + ``serialize_batch``, then FastAPI
+    validates the list against ``response_model=list[BatchOut]``, walks it
+    with ``jsonable_encoder`` and encodes it with the stdlib;
+fast
+    ``serialize_batch`` straight from the document into a
+    ``FastJSONResponse`` (orjson when installed), no response validation.
+
+Reports requests/s and CPU ms per request for each listing size. Imports the
+backend against ``mongomock`` (nothing is queried), like ``bench_api.py``.
+
+    python bench/bench_serialize.py --sizes 100 1000 --ops 200 --out serialize.json
+"""
+import argparse
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from bench_api import build_app, measure  # noqa: E402
+from common import emit, peak_rss_mb  # noqa: E402
+
+
+def make_docs(count):
+    from bson import ObjectId
+
+    from app import compact
+
+    now = datetime.utcnow()
+    docs = []
+    for i in range(count):
+        anchored = 1 if i % 3 else 0
+        created = now - timedelta(seconds=count - i)
+        docs.append(compact.encode_batch({
+            "_id": ObjectId.from_datetime(created),
+            "batch_id": uuid.uuid4().hex[:8],
+            "device_id": f"bench-dev-{i % 20}",
+            "merkle_root": "0x" + os.urandom(32).hex(),
+            "merkle_scheme": "v1-sha256-dup",
+            "ipfs_cid": None,
+            "size": 1000 + i % 500,
+            "mmr_index": i,
+            "anchored": anchored,
+            "tx_hash": "0x" + os.urandom(32).hex() if anchored else None,
+            "tx_block": 1000 + i if anchored else None,
+            "created_at": created,
+        }))
+    return docs
+
+
+def serialize_app(main, docs):
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+
+    from app import compact, schemas
+    from app.fastjson import FastJSONResponse
+
+    bench_app = FastAPI()
+
+    @bench_app.get("/validated", response_model=list[schemas.BatchOut], response_class=JSONResponse)
+    def validated(limit: int):
+        return [main.serialize_batch(compact.decode_batch(d)) for d in docs[:limit]]
+
+    @bench_app.get("/fast", response_model=list[schemas.BatchOut])
+    def fast(limit: int):
+        return FastJSONResponse([main.serialize_batch(d) for d in docs[:limit]])
+
+    return bench_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch listing response path")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000], help="batches per response")
+    parser.add_argument("--ops", type=int, default=200, help="requests per route and size")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--out", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    _db, _eth, main_mod = build_app("mongomock", "logchain_bench")
+    from fastapi.testclient import TestClient
+
+    from app import fastjson
+
+    client = TestClient(serialize_app(main_mod, make_docs(max(args.sizes))))
+    results = {"config": vars(args), "orjson": fastjson.HAS_ORJSON, "routes": {}}
+    for size in args.sizes:
+        # Same body either way: only the cost differs
+        assert client.get(f"/validated?limit={size}").json() == client.get(f"/fast?limit={size}").json()
+        for route in ("validated", "fast"):
+            def call(path=f"/{route}?limit={size}"):
+                return client.get(path).status_code == 200
+            results["routes"][f"{route} x{size}"] = measure(call, args.ops, args.concurrency)
+        before = results["routes"][f"validated x{size}"]
+        after = results["routes"][f"fast x{size}"]
+        results["routes"][f"speedup x{size}"] = {
+            "ops_per_sec": round(after["ops_per_sec"] / before["ops_per_sec"], 2),
+            "cpu_ms_per_op": round(before["cpu_ms_per_op"] / after["cpu_ms_per_op"], 2),
+        }
+    results["peak_rss_mb"] = peak_rss_mb()
+    emit("serialize", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
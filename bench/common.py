@@ -0,0 +1,66 @@
+"""Shared helpers for the benchmark scripts: timing stats, RSS and JSON output."""
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (seconds)."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def latency_summary(samples, elapsed=None):
+    """Summarise per-op latencies into throughput and p50/p99 in milliseconds."""
+    elapsed = elapsed if elapsed is not None else sum(samples)
+    return {
+        "ops": len(samples),
+        "ops_per_sec": round(len(samples) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3) if samples else None,
+        "p99_ms": round(percentile(samples, 99) * 1000, 3) if samples else None,
+        "max_ms": round(max(samples) * 1000, 3) if samples else None,
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def emit(name, results, out=None):
+    """Print (and optionally write) a machine-readable benchmark report."""
+    report = {
+        "benchmark": name,
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if out:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+    return report
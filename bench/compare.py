@@ -0,0 +1,70 @@
+"""Compare two benchmark JSON reports and flag regressions.
+
+    python bench/compare.py base.json head.json [--threshold 10]
+
+Throughput metrics (``*_per_sec``) regress when they drop; latency, time
+and memory metrics (``*_ms``, ``*_s``, ``seconds``, ``*_mb``) regress when
+they grow. Exits non-zero if any metric regressed by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def flatten(obj, prefix=""):
+    out = {}
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            out.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(obj, list):
+        for i, value in enumerate(obj):
+            key = value.get("size", i) if isinstance(value, dict) else i
+            out.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix[:-1]] = obj
+    return out
+
+
+def direction(metric):
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith("_per_sec"):
+        return 1
+    if name.endswith(("_ms", "_s", "_mb")) or name == "seconds":
+        return -1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change treated as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    base_metrics = flatten(base["results"])
+    head_metrics = flatten(head["results"])
+
+    print(f"{base.get('revision')} -> {head.get('revision')}")
+    regressions = 0
+    for metric in sorted(set(base_metrics) & set(head_metrics)):
+        sign = direction(metric)
+        old, new = base_metrics[metric], head_metrics[metric]
+        if not sign or not old:
+            continue
+        change = (new - old) / old * 100
+        flag = ""
+        if sign * change < -args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif sign * change > args.threshold:
+            flag = "  improved"
+        print(f"{metric:60s} {old:>14.3f} {new:>14.3f} {change:+8.1f}%{flag}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Deterministic synthetic log corpora for the client benchmarks.
+
+Corpora are cached under ``bench/.corpus/<lines>/`` as several syslog-like
+files so repeated runs (and runs on different commits) hash identical input.
+
+Usage:
+    python bench/corpus.py 1e6 [--files 8]
+"""
+import argparse
+import os
+import random
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), ".corpus")
+
+_HOSTS = ["web01", "web02", "db01", "cache01", "worker03"]
+_PROCS = ["sshd", "nginx", "kernel", "systemd", "cron", "postgres", "app"]
+_MESSAGES = [
+    "Accepted publickey for deploy from 10.0.{a}.{b} port {port} ssh2",
+    "GET /api/v1/items/{n} HTTP/1.1 200 {size} \"-\" \"curl/8.4.0\"",
+    "session opened for user root by (uid=0)",
+    "Connection closed by 192.168.{a}.{b} port {port} [preauth]",
+    "checkpoint complete: wrote {n} buffers ({a}.{b}%)",
+    "Out of memory: Killed process {n} (java) total-vm:{size}kB",
+    "Started Session {n} of user app.",
+    "worker {a} finished job {n} in {size}ms",
+]
+
+
+def parse_count(text):
+    return int(float(text))
+
+
+def corpus_path(lines, files=8):
+    return os.path.join(CORPUS_DIR, f"{lines}-{files}")
+
+
+def generate(lines, files=8, seed=1234):
+    """Create (or reuse) a corpus with ``lines`` lines split over ``files`` files."""
+    path = corpus_path(lines, files)
+    marker = os.path.join(path, ".complete")
+    if os.path.exists(marker):
+        return path
+    os.makedirs(path, exist_ok=True)
+    rng = random.Random(seed)
+    per_file = lines // files
+    ts = 1_700_000_000
+    for i in range(files):
+        count = per_file + (lines % files if i == files - 1 else 0)
+        with open(os.path.join(path, f"syslog.{i}"), "w") as f:
+            buf = []
+            for _ in range(count):
+                ts += rng.randint(0, 2)
+                msg = rng.choice(_MESSAGES).format(
+                    a=rng.randint(0, 255), b=rng.randint(0, 255),
+                    port=rng.randint(1024, 65535), n=rng.randint(1, 10**6),
+                    size=rng.randint(100, 10**6),
+                )
+                buf.append(f"{ts} {rng.choice(_HOSTS)} {rng.choice(_PROCS)}[{rng.randint(1, 32768)}]: {msg}\n")
+                if len(buf) >= 10000:
+                    f.writelines(buf)
+                    buf = []
+            f.writelines(buf)
+    open(marker, "w").close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic log corpus")
+    parser.add_argument("lines", type=parse_count)
+    parser.add_argument("--files", type=int, default=8)
+    args = parser.parse_args()
+    print(generate(args.lines, args.files))
+
+
+if __name__ == "__main__":
+    main()
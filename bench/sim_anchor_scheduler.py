@@ -0,0 +1,142 @@
+"""Cost vs. latency simulation for the anchoring scheduler.
+
+Replays a synthetic fleet (Poisson batch arrivals per device) against a
+synthetic base-fee curve (daily cycle, autocorrelated noise and occasional
+congestion spikes) and drives the backend's ``AnchorScheduler`` with a
+simulated clock. Each policy is scored on total fee paid, transactions sent
+and time-to-anchor percentiles.
+
+    python bench/sim_anchor_scheduler.py --hours 72 --devices 50 --out sim.json
+
+Submissions follow the backend: one MMR checkpoint transaction per device
+with pending batches (``--per-batch`` sends one transaction per batch).
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from common import emit, percentile  # noqa: E402
+from app.scheduler import AnchorScheduler, merge_policy  # noqa: E402
+
+ANCHOR_GAS = 95_000  # gas of one anchor() call with short batch id / CID strings
+
+
+def fee_curve(hours, seed, mean_gwei=20.0, step=60):
+    """Base fee in gwei sampled every ``step`` seconds."""
+    rng = random.Random(seed)
+    fees = []
+    noise = 0.0
+    spike = 0
+    for i in range(int(hours * 3600 / step) + 1):
+        t = i * step
+        daily = 1 + 0.45 * math.sin(2 * math.pi * (t / 86400 - 0.3))
+        noise = 0.9 * noise + rng.gauss(0, 0.08)
+        if spike:
+            spike -= 1
+        elif rng.random() < 0.002:
+            spike = rng.randint(5, 30)  # 5-30 minutes of congestion
+        fees.append(mean_gwei * daily * math.exp(noise) * (3 if spike else 1))
+    return fees
+
+
+def arrivals(hours, devices, tenants, interval, seed):
+    """Sorted ``(time, tenant, device)`` batch arrivals."""
+    rng = random.Random(seed + 1)
+    events = []
+    for d in range(devices):
+        t = rng.uniform(0, interval)
+        while t < hours * 3600:
+            events.append((t, f"tenant-{d % tenants}", f"dev-{d}"))
+            t += rng.expovariate(1.0 / interval)
+    events.sort()
+    return events
+
+
+def simulate(policy, fees, events, hours, tick, confirm_s, per_batch, step=60):
+    now = [0.0]
+    pending = {}
+    stats = {"txs": 0, "fee_gwei_gas": 0.0, "latencies": [], "reasons": {}}
+
+    def base_fee():
+        return fees[min(int(now[0] // step), len(fees) - 1)]
+
+    def submit(tenant, batches, reason):
+        fee = base_fee()
+        txs = len(batches) if per_batch else len({device for _created, device in batches})
+        stats["txs"] += txs
+        stats["fee_gwei_gas"] += txs * ANCHOR_GAS * fee
+        stats["latencies"].extend(now[0] + confirm_s - created for created, _device in batches)
+        stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+        pending.pop(tenant, None)
+
+    def list_pending():
+        return {tenant: [(created, (created, device)) for created, device in items] for tenant, items in pending.items()}
+
+    sched = AnchorScheduler(list_pending, submit, base_fee, lambda tenant: policy, interval=tick, clock=lambda: now[0])
+    i = 0
+    end = hours * 3600
+    while now[0] <= end:
+        while i < len(events) and events[i][0] <= now[0]:
+            t, tenant, device = events[i]
+            pending.setdefault(tenant, []).append((t, device))
+            i += 1
+        sched.tick(now[0])
+        now[0] += tick
+    latencies = stats["latencies"]
+    return {
+        "batches_anchored": len(latencies),
+        "batches_left_pending": sum(len(v) for v in pending.values()),
+        "transactions": stats["txs"],
+        "cost_eth": round(stats["fee_gwei_gas"] / 1e9, 6),
+        "cost_per_batch_gwei": round(stats["fee_gwei_gas"] / max(1, len(latencies)), 1),
+        "time_to_anchor_p50_s": round(percentile(latencies, 50), 1) if latencies else None,
+        "time_to_anchor_p95_s": round(percentile(latencies, 95), 1) if latencies else None,
+        "time_to_anchor_max_s": round(max(latencies), 1) if latencies else None,
+        "triggers": stats["reasons"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate anchoring policies against a synthetic fee curve")
+    parser.add_argument("--hours", type=float, default=72)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--batch-interval", type=float, default=60, help="mean seconds between batches per device")
+    parser.add_argument("--tick", type=int, default=30, help="scheduler tick in seconds")
+    parser.add_argument("--confirm", type=float, default=15, help="seconds from submission to receipt")
+    parser.add_argument("--per-batch", action="store_true", help="one transaction per batch instead of per device")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    fees = fee_curve(args.hours, args.seed)
+    events = arrivals(args.hours, args.devices, args.tenants, args.batch_interval, args.seed)
+    cheap = round(percentile(fees, 25), 2)
+    policies = {
+        "immediate": {"max_batches": 1},
+        "delay-5m": {"max_delay_s": 300, "max_batches": 10**9},
+        "delay-15m": {"max_delay_s": 900, "max_batches": 10**9},
+        "delay-60m": {"max_delay_s": 3600, "max_batches": 10**9},
+        "delay-60m+budget-p25": {"max_delay_s": 3600, "max_batches": 10**9, "fee_budget_gwei": cheap, "min_delay_s": 900},
+        "delay-6h+budget-p25": {"max_delay_s": 6 * 3600, "max_batches": 10**9, "fee_budget_gwei": cheap, "min_delay_s": 1800},
+    }
+    results = {
+        "config": vars(args),
+        "fee_gwei": {"p25": cheap, "p50": round(percentile(fees, 50), 2), "max": round(max(fees), 2)},
+        "batches": len(events),
+        "policies": {},
+    }
+    for name, overrides in policies.items():
+        policy = merge_policy({"fee_budget_gwei": 0, **overrides})
+        results["policies"][name] = simulate(
+            policy, fees, events, args.hours, args.tick, args.confirm, args.per_batch)
+    emit("anchor_scheduler_sim", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""Fleet load test: N virtual agents replaying the agent's request mix.
+
+Starts the backend in a subprocess (uvicorn, against a local mongod or
+``mongomock``, with LogAnchor deployed to an in-process EVM) and drives it
+from one asyncio event loop. Each virtual device does what ``run_agent_loop``
+and its ``heartbeat_thread`` do:
+
+1. ``POST /login``, ``GET /devices`` and ``POST /devices`` if not registered;
+2. ``POST /devices/heartbeat`` at start and every ``--heartbeat`` seconds;
+3. every ``--batch-interval`` seconds ``POST /batches`` (per-file sources,
+   v1 scheme) followed by anchoring according to ``--anchor-every``
+   (1: ``POST /batches/{id}/anchor``; N: ``POST /devices/{id}/mmr/anchor``
+   every N batches; 0: leave it to the backend scheduler).
+
+Several fleet sizes can be given; each step reports throughput, latency
+percentiles and error rates per endpoint, plus the MongoDB commands and
+JSON-RPC calls per request taken from the backend's ``/metrics``, which is
+where saturation shows up first (``mongomock`` has no command monitoring,
+so Mongo counts need a real mongod). Requires ``httpx`` and, for the
+in-memory options, ``mongomock`` / ``eth-tester[py-evm]``.
+
+    python bench/sim_fleet.py --agents 100 500 1000 --duration 120 --mongo mongodb://127.0.0.1:27017
+    python bench/sim_fleet.py --agents 50 --duration 30 --batch-interval 10 --heartbeat 5 --mongo mongomock
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from common import emit, percentile, peak_rss_mb  # noqa: E402
+
+PASSWORD = "simpass123"
+
+
+# --- backend process ----------------------------------------------------------
+
+def serve(args):
+    """Run the backend in this process (invoked by the simulator with ``--serve``)."""
+    import uvicorn
+    from web3 import EthereumTesterProvider
+
+    from bench_api import attach_evm, build_app
+    from app.metrics import observe_rpc
+
+    class InstrumentedTesterProvider(EthereumTesterProvider):
+        def make_request(self, method, params):
+            return observe_rpc(str(method), super().make_request, method, params)
+
+    db, eth, main = build_app(args.mongo, args.db_name)
+    if args.mongo != "mongomock":
+        db.client.drop_database(args.db_name)
+        db.create_indexes()
+    attach_evm(eth, main, InstrumentedTesterProvider())
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+
+def start_backend(args):
+    cmd = [sys.executable, __file__, "--serve", "--port", str(args.port), "--mongo", args.mongo, "--db-name", args.db_name]
+    log = open(args.server_log, "w") if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(http, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await http.get("/metrics")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+    raise SystemExit("Backend did not start; see --server-log")
+
+
+# --- measurements ---------------------------------------------------------------
+
+class Stats:
+    def __init__(self):
+        self.samples = {}  # endpoint -> [seconds]
+        self.errors = {}  # endpoint -> count
+        self.first_error = {}
+
+    async def call(self, http, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            res = await http.request(method, url, **kwargs)
+            ok = res.status_code < 400
+            if not ok:
+                self.first_error.setdefault(endpoint, f"{res.status_code} {res.text[:200]}")
+        except Exception as e:
+            res, ok = None, False
+            self.first_error.setdefault(endpoint, f"{type(e).__name__}: {e}")
+        self.samples.setdefault(endpoint, []).append(time.perf_counter() - start)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return res if ok else None
+
+    def summary(self, elapsed, ops_per_request):
+        out = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ops = ops_per_request.get(endpoint, {})
+            out[endpoint] = {
+                "requests": len(samples),
+                "req_per_sec": round(len(samples) / elapsed, 2),
+                "error_rate": round(self.errors.get(endpoint, 0) / len(samples), 4),
+                "p50_ms": round(percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(percentile(samples, 99) * 1000, 2),
+                "max_ms": round(max(samples) * 1000, 2),
+                "mongo_ops_per_req": ops.get("mongo"),
+                "rpc_calls_per_req": ops.get("rpc"),
+                "first_error": self.first_error.get(endpoint),
+            }
+        return out
+
+
+_SAMPLE = re.compile(r'^(logchain_http_\w+?)(?:_count)?\{method="(\w+)",route="([^"]*)"(?:,status="\d+")?\} (\S+)$')
+
+
+async def scrape(http):
+    """Per-route request, Mongo command and RPC call totals from ``/metrics``."""
+    totals = {}
+    for line in (await http.get("/metrics")).text.splitlines():
+        m = _SAMPLE.match(line)
+        if not m:
+            continue
+        name, method, route, value = m.groups()
+        kind = {"logchain_http_request_duration_seconds": "requests",
+                "logchain_http_mongo_commands_total": "mongo",
+                "logchain_http_rpc_calls_total": "rpc"}.get(name)
+        if kind:
+            key = f"{method} {route}"
+            totals.setdefault(key, {"requests": 0, "mongo": 0, "rpc": 0})[kind] += float(value)
+    return totals
+
+
+def ops_delta(before, after):
+    out = {}
+    for key, now in after.items():
+        prev = before.get(key, {})
+        requests = now["requests"] - prev.get("requests", 0)
+        if requests:
+            out[key] = {kind: round((now[kind] - prev.get(kind, 0)) / requests, 2) for kind in ("mongo", "rpc")}
+    return out
+
+
+# --- virtual agent ----------------------------------------------------------------
+
+def batch_payload(device_id, scheme="v1-sha256"):
+    from app.merkle import compute_batch_root
+
+    sources = [
+        {"path": f"app/{name}.log", "root": "0x" + os.urandom(32).hex(), "lines": random.randint(10, 5000)}
+        for name in random.sample(("api", "worker", "auth", "nginx", "db"), random.randint(1, 3))
+    ]
+    return {
+        "batch_id": str(uuid.uuid4())[:8],
+        "device_id": device_id,
+        "merkle_root": compute_batch_root(sources, scheme),
+        "merkle_scheme": scheme,
+        "ipfs_cid": None,
+        "size": sum(s["lines"] for s in sources),
+        "sources": sources,
+    }
+
+
+async def agent(http, stats, email, device_id, args, stop):
+    res = await stats.call(http, "POST /login", "POST", "/login", data={"username": email, "password": PASSWORD})
+    if res is None:
+        return
+    headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+    res = await stats.call(http, "GET /devices", "GET", "/devices", headers=headers)
+    if res is not None and not any(d.get("device_id") == device_id for d in res.json()):
+        await stats.call(http, "POST /devices", "POST", "/devices", headers=headers,
+                         json={"device_id": device_id, "name": device_id})
+
+    heartbeat = {"device_id": device_id, "platform": "Linux sim", "version": "v1.0.0", "storage_bytes": 10**9}
+
+    async def heartbeats():
+        while True:
+            await stats.call(http, "POST /devices/heartbeat", "POST", "/devices/heartbeat", headers=headers, json=heartbeat)
+            try:
+                await asyncio.wait_for(stop.wait(), args.heartbeat)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    hb = asyncio.create_task(heartbeats())
+    unanchored = 0
+    # Agents start at random points of their cycle, as a real fleet does
+    try:
+        await asyncio.wait_for(stop.wait(), random.uniform(0, args.batch_interval))
+    except asyncio.TimeoutError:
+        pass
+    while not stop.is_set():
+        res = await stats.call(http, "POST /batches", "POST", "/batches", headers=headers, json=batch_payload(device_id))
+        if res is not None:
+            if args.anchor_every == 1:
+                await stats.call(http, "POST /batches/{batch_id}/anchor", "POST",
+                                 f"/batches/{res.json()['id']}/anchor", headers=headers)
+            elif args.anchor_every > 1:
+                unanchored += 1
+                if unanchored >= args.anchor_every:
+                    await stats.call(http, "POST /devices/{device_id}/mmr/anchor", "POST",
+                                     f"/devices/{device_id}/mmr/anchor", headers=headers)
+                    unanchored = 0
+        try:
+            await asyncio.wait_for(stop.wait(), args.batch_interval)
+        except asyncio.TimeoutError:
+            pass
+    await hb
+
+
+async def run_step(http, args, agents, step):
+    # One tenant per --devices-per-tenant agents, as fleets are usually owned
+    tenants = [f"sim-{step}-{t}-{uuid.uuid4().hex[:6]}@example.com" for t in range(-(-agents // args.devices_per_tenant))]
+    for email in tenants:
+        await http.post("/signup", json={"email": email, "password": PASSWORD})
+
+    stats = Stats()
+    stop = asyncio.Event()
+    before = await scrape(http)
+    started = time.perf_counter()
+    tasks = []
+    for i in range(agents):
+        email = tenants[i // args.devices_per_tenant]
+        tasks.append(asyncio.create_task(agent(http, stats, email, f"sim-{step}-{i}", args, stop)))
+        await asyncio.sleep(args.ramp / agents)  # ramp the fleet up instead of a thundering herd
+    await asyncio.sleep(max(0, args.duration - (time.perf_counter() - started)))
+    stop.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    after = await scrape(http)
+    endpoints = stats.summary(elapsed, ops_delta(before, after))
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "agents": agents,
+        "seconds": round(elapsed, 2),
+        "requests": total,
+        "req_per_sec": round(total / elapsed, 2),
+        "error_rate": round(sum(stats.errors.values()) / total, 4) if total else None,
+        "endpoints": endpoints,
+    }
+
+
+async def simulate(args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as http:
+        await wait_ready(http)
+        return [await run_step(http, args, n, step) for step, n in enumerate(args.agents)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of agents against a local backend")
+    parser.add_argument("--agents", type=int, nargs="+", default=[100], help="fleet sizes to run, one step each")
+    parser.add_argument("--duration", type=float, default=120, help="seconds per step")
+    parser.add_argument("--ramp", type=float, default=10, help="seconds over which agents start")
+    parser.add_argument("--batch-interval", type=float, default=60, help="BATCH_INTERVAL of the agents")
+    parser.add_argument("--heartbeat", type=float, default=30, help="seconds between heartbeats")
+    parser.add_argument("--anchor-every", type=int, default=1, help="ANCHOR_EVERY of the agents")
+    parser.add_argument("--devices-per-tenant", type=int, default=50)
+    parser.add_argument("--connections", type=int, default=200, help="HTTP connection pool size")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--mongo", default="mongodb://127.0.0.1:27017", help="MongoDB URI or 'mongomock'")
+    parser.add_argument("--db-name", default="logchain_fleet_sim")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--url", help="use an already running backend instead of starting one")
+    parser.add_argument("--server-log", help="write the backend's output here")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+    server = None
+    if not args.url:
+        args.url = f"http://127.0.0.1:{args.port}"
+        server = start_backend(args)
+    try:
+        steps = asyncio.run(simulate(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+    results = {"config": {k: v for k, v in vars(args).items() if k != "serve"}, "steps": steps,
+               "peak_rss_mb": peak_rss_mb()}
+    emit("fleet_sim", results, args.out)
+
+
+if __name__ == "__main__":
+    main()
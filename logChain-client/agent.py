@@ -0,0 +1,59 @@
+"""Headless LogChain agent (``logchain-agent``) for running under a service manager.
+
+Runs ``run_agent_loop`` without importing any GUI toolkit. Settings come from
+the environment and the JSON config file (``--config`` or ``CONFIG_FILE``).
+
+Signals:
+    SIGTERM / SIGINT  finish the current cycle and exit cleanly
+    SIGHUP            reload the config file and environment before the next cycle
+
+    python agent.py --config /etc/logchain/agent.json
+"""
+import argparse
+import signal
+import sys
+
+import client
+from client import log_ui
+
+
+def _handle_stop(signum, frame):
+    log_ui(f"[System] Received {signal.Signals(signum).name}, stopping after the current cycle...")
+    client._stop_event.set()
+
+
+def _handle_reload(signum, frame):
+    # Only flag it: swapping the settings mid-cycle would mix old and new values in one batch
+    log_ui("[System] Received SIGHUP, reloading the configuration before the next cycle...")
+    client._reload_event.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="logchain-agent", description="Headless LogChain log anchoring agent")
+    parser.add_argument("--config", help="path to the JSON config file (default: $CONFIG_FILE or client_config.json)")
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    args = parser.parse_args(argv)
+
+    if args.config:
+        client.load_config(args.config)
+        client._token = None
+
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _handle_reload)
+
+    if args.once:
+        cycle = client.Cycle()
+        client.run_profiled_cycle(cycle)
+        client.finish_cycle(cycle)
+        return 0
+
+    if not client.run_agent_loop():
+        return 1
+    log_ui("[System] Agent stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
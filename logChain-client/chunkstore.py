@@ -0,0 +1,288 @@
+"""Local content-addressed archive for batched log lines.
+
+Each batch's raw lines are split into content-defined chunks (cut points are
+chosen on line boundaries from a checksum of the line itself, so an appended
+or shifted log re-chunks the same way and unchanged runs deduplicate across
+batches). Chunks are compressed (zstd when available, zlib otherwise) and
+stored under their CIDv1. A small dag-json manifest lists the chunks and
+their line counts; the manifest CID is what gets sent to the backend as
+``ipfs_cid``.
+
+Layout under ``root``::
+
+    chunks/<xx>/<cid>      compressed chunk bytes (1 codec byte + payload)
+    manifests/<cid>.json   dag-json manifest
+
+Publishing to IPFS is an optional step handled by a ``Publisher``.
+"""
+import abc
+import base64
+import bisect
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import requests
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    HAS_ZSTD = False
+
+# multicodec / multihash codes
+CODEC_RAW = 0x55
+CODEC_DAG_JSON = 0x0129
+MH_SHA2_256 = 0x12
+
+# on-disk compression tags (first byte of every stored chunk)
+_COMP_NONE = b"\x00"
+_COMP_ZLIB = b"\x01"
+_COMP_ZSTD = b"\x02"
+
+MIN_CHUNK_BYTES = 16 * 1024
+MAX_CHUNK_BYTES = 256 * 1024
+BOUNDARY_MASK = 0xFF  # ~1 cut per 256 lines once MIN_CHUNK_BYTES is reached
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def compute_cid(data: bytes, codec: int = CODEC_RAW) -> str:
+    """Return the base32 CIDv1 (sha2-256) of ``data`` for the given codec."""
+    digest = hashlib.sha256(data).digest()
+    raw = _varint(1) + _varint(codec) + _varint(MH_SHA2_256) + _varint(len(digest)) + digest
+    return "b" + base64.b32encode(raw).decode("ascii").lower().rstrip("=")
+
+
+def _split_lines(data: bytes):
+    """Inverse of ``b"".join(lines)`` for a chunk built by ``chunk_lines``."""
+    parts = data.split(b"\n")
+    lines = [p + b"\n" for p in parts[:-1]]
+    if parts[-1]:
+        lines.append(parts[-1])
+    return lines
+
+
+def chunk_lines(lines):
+    """Yield lists of encoded lines forming content-defined chunks.
+
+    A line without a trailing newline (end of a file) always closes its
+    chunk, so every chunk can be split back into the exact original lines.
+    """
+    current = []
+    size = 0
+    for line in lines:
+        b = line.encode() if isinstance(line, str) else line
+        current.append(b)
+        size += len(b)
+        if (
+            not b.endswith(b"\n")
+            or size >= MAX_CHUNK_BYTES
+            or (size >= MIN_CHUNK_BYTES and (zlib.crc32(b) & BOUNDARY_MASK) == 0)
+        ):
+            yield current
+            current = []
+            size = 0
+    if current:
+        yield current
+
+
+class Publisher(abc.ABC):
+    """Optional sink that pushes stored blocks somewhere else (e.g. IPFS)."""
+
+    @abc.abstractmethod
+    def publish(self, cid: str, data: bytes, codec: int):
+        """Store block ``data`` under ``cid``; raise if it could not be stored."""
+
+
+class IpfsHttpPublisher(Publisher):
+    """Push blocks to a Kubo node through its HTTP RPC API (``/api/v0/block/put``)."""
+
+    def __init__(self, api_url, timeout=10):
+        self.api_url = api_url.rstrip("/")
+        self.timeout = timeout
+
+    def publish(self, cid, data, codec):
+        cid_codec = "dag-json" if codec == CODEC_DAG_JSON else "raw"
+        res = requests.post(
+            f"{self.api_url}/api/v0/block/put",
+            params={"cid-codec": cid_codec, "mhtype": "sha2-256", "pin": "true"},
+            files={"data": data},
+            timeout=self.timeout,
+        )
+        res.raise_for_status()
+        returned = res.json().get("Key")
+        if returned and returned != cid:
+            raise ValueError(f"IPFS returned CID {returned}, expected {cid}")
+
+
+class ChunkStore:
+    """Content-addressed, compressed, deduplicating store of log chunks."""
+
+    def __init__(self, root, publisher=None, level=3, cache_size=64):
+        self.root = root
+        self.publisher = publisher
+        self.level = level
+        self._chunk_dir = os.path.join(root, "chunks")
+        self._manifest_dir = os.path.join(root, "manifests")
+        os.makedirs(self._chunk_dir, exist_ok=True)
+        os.makedirs(self._manifest_dir, exist_ok=True)
+        self._cache_size = cache_size
+        self._manifest_cache = OrderedDict()
+        self._chunk_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- compression -----------------------------------------------------
+
+    def _compress(self, data):
+        if HAS_ZSTD:
+            return _COMP_ZSTD + zstandard.ZstdCompressor(level=self.level).compress(data)
+        return _COMP_ZLIB + zlib.compress(data, self.level)
+
+    @staticmethod
+    def _decompress(blob):
+        tag, payload = blob[:1], blob[1:]
+        if tag == _COMP_ZSTD:
+            if not HAS_ZSTD:
+                raise RuntimeError("Chunk is zstd-compressed but 'zstandard' is not installed")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        if tag == _COMP_ZLIB:
+            return zlib.decompress(payload)
+        if tag == _COMP_NONE:
+            return payload
+        raise ValueError(f"Unknown chunk compression tag: {tag!r}")
+
+    # --- paths -----------------------------------------------------------
+
+    def _chunk_path(self, cid):
+        return os.path.join(self._chunk_dir, cid[-2:], cid)
+
+    def _manifest_path(self, cid):
+        return os.path.join(self._manifest_dir, cid + ".json")
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    # --- write path ------------------------------------------------------
+
+    def put_chunk(self, data):
+        """Store one raw chunk; returns (cid, is_new)."""
+        cid = compute_cid(data, CODEC_RAW)
+        path = self._chunk_path(cid)
+        if os.path.exists(path):
+            return cid, False
+        # Publish first: a block on disk is taken as published, so a failed publish must leave none
+        if self.publisher:
+            self.publisher.publish(cid, data, CODEC_RAW)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_atomic(path, self._compress(data))
+        return cid, True
+
+    def put_lines(self, lines):
+        """Archive a batch's lines and return ``(manifest_cid, stats)``."""
+        links = []
+        stats = {"chunks": 0, "new_chunks": 0, "bytes": 0, "new_bytes": 0, "lines": 0}
+        for chunk in chunk_lines(lines):
+            data = b"".join(chunk)
+            cid, is_new = self.put_chunk(data)
+            links.append({"cid": {"/": cid}, "lines": len(chunk), "size": len(data)})
+            stats["chunks"] += 1
+            stats["bytes"] += len(data)
+            stats["lines"] += len(chunk)
+            if is_new:
+                stats["new_chunks"] += 1
+                stats["new_bytes"] += len(data)
+
+        manifest = {"version": 1, "lines": stats["lines"], "bytes": stats["bytes"], "chunks": links}
+        # dag-json: sorted keys, no whitespace
+        encoded = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+        cid = compute_cid(encoded, CODEC_DAG_JSON)
+        path = self._manifest_path(cid)
+        if not os.path.exists(path):
+            if self.publisher:
+                self.publisher.publish(cid, encoded, CODEC_DAG_JSON)
+            self._write_atomic(path, encoded)
+        return cid, stats
+
+    # --- read path -------------------------------------------------------
+
+    def _cached(self, cache, key, loader):
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = loader(key)
+        with self._lock:
+            cache[key] = value
+            while len(cache) > self._cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def _load_manifest(self, cid):
+        with open(self._manifest_path(cid), "rb") as f:
+            manifest = json.loads(f.read())
+        # cumulative line offsets for bisecting random reads
+        offsets = [0]
+        for link in manifest["chunks"]:
+            offsets.append(offsets[-1] + link["lines"])
+        return manifest, offsets
+
+    def _load_chunk(self, cid):
+        with open(self._chunk_path(cid), "rb") as f:
+            data = self._decompress(f.read())
+        if compute_cid(data, CODEC_RAW) != cid:
+            raise ValueError(f"Chunk {cid} is corrupt")
+        return _split_lines(data)
+
+    def manifest(self, cid):
+        return self._cached(self._manifest_cache, cid, self._load_manifest)[0]
+
+    def has(self, cid):
+        return os.path.exists(self._manifest_path(cid))
+
+    def get_lines(self, cid, start=0, stop=None):
+        """Return lines ``[start, stop)`` of the batch stored under ``cid``.
+
+        Only the chunks overlapping the requested range are read and
+        decompressed.
+        """
+        manifest, offsets = self._cached(self._manifest_cache, cid, self._load_manifest)
+        total = offsets[-1]
+        stop = total if stop is None else min(stop, total)
+        start = max(0, start)
+        if start >= stop:
+            return []
+        out = []
+        idx = bisect.bisect_right(offsets, start) - 1
+        while idx < len(manifest["chunks"]) and offsets[idx] < stop:
+            chunk_cid = manifest["chunks"][idx]["cid"]["/"]
+            chunk = self._cached(self._chunk_cache, chunk_cid, self._load_chunk)
+            lo = max(start - offsets[idx], 0)
+            hi = min(stop - offsets[idx], len(chunk))
+            out.extend(b.decode() for b in chunk[lo:hi])
+            idx += 1
+        return out
+
+    def get_line(self, cid, index):
+        lines = self.get_lines(cid, index, index + 1)
+        if not lines:
+            raise IndexError(index)
+        return lines[0]
@@ -1,64 +1,171 @@
 import os
 import time
 import uuid
-import hashlib
 import requests
 import json
 import threading
-import queue
 from datetime import datetime
 import platform as py_platform
 import shutil
-
-tk = None
+from concurrent.futures import ThreadPoolExecutor
+
+from chunkstore import ChunkStore, IpfsHttpPublisher
+from logbuffer import LogBuffer
+from timeindex import TimeIndex
+from merkle import DEFAULT_SCHEME, LEGACY_SCHEME, compute_batch_root, compute_merkle_root
+from watcher import WATCH_MODES, create_watcher, parse_globs
+import rotated
+from metrics import Cycle, CycleProfiler, CycleRecorder, MetricsServer, PROFILE_MODES, format_bytes
+
+# GUI toolkits are imported lazily by load_gui() so the headless agent
+# (agent.py) never pays for them.
+tk = ttk = filedialog = messagebox = Messagebox = None
+SUCCESS = DANGER = INFO = None
 HAS_TTKBOOTSTRAP = False
-try:
-    import ttkbootstrap as ttk
-    from ttkbootstrap.constants import *
-    from ttkbootstrap.dialogs import Messagebox
-    HAS_TTKBOOTSTRAP = True
-    # Also import tkinter for compatibility
+
+def load_gui():
+    """Import ttkbootstrap (or plain tkinter); returns False if no GUI toolkit is available."""
+    global tk, ttk, filedialog, messagebox, Messagebox, SUCCESS, DANGER, INFO, HAS_TTKBOOTSTRAP
     try:
-        import tkinter as tk
-        from tkinter import filedialog, messagebox
-    except:
-        pass
-except ImportError:
+        import ttkbootstrap as ttk
+        from ttkbootstrap.constants import SUCCESS, DANGER, INFO
+        from ttkbootstrap.dialogs import Messagebox
+        HAS_TTKBOOTSTRAP = True
+        # Also import tkinter for compatibility
+        try:
+            import tkinter as tk
+            from tkinter import filedialog, messagebox
+        except:
+            pass
+    except ImportError:
+        try:
+            import tkinter as tk
+            from tkinter import ttk, filedialog, messagebox
+            HAS_TTKBOOTSTRAP = False
+        except Exception:
+            tk = None
+            HAS_TTKBOOTSTRAP = False
+    return tk is not None or HAS_TTKBOOTSTRAP
+
+CONFIG_FILE = os.getenv("CONFIG_FILE", "client_config.json")
+
+def load_config(path=None):
+    """(Re)load settings from the environment, then from the JSON config file if it exists."""
+    global CONFIG_FILE, BACKEND_URL, CLIENT_EMAIL, CLIENT_PASSWORD, DEVICE_ID, DEVICE_NAME, LOG_DIR, BATCH_INTERVAL
+    global ARCHIVE_DIR, IPFS_API_URL, MERKLE_SCHEME, METRICS_PORT, STATUS_FILE, PROFILE_CYCLE
+    global WATCH_MODE, LOG_INCLUDE, LOG_EXCLUDE, ANCHOR_EVERY, TIME_INDEX_DIR, TIME_INDEX_STRIDE
+    global ROTATED_CACHE, DECOMPRESS_WORKERS
+    CONFIG_FILE = path or CONFIG_FILE
+    BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
+    CLIENT_EMAIL = os.getenv("CLIENT_EMAIL")
+    CLIENT_PASSWORD = os.getenv("CLIENT_PASSWORD")
+    DEVICE_ID = os.getenv("DEVICE_ID", "devA23")
+    DEVICE_NAME = os.getenv("DEVICE_NAME", DEVICE_ID)
+    LOG_DIR = os.getenv("LOG_DIR") or ("/var/log" if os.path.isdir("/var/log") else "./logs")
+    BATCH_INTERVAL = int(os.getenv("BATCH_INTERVAL", "60"))  # seconds
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")  # local content-addressed batch archive
+    IPFS_API_URL = os.getenv("IPFS_API_URL")  # optional Kubo RPC endpoint to publish archived blocks
+    MERKLE_SCHEME = os.getenv("MERKLE_SCHEME", DEFAULT_SCHEME)  # see merkle.py for the available schemes
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # local /metrics + /status endpoint; 0 disables
+    STATUS_FILE = os.getenv("STATUS_FILE", "agent_status.json")  # per-cycle JSON status; empty disables
+    PROFILE_CYCLE = os.getenv("PROFILE_CYCLE", "")  # "cprofile" or "sample" to profile the first cycle
+    WATCH_MODE = os.getenv("WATCH_MODE", "auto")  # auto (inotify if available), inotify or poll
+    LOG_INCLUDE = os.getenv("LOG_INCLUDE", "*")  # comma-separated globs, relative to LOG_DIR
+    LOG_EXCLUDE = os.getenv("LOG_EXCLUDE", "")
+    # 1 anchors each batch; N > 1 anchors the device MMR every N batches; 0 leaves it to the backend scheduler
+    ANCHOR_EVERY = int(os.getenv("ANCHOR_EVERY", "1"))
+    TIME_INDEX_DIR = os.getenv("TIME_INDEX_DIR", "./timeindex")  # timestamp -> batch/leaf index; empty disables
+    TIME_INDEX_STRIDE = int(os.getenv("TIME_INDEX_STRIDE", "64"))  # lines between index samples
+    ROTATED_CACHE = os.getenv("ROTATED_CACHE", "./rotated_roots.json")  # roots of hashed .gz/.xz/.zst; empty disables
+    DECOMPRESS_WORKERS = int(os.getenv("DECOMPRESS_WORKERS", "4"))  # compressed files decompressed in parallel
+
+    # Load config file if it exists
     try:
-        import tkinter as tk
-        from tkinter import ttk, filedialog, messagebox
-        HAS_TTKBOOTSTRAP = False
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, "r") as f:
+                cfg = json.load(f)
+                BACKEND_URL = cfg.get("BACKEND_URL", BACKEND_URL)
+                CLIENT_EMAIL = cfg.get("CLIENT_EMAIL", CLIENT_EMAIL)
+                CLIENT_PASSWORD = cfg.get("CLIENT_PASSWORD", CLIENT_PASSWORD)  # Load password from config
+                DEVICE_ID = cfg.get("DEVICE_ID", DEVICE_ID)
+                DEVICE_NAME = cfg.get("DEVICE_NAME", DEVICE_NAME)
+                LOG_DIR = cfg.get("LOG_DIR", LOG_DIR)
+                BATCH_INTERVAL = cfg.get("BATCH_INTERVAL", BATCH_INTERVAL)
+                ARCHIVE_DIR = cfg.get("ARCHIVE_DIR", ARCHIVE_DIR)
+                IPFS_API_URL = cfg.get("IPFS_API_URL", IPFS_API_URL)
+                MERKLE_SCHEME = cfg.get("MERKLE_SCHEME", MERKLE_SCHEME)
+                METRICS_PORT = int(cfg.get("METRICS_PORT", METRICS_PORT))
+                STATUS_FILE = cfg.get("STATUS_FILE", STATUS_FILE)
+                PROFILE_CYCLE = cfg.get("PROFILE_CYCLE", PROFILE_CYCLE)
+                WATCH_MODE = cfg.get("WATCH_MODE", WATCH_MODE)
+                LOG_INCLUDE = cfg.get("LOG_INCLUDE", LOG_INCLUDE)
+                LOG_EXCLUDE = cfg.get("LOG_EXCLUDE", LOG_EXCLUDE)
+                ANCHOR_EVERY = int(cfg.get("ANCHOR_EVERY", ANCHOR_EVERY))
+                TIME_INDEX_DIR = cfg.get("TIME_INDEX_DIR", TIME_INDEX_DIR)
+                TIME_INDEX_STRIDE = int(cfg.get("TIME_INDEX_STRIDE", TIME_INDEX_STRIDE))
+                ROTATED_CACHE = cfg.get("ROTATED_CACHE", ROTATED_CACHE)
+                DECOMPRESS_WORKERS = int(cfg.get("DECOMPRESS_WORKERS", DECOMPRESS_WORKERS))
     except Exception:
-        tk = None
-        HAS_TTKBOOTSTRAP = False
-
-# Load config from file if exists
-BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
-CLIENT_EMAIL = os.getenv("CLIENT_EMAIL")
-CLIENT_PASSWORD = os.getenv("CLIENT_PASSWORD")
-DEVICE_ID = os.getenv("DEVICE_ID", "devA23")
-DEVICE_NAME = os.getenv("DEVICE_NAME", DEVICE_ID)
-LOG_DIR = os.getenv("LOG_DIR") or ("/var/log" if os.path.isdir("/var/log") else "./logs")
-BATCH_INTERVAL = int(os.getenv("BATCH_INTERVAL", "60"))  # seconds
-
-# Load config file if it exists
-try:
-    if os.path.exists("client_config.json"):
-        with open("client_config.json", "r") as f:
-            cfg = json.load(f)
-            BACKEND_URL = cfg.get("BACKEND_URL", BACKEND_URL)
-            CLIENT_EMAIL = cfg.get("CLIENT_EMAIL", CLIENT_EMAIL)
-            CLIENT_PASSWORD = cfg.get("CLIENT_PASSWORD", CLIENT_PASSWORD)  # Load password from config
-            DEVICE_ID = cfg.get("DEVICE_ID", DEVICE_ID)
-            DEVICE_NAME = cfg.get("DEVICE_NAME", DEVICE_NAME)
-            LOG_DIR = cfg.get("LOG_DIR", LOG_DIR)
-            BATCH_INTERVAL = cfg.get("BATCH_INTERVAL", BATCH_INTERVAL)
-except Exception:
-    pass
+        pass
+
+load_config()
 
 _token = None
 _stop_event = threading.Event()
-_ui_queue = queue.Queue()
+_reload_event = threading.Event()  # set (e.g. on SIGHUP) to reload the config between cycles
+_ui_queue = LogBuffer(maxlen=2000)  # pending GUI messages; oldest dropped under backpressure
+MAX_VIEW_LINES = 5000  # lines kept in the GUI log view
+_store = None
+_recorder = CycleRecorder()
+_metrics_server = None
+_profile_next = PROFILE_CYCLE if PROFILE_CYCLE in PROFILE_MODES else None
+_last_read_bytes = 0
+_watcher = None
+_last_read_sizes = {}
+_unanchored_batches = 0
+_time_index = None
+_rotated_cache = None
+_archive_roots = {}  # source name -> root of the compressed archives read this cycle
+_pending_archives = []  # (fingerprint, name, root, lines) to remember once the batch is accepted
+
+def get_store():
+    """Return the local chunk store, creating it on first use."""
+    global _store
+    if _store is None or _store.root != ARCHIVE_DIR:
+        publisher = IpfsHttpPublisher(IPFS_API_URL) if IPFS_API_URL else None
+        _store = ChunkStore(ARCHIVE_DIR, publisher=publisher)
+    return _store
+
+def get_time_index():
+    """Return the local time index, or None when TIME_INDEX_DIR is empty."""
+    global _time_index
+    if not TIME_INDEX_DIR:
+        return None
+    if _time_index is None or _time_index.root != TIME_INDEX_DIR:
+        _time_index = TimeIndex(TIME_INDEX_DIR, TIME_INDEX_STRIDE)
+    return _time_index
+
+def get_rotated_cache():
+    """Return the cache of compressed archive roots, or None when ROTATED_CACHE is empty."""
+    global _rotated_cache
+    if not ROTATED_CACHE:
+        return None
+    if _rotated_cache is None or _rotated_cache.path != ROTATED_CACHE:
+        _rotated_cache = rotated.RootCache(ROTATED_CACHE)
+    return _rotated_cache
+
+def get_watcher():
+    """Return the LOG_DIR change watcher, recreating it when the settings change."""
+    global _watcher
+    key = (os.path.abspath(LOG_DIR), parse_globs(LOG_INCLUDE), parse_globs(LOG_EXCLUDE), WATCH_MODE)
+    if _watcher is None or _watcher.key != key:
+        if _watcher is not None:
+            _watcher.close()
+        mode = WATCH_MODE if WATCH_MODE in WATCH_MODES else "auto"
+        _watcher = create_watcher(LOG_DIR, key[1] or ("*",), key[2], mode)
+        _watcher.key = key
+        log_ui(f"[Watch] Tracking {LOG_DIR} recursively ({_watcher.mode})")
+    return _watcher
 
 def auth_headers():
     global _token
@@ -156,58 +263,185 @@ def send_heartbeat():
     except Exception as e:
         log_ui(f"[Heartbeat] ❌ Error: {e}")
 
-def read_logs():
-    """Read logs from files in LOG_DIR."""
-    logs = []
+def source_name(path):
+    """Stable, host-independent name of a log file: its path relative to LOG_DIR."""
+    return os.path.relpath(path, LOG_DIR).replace(os.sep, "/")
+
+def read_archives(paths):
+    """Decompress and hash the compressed files among ``paths``, several at a time.
+
+    Archives whose content is already part of an accepted batch (under this
+    or an earlier name) are skipped. Returns ``{path: lines}``; their roots
+    are left in ``_archive_roots`` for ``compute_batch``.
+    """
+    global _last_read_bytes
+    cache = get_rotated_cache()
+    todo, skipped = [], 0
+    for path, kind in paths:
+        try:
+            fp = cache.fingerprint(path) if cache else None
+            known = cache.get(fp, MERKLE_SCHEME) if cache else None
+            if known:
+                skipped += 1
+                continue
+            _last_read_bytes += os.path.getsize(path)
+            todo.append((path, kind, fp))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log_ui(f"[Logs] Error reading {path}: {e}")
+    if skipped:
+        log_ui(f"[Logs] Skipped {skipped} rotated archive(s) already hashed in an earlier batch")
+    read = {}
+    if not todo:
+        return read
+    with ThreadPoolExecutor(max(1, min(DECOMPRESS_WORKERS, len(todo)))) as pool:
+        jobs = [(path, fp, pool.submit(rotated.hash_archive, path, MERKLE_SCHEME, kind)) for path, kind, fp in todo]
+        for path, fp, job in jobs:
+            try:
+                lines, root = job.result()
+            except FileNotFoundError:
+                continue
+            except rotated.MissingDecompressor as e:
+                # Not a transient state: the archive is never anchored until the package is installed
+                log_ui(f"[Config] ❌ Cannot read rotated archive: {e}")
+                continue
+            except rotated.DECOMPRESS_ERRORS as e:
+                # Most likely still being written by logrotate; it shows up as changed again once complete
+                log_ui(f"[Logs] Skipping incomplete archive {source_name(path)}: {e}")
+                continue
+            except Exception as e:
+                log_ui(f"[Logs] Error decompressing {path}: {e}")
+                continue
+            if lines:
+                read[path] = lines
+                _archive_roots[source_name(path)] = root
+                if fp:
+                    _pending_archives.append((fp, source_name(path), root, len(lines)))
+    log_ui(f"[Logs] Decompressed {len(read)} rotated archive(s)")
+    return read
+
+def read_sources(paths=None):
+    """Read ``paths`` (default: every matching file under LOG_DIR, recursively).
+
+    Compressed rotations (.gz/.xz/.zst) are stream-decompressed (see
+    ``read_archives``). Returns ``[(name, lines), ...]`` in canonical order
+    (names sorted bytewise).
+    """
+    global _last_read_bytes
+    _last_read_bytes = 0
+    _last_read_sizes.clear()
+    _archive_roots.clear()
+    _pending_archives.clear()
+    sources = []
     if not os.path.exists(LOG_DIR):
         log_ui(f"[Logs] Directory not found: {LOG_DIR}")
-        return logs
+        return sources
     if not os.path.isdir(LOG_DIR):
         log_ui(f"[Logs] Path is not a directory: {LOG_DIR}")
-        return logs
+        return sources
     try:
-        for file in os.listdir(LOG_DIR):
-            path = os.path.join(LOG_DIR, file)
-            if os.path.isfile(path):
-                try:
-                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                        logs.extend(f.readlines())
-                except PermissionError:
-                    log_ui(f"[Logs] Permission denied: {path}")
-                except Exception as e:
-                    log_ui(f"[Logs] Error reading {path}: {e}")
+        if paths is None:
+            paths = get_watcher().walk()
+        paths = sorted(paths, key=lambda p: source_name(p).encode())
+        kinds = {path: rotated.compression(path) for path in paths}
+        archives = read_archives([(path, kind) for path, kind in kinds.items() if kind])
+        for path in paths:
+            if kinds[path]:
+                if path in archives:
+                    sources.append((source_name(path), archives[path]))
+                continue
+            try:
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    _last_read_bytes += size
+                    _last_read_sizes[path] = size
+                    lines = f.readlines()
+                if lines:
+                    sources.append((source_name(path), lines))
+            except FileNotFoundError:
+                # Rotated away between detection and reading
+                pass
+            except PermissionError:
+                log_ui(f"[Logs] Permission denied: {path}")
+            except Exception as e:
+                log_ui(f"[Logs] Error reading {path}: {e}")
     except PermissionError:
         log_ui(f"[Logs] Permission denied accessing directory: {LOG_DIR}")
     except Exception as e:
         log_ui(f"[Logs] Error listing directory: {e}")
-    return logs
+    return sources
 
-def compute_merkle_root(logs):
-    """Compute a simple Merkle root from log lines."""
-    if not logs:
-        return None
+def remember_archives(batch_id):
+    """Record the archives of an accepted batch so later cycles skip them."""
+    cache = get_rotated_cache()
+    if cache is None or not _pending_archives:
+        return
+    for fp, name, root, lines in _pending_archives:
+        cache.add(fp, MERKLE_SCHEME, root, lines, name, batch_id)
+    _pending_archives.clear()
+    try:
+        cache.prune(get_watcher().walk())
+        cache.save()
+    except OSError as e:
+        log_ui(f"[Logs] ❌ Could not save rotated archive cache {ROTATED_CACHE}: {e}")
 
-    hashes = [hashlib.sha256(line.encode()).hexdigest() for line in logs]
+def read_logs(paths=None):
+    """Read logs from ``paths`` as one flat list of lines (see ``read_sources``)."""
+    logs = []
+    for _name, lines in read_sources(paths):
+        logs.extend(lines)
+    return logs
 
-    while len(hashes) > 1:
-        temp = []
-        for i in range(0, len(hashes), 2):
-            left = hashes[i]
-            right = hashes[i + 1] if i + 1 < len(hashes) else left
-            temp.append(hashlib.sha256((left + right).encode()).hexdigest())
-        hashes = temp
+def compute_batch(sources):
+    """Return ``(merkle_root, source_roots)`` for per-file sources.
+
+    v1 schemes root the batch over per-file subtrees so one file can be
+    verified on its own; the legacy scheme keeps a single flat tree.
+    Compressed archives were already hashed while they were decompressed.
+    """
+    if MERKLE_SCHEME == LEGACY_SCHEME:
+        return compute_merkle_root([line for _name, lines in sources for line in lines], MERKLE_SCHEME), None
+    source_roots = [
+        {"path": name, "root": _archive_roots.get(name) or compute_merkle_root(lines, MERKLE_SCHEME), "lines": len(lines)}
+        for name, lines in sources
+    ]
+    return compute_batch_root(source_roots, MERKLE_SCHEME), source_roots
+
+def archive_batch(logs):
+    """Store the batch's raw lines in the local chunk store and return its CID."""
+    try:
+        cid, stats = get_store().put_lines(logs)
+        log_ui(
+            f"[Archive] Stored {stats['lines']} lines as {cid} "
+            f"({stats['new_chunks']}/{stats['chunks']} new chunks, {stats['new_bytes']} new bytes)"
+        )
+        return cid
+    except Exception as e:
+        log_ui(f"[Archive] ❌ Error archiving batch: {e}")
+        return None
 
-    return "0x" + hashes[0]
+def _post_batch(payload, headers):
+    """POST a batch, retrying once on timeout; the idempotency key makes the retry safe."""
+    try:
+        return requests.post(f"{BACKEND_URL}/batches", json=payload, headers=headers, timeout=10)
+    except requests.exceptions.Timeout:
+        log_ui(f"[Batch] Request timed out, retrying batch {payload['batch_id']}...")
+        return requests.post(f"{BACKEND_URL}/batches", json=payload, headers=headers, timeout=10)
 
-def send_batch(merkle_root, size):
+def send_batch(merkle_root, size, ipfs_cid=None, sources=None):
     """Send batch metadata to backend."""
     batch_id = str(uuid.uuid4())[:8]
     payload = {
         "batch_id": batch_id,
         "device_id": DEVICE_ID,
         "merkle_root": merkle_root,
-        "ipfs_cid": "bafyfakecid" + batch_id,  # placeholder for now
-        "size": size
+        "merkle_scheme": MERKLE_SCHEME,
+        "ipfs_cid": ipfs_cid,
+        "size": size,
+        "sources": sources,
+        # Same key on every retry of this batch, so the backend stores it once
+        "idempotency_key": uuid.uuid4().hex,
     }
 
     try:
@@ -216,10 +450,13 @@ def send_batch(merkle_root, size):
             log_ui(f"[Batch] ❌ No auth token available, cannot send batch")
             return None
         log_ui(f"[Batch] Sending batch {batch_id} to {BACKEND_URL}/batches...")
-        res = requests.post(f"{BACKEND_URL}/batches", json=payload, headers=headers, timeout=10)
+        res = _post_batch(payload, headers)
         if res.status_code == 200:
             response_data = res.json()
-            log_ui(f"[{datetime.now()}] ✅ Batch sent successfully: ID={response_data.get('id', 'unknown')}")
+            if response_data.get("deduplicated"):
+                log_ui(f"[{datetime.now()}] Batch already stored (unchanged logs or retry): ID={response_data.get('id', 'unknown')}")
+            else:
+                log_ui(f"[{datetime.now()}] ✅ Batch sent successfully: ID={response_data.get('id', 'unknown')}")
             return response_data.get("id")
         elif res.status_code == 401:
             # Token expired, try to refresh
@@ -230,7 +467,7 @@ def send_batch(merkle_root, size):
             if not headers.get("Authorization"):
                 log_ui("[Batch] ❌ Failed to refresh token")
                 return None
-            res = requests.post(f"{BACKEND_URL}/batches", json=payload, headers=headers, timeout=10)
+            res = _post_batch(payload, headers)
             if res.status_code == 200:
                 response_data = res.json()
                 log_ui(f"[{datetime.now()}] ✅ Batch sent (after token refresh): ID={response_data.get('id', 'unknown')}")
@@ -247,17 +484,174 @@ def send_batch(merkle_root, size):
         log_ui(f"[Batch] ❌ Error sending batch: {e}")
     return None
 
+def pending_log_bytes():
+    """Bytes appended to the files this cycle read since it read them (how far behind we are)."""
+    total = 0
+    for path, size in _last_read_sizes.items():
+        try:
+            total += max(0, os.path.getsize(path) - size)
+        except OSError:
+            pass
+    return total
+
+def request_profile(mode="cprofile"):
+    """Profile the next agent cycle with ``mode`` ("cprofile" or "sample")."""
+    global _profile_next
+    _profile_next = mode
+    log_ui(f"[Profile] Next cycle will be profiled ({mode})")
+
+def reload_config():
+    """Re-read the config file and environment; called between cycles."""
+    global _token, _profile_next
+    load_config()
+    # Credentials or backend may have changed; re-authenticate on next request
+    _token = None
+    if PROFILE_CYCLE in PROFILE_MODES:
+        _profile_next = PROFILE_CYCLE
+    log_ui(f"[System] Configuration reloaded from {CONFIG_FILE} "
+           f"(Batch Interval: {BATCH_INTERVAL}s, Log Dir: {LOG_DIR})")
+
+def start_metrics_server():
+    global _metrics_server
+    if METRICS_PORT and _metrics_server is None:
+        try:
+            _metrics_server = MetricsServer(_recorder, METRICS_PORT, on_profile=request_profile).start()
+            log_ui(f"[Metrics] Serving http://127.0.0.1:{METRICS_PORT}/metrics and /status")
+        except OSError as e:
+            log_ui(f"[Metrics] ❌ Could not start metrics server on port {METRICS_PORT}: {e}")
+
+def anchor_batch(batch_id):
+    try:
+        r = requests.post(f"{BACKEND_URL}/batches/{batch_id}/anchor", headers=auth_headers())
+        if r.ok:
+            log_ui(f"Anchored: {r.json()}")
+        else:
+            log_ui(f"Failed to anchor: {r.status_code} {r.text}")
+    except Exception as e:
+        log_ui(f"Error anchoring: {e}")
+
+def anchor_device_mmr():
+    """Anchor the device's MMR root, covering every batch sent since the last checkpoint."""
+    try:
+        r = requests.post(f"{BACKEND_URL}/devices/{DEVICE_ID}/mmr/anchor", headers=auth_headers())
+        if r.ok:
+            log_ui(f"Anchored MMR checkpoint: {r.json()}")
+            return True
+        log_ui(f"Failed to anchor MMR: {r.status_code} {r.text}")
+    except Exception as e:
+        log_ui(f"Error anchoring MMR: {e}")
+    return False
+
+def run_cycle(cycle):
+    """Read, hash, archive, send and anchor one batch, timing each phase into ``cycle``."""
+    global _unanchored_batches
+    _last_read_sizes.clear()
+    if not os.path.isdir(LOG_DIR):
+        log_ui(f"[Logs] Directory not found: {LOG_DIR}")
+        return
+    watcher = get_watcher()
+    with cycle.phase("read"):
+        changed = watcher.changes()
+        if not changed:
+            cycle.set(files=0)
+            log_ui(f"[Logs] No changes in {LOG_DIR}, waiting {BATCH_INTERVAL}s...")
+            return
+    batch_id = None
+    try:
+        batch_id = send_changes(cycle, changed)
+    finally:
+        if batch_id is None:
+            # Not accepted by the backend: offer the same files again next cycle
+            watcher.requeue(changed)
+    if batch_id:
+        with cycle.phase("anchor"):
+            if ANCHOR_EVERY <= 0:
+                pass  # the backend's anchoring scheduler picks the batch up
+            elif ANCHOR_EVERY == 1:
+                anchor_batch(batch_id)
+            else:
+                _unanchored_batches += 1
+                if _unanchored_batches >= ANCHOR_EVERY and anchor_device_mmr():
+                    _unanchored_batches = 0
+
+def send_changes(cycle, changed):
+    """Read, hash, archive and send the ``changed`` files as one batch.
+
+    Returns the backend's batch id, ``""`` when there was nothing to send,
+    or None when the batch was not accepted.
+    """
+    with cycle.phase("read"):
+        sources = read_sources(changed)
+    line_count = sum(len(lines) for _name, lines in sources)
+    cycle.set(lines=line_count, bytes=_last_read_bytes, files=len(sources))
+    log_ui(f"[Logs] Read {line_count} log lines from {len(sources)} changed file(s) in {LOG_DIR}")
+    if not sources:
+        log_ui(f"[Logs] No logs found in {LOG_DIR}, waiting {BATCH_INTERVAL}s...")
+        return ""
+
+    with cycle.phase("hash"):
+        merkle_root, source_roots = compute_batch(sources)
+        time_index = get_time_index()
+        pending_index = time_index.scan(sources) if time_index else None
+    if not merkle_root:
+        return ""
+    log_ui(f"Computed Merkle Root: {merkle_root}")
+    with cycle.phase("archive"):
+        # Lines are archived in canonical source order, so each source is a contiguous range
+        ipfs_cid = archive_batch(line for _name, lines in sources for line in lines)
+    with cycle.phase("upload"):
+        batch_id = send_batch(merkle_root, line_count, ipfs_cid, source_roots)
+    if not batch_id:
+        return None
+    if pending_index is not None:
+        try:
+            time_index.commit(pending_index, batch_id, merkle_root, MERKLE_SCHEME, ipfs_cid, source_roots, DEVICE_ID)
+        except OSError as e:
+            log_ui(f"[Index] ❌ Could not update time index in {TIME_INDEX_DIR}: {e}")
+    remember_archives(batch_id)
+    return batch_id
+
+def run_profiled_cycle(cycle):
+    global _profile_next
+    mode, _profile_next = _profile_next, None
+    if not mode:
+        run_cycle(cycle)
+        return
+    with CycleProfiler(mode) as profiler:
+        run_cycle(cycle)
+    log_ui(f"[Profile] Cycle profile ({mode}) written to {profiler.path}\n{profiler.text}")
+
+def finish_cycle(cycle):
+    cycle.set(backlog_bytes=pending_log_bytes())
+    data = cycle.finish()
+    _recorder.record(data)
+    if STATUS_FILE:
+        try:
+            _recorder.write_status_file(STATUS_FILE)
+        except OSError as e:
+            log_ui(f"[Metrics] ❌ Could not write status file {STATUS_FILE}: {e}")
+
+def throughput_summary():
+    """One-line status for the GUI status bar."""
+    last = _recorder.last()
+    if not last:
+        return None
+    return (
+        f"{last['lines_per_sec']:,} lines/s · {last['lines']:,} lines ({format_bytes(last['bytes'])}) "
+        f"in {last['total_s']:.2f}s · hash {last.get('hash_s', 0):.2f}s · "
+        f"upload {last.get('upload_s', 0):.2f}s · backlog {format_bytes(last['backlog_bytes'])} · "
+        f"RSS {format_bytes(last['rss_bytes'])}"
+    )
+
 def log_ui(message: str):
     print(message)
-    try:
-        _ui_queue.put_nowait(message)
-    except Exception:
-        pass
+    _ui_queue.put(message)
 
 def run_agent_loop():
+    """Run agent cycles until _stop_event is set; returns False if authentication fails."""
     if not obtain_token():
         log_ui("[System] Authentication failed. Please check your email and password in Settings.")
-        return
+        return False
     
     if not ensure_device_registered():
         log_ui("[System] Device registration failed, but continuing...")
@@ -276,37 +670,24 @@ def run_agent_loop():
     threading.Thread(target=heartbeat_thread, daemon=True).start()
     log_ui("[System] Heartbeat thread started")
     
+    start_metrics_server()
+
     while not _stop_event.is_set():
+        if _reload_event.is_set():
+            _reload_event.clear()
+            reload_config()
+        cycle = Cycle()
         try:
-            logs = read_logs()
-            log_ui(f"[Logs] Read {len(logs)} log lines from {LOG_DIR}")
-            if not logs:
-                log_ui(f"[Logs] No logs found in {LOG_DIR}, waiting {BATCH_INTERVAL}s...")
-                if _stop_event.wait(BATCH_INTERVAL):
-                    break
-                continue
-            
-            merkle_root = compute_merkle_root(logs)
-            if merkle_root:
-                log_ui(f"Computed Merkle Root: {merkle_root}")
-                batch_id = send_batch(merkle_root, len(logs))
-                if batch_id:
-                    try:
-                        r = requests.post(f"{BACKEND_URL}/batches/{batch_id}/anchor", headers=auth_headers())
-                        if r.ok:
-                            log_ui(f"Anchored: {r.json()}")
-                        else:
-                            log_ui(f"Failed to anchor: {r.status_code} {r.text}")
-                    except Exception as e:
-                        log_ui(f"Error anchoring: {e}")
-            
-            # Wait for next interval
-            if _stop_event.wait(BATCH_INTERVAL):
-                break
+            run_profiled_cycle(cycle)
         except Exception as e:
+            cycle.set(error=str(e))
             log_ui(f"[Loop] Error: {e}")
-            if _stop_event.wait(BATCH_INTERVAL):
-                break
+        finish_cycle(cycle)
+
+        # Wait for next interval
+        if _stop_event.wait(BATCH_INTERVAL):
+            break
+    return True
 
 class LogChainGUI:
     def __init__(self):
@@ -431,13 +812,27 @@ class LogChainGUI:
             "DEVICE_NAME": self.device_name_var.get(),
             "LOG_DIR": self.log_dir_var.get(),
             "BATCH_INTERVAL": self.interval_var.get(),
+            "ARCHIVE_DIR": ARCHIVE_DIR,
+            "IPFS_API_URL": IPFS_API_URL,
+            "MERKLE_SCHEME": MERKLE_SCHEME,
+            "METRICS_PORT": METRICS_PORT,
+            "STATUS_FILE": STATUS_FILE,
+            "PROFILE_CYCLE": PROFILE_CYCLE,
+            "WATCH_MODE": WATCH_MODE,
+            "LOG_INCLUDE": LOG_INCLUDE,
+            "LOG_EXCLUDE": LOG_EXCLUDE,
+            "ANCHOR_EVERY": ANCHOR_EVERY,
+            "TIME_INDEX_DIR": TIME_INDEX_DIR,
+            "TIME_INDEX_STRIDE": TIME_INDEX_STRIDE,
+            "ROTATED_CACHE": ROTATED_CACHE,
+            "DECOMPRESS_WORKERS": DECOMPRESS_WORKERS,
         }
-        with open("client_config.json", "w") as f:
+        with open(CONFIG_FILE, "w") as f:
             json.dump(cfg, f, indent=2)
         if HAS_TTKBOOTSTRAP:
-            Messagebox.show_info("Configuration saved to client_config.json", "Saved")
+            Messagebox.show_info(f"Configuration saved to {CONFIG_FILE}", "Saved")
         else:
-            messagebox.showinfo("Saved", "Configuration saved to client_config.json")
+            messagebox.showinfo("Saved", f"Configuration saved to {CONFIG_FILE}")
 
     def start(self):
         global BACKEND_URL, CLIENT_EMAIL, CLIENT_PASSWORD, DEVICE_ID, DEVICE_NAME, LOG_DIR, BATCH_INTERVAL, _token, _stop_event
@@ -494,18 +889,31 @@ class LogChainGUI:
         log_ui("[System] Agent stopping...")
 
     def drain_queue(self):
-        try:
-            while True:
-                msg = _ui_queue.get_nowait()
+        messages, dropped = _ui_queue.drain()
+        if dropped:
+            messages.insert(0, f"[UI] … {dropped} older messages dropped (agent is logging faster than the view refreshes)")
+        if messages:
+            # Insert the whole drain as one (text, tag, text, tag, ...) call, then trim
+            chunks = []
+            for msg in messages:
                 tag = "info"
                 if "✅" in msg:
                     tag = "success"
                 elif "❌" in msg or "Error" in msg or "Failed" in msg:
                     tag = "error"
-                self.text.insert("end", msg + "\n", tag)
-                self.text.see("end")
-        except queue.Empty:
-            pass
+                if chunks and chunks[-1] == tag:
+                    chunks[-2] += msg + "\n"
+                else:
+                    chunks.extend([msg + "\n", tag])
+            self.text.insert("end", *chunks)
+            excess = int(self.text.index("end-1c").split(".")[0]) - 1 - MAX_VIEW_LINES
+            if excess > 0:
+                self.text.delete("1.0", f"{excess + 1}.0")
+            self.text.see("end")
+        if self.running:
+            summary = throughput_summary()
+            if summary:
+                self.status_var.set(summary)
         self.app.after(400, self.drain_queue)
 
     def on_close(self):
@@ -520,7 +928,7 @@ class LogChainGUI:
         self.app.destroy()
 
 def main():
-    if tk is None and not HAS_TTKBOOTSTRAP:
+    if not load_gui():
         print("tkinter not available; running headless loop.")
         run_agent_loop()
         return
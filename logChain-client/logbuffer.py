@@ -0,0 +1,37 @@
+"""Bounded producer-side buffer for agent UI messages.
+
+``log_ui`` can be called from any thread at any rate; the buffer keeps at
+most ``maxlen`` pending messages, drops the oldest under backpressure and
+collapses runs of identical messages, so the GUI's memory and redraw cost
+stay constant no matter how long the agent runs.
+"""
+import threading
+from collections import deque
+
+
+class LogBuffer:
+    def __init__(self, maxlen=2000):
+        self._items = deque(maxlen=maxlen)  # [message, repeat count]
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def put(self, message):
+        with self._lock:
+            if self._items and self._items[-1][0] == message:
+                self._items[-1][1] += 1
+                return
+            if len(self._items) == self._items.maxlen:
+                self._dropped += self._items[0][1]
+            self._items.append([message, 1])
+
+    def drain(self):
+        """Return ``(messages, dropped)`` accumulated since the last drain."""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            dropped, self._dropped = self._dropped, 0
+        return [msg if count == 1 else f"{msg} (×{count})" for msg, count in items], dropped
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,238 @@
+"""Versioned Merkle tree schemes for log batches.
+
+A scheme name is recorded on every batch so the backend (and auditors) know
+how to recompute or verify its root:
+
+``v0-sha256-hex``
+    The original construction: SHA-256 over the hex digests as text, no
+    leaf/node separation, last odd node duplicated. Kept for old batches.
+``v1-sha256`` / ``v1-blake2b`` / ``v1-blake3``
+    Hashes over raw bytes with domain separation (leaf = H(0x00 || line),
+    node = H(0x01 || left || right)); an odd node is promoted to the next
+    level unchanged. ``v1-blake3`` needs the optional ``blake3`` package.
+
+Per-source batches (v1 schemes only) build one subtree per file and a batch
+root over the path-sorted source leaves, H(0x02 || path || 0x00 ||
+lines as 8-byte big-endian || file root), so a single file can be checked
+against the batch root without the other files' lines.
+"""
+import hashlib
+
+try:
+    import blake3 as _blake3
+except ImportError:
+    _blake3 = None
+
+LEGACY_SCHEME = "v0-sha256-hex"
+DEFAULT_SCHEME = "v1-sha256"
+
+_LEAF = b"\x00"
+_NODE = b"\x01"
+_SOURCE = b"\x02"
+
+
+def _sha256(data):
+    return hashlib.sha256(data).digest()
+
+
+def _blake2b(data):
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+
+def _blake3_digest(data):
+    return _blake3.blake3(data).digest()
+
+
+_HASHES = {
+    "v1-sha256": _sha256,
+    "v1-blake2b": _blake2b,
+}
+if _blake3 is not None:
+    _HASHES["v1-blake3"] = _blake3_digest
+
+SCHEMES = (LEGACY_SCHEME,) + tuple(_HASHES)
+
+
+def _hash_fn(scheme):
+    try:
+        return _HASHES[scheme]
+    except KeyError:
+        if scheme == "v1-blake3":
+            raise ValueError("Merkle scheme 'v1-blake3' requires the 'blake3' package")
+        raise ValueError(f"Unknown Merkle scheme: {scheme}")
+
+
+def _as_bytes(line):
+    return line.encode() if isinstance(line, str) else line
+
+
+def leaf_hashes(logs, scheme=DEFAULT_SCHEME):
+    """Hash every log line into a leaf for ``scheme``."""
+    if scheme == LEGACY_SCHEME:
+        return [hashlib.sha256(_as_bytes(line)).hexdigest() for line in logs]
+    h = _hash_fn(scheme)
+    return [h(_LEAF + _as_bytes(line)) for line in logs]
+
+
+def _next_level(level, scheme):
+    if scheme == LEGACY_SCHEME:
+        out = []
+        for i in range(0, len(level), 2):
+            left = level[i]
+            right = level[i + 1] if i + 1 < len(level) else left
+            out.append(hashlib.sha256((left + right).encode()).hexdigest())
+        return out
+    h = _hash_fn(scheme)
+    out = [h(_NODE + level[i] + level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        out.append(level[-1])
+    return out
+
+
+def _to_hex(node):
+    return "0x" + (node if isinstance(node, str) else node.hex())
+
+
+def root_from_leaves(leaves, scheme=DEFAULT_SCHEME):
+    """Reduce already-hashed leaves to a 0x-prefixed root (None if empty)."""
+    if not leaves:
+        return None
+    level = leaves
+    while len(level) > 1:
+        level = _next_level(level, scheme)
+    return _to_hex(level[0])
+
+
+def compute_merkle_root(logs, scheme=DEFAULT_SCHEME):
+    """Compute the 0x-prefixed Merkle root of ``logs`` under ``scheme``."""
+    if not logs:
+        return None
+    return root_from_leaves(leaf_hashes(logs, scheme), scheme)
+
+
+class StreamingRoot:
+    """Incremental ``compute_merkle_root`` holding O(log n) nodes.
+
+    Keeps the roots of the perfect subtrees seen so far (like a binary
+    counter) and folds them right to left at the end: under v1 an odd node
+    is promoted unchanged, under the legacy scheme it is paired with itself,
+    which gives the same root as the level-by-level construction.
+    """
+
+    def __init__(self, scheme=DEFAULT_SCHEME):
+        self.scheme = scheme
+        self.count = 0
+        self._stack = []  # (height, node), heights strictly decreasing
+        self._leaf = (lambda line: hashlib.sha256(_as_bytes(line)).hexdigest()) if scheme == LEGACY_SCHEME else (
+            lambda line, h=_hash_fn(scheme): h(_LEAF + _as_bytes(line)))
+
+    def _combine(self, left, right):
+        if self.scheme == LEGACY_SCHEME:
+            return hashlib.sha256((left + right).encode()).hexdigest()
+        return _hash_fn(self.scheme)(_NODE + left + right)
+
+    def add(self, line):
+        node, height = self._leaf(line), 0
+        while self._stack and self._stack[-1][0] == height:
+            node = self._combine(self._stack.pop()[1], node)
+            height += 1
+        self._stack.append((height, node))
+        self.count += 1
+
+    def update(self, lines):
+        for line in lines:
+            self.add(line)
+        return self
+
+    def root(self):
+        if not self._stack:
+            return None
+        height, acc = self._stack[-1]
+        for peak_height, peak in reversed(self._stack[:-1]):
+            if self.scheme == LEGACY_SCHEME:
+                while height < peak_height:
+                    acc, height = self._combine(acc, acc), height + 1
+            acc, height = self._combine(peak, acc), peak_height + 1
+        return _to_hex(acc)
+
+
+def proof_from_leaves(leaves, index, scheme=DEFAULT_SCHEME):
+    """Return the inclusion proof for ``leaves[index]``.
+
+    The proof is a list of ``[side, hex]`` pairs from leaf to root where
+    ``side`` says whether the sibling sits on the ``"left"`` or ``"right"``.
+    Levels where the node is promoted without a sibling are skipped.
+    """
+    if not 0 <= index < len(leaves):
+        raise IndexError(index)
+    level = leaves
+    proof = []
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(["left" if sibling < index else "right", _to_hex(level[sibling])[2:]])
+        elif scheme == LEGACY_SCHEME:
+            proof.append(["right", level[index]])
+        level = _next_level(level, scheme)
+        index //= 2
+    return proof
+
+
+def merkle_proof(logs, index, scheme=DEFAULT_SCHEME):
+    """Return the inclusion proof for ``logs[index]`` (see ``proof_from_leaves``)."""
+    if not 0 <= index < len(logs):
+        raise IndexError(index)
+    return proof_from_leaves(leaf_hashes(logs, scheme), index, scheme)
+
+
+def _verify_node(node, proof, root, scheme):
+    for side, sibling_hex in proof:
+        if scheme == LEGACY_SCHEME:
+            pair = (sibling_hex + node) if side == "left" else (node + sibling_hex)
+            node = hashlib.sha256(pair.encode()).hexdigest()
+        else:
+            sibling = bytes.fromhex(sibling_hex)
+            pair = (sibling + node) if side == "left" else (node + sibling)
+            node = _hash_fn(scheme)(_NODE + pair)
+    return _to_hex(node).lower() == root.lower()
+
+
+def verify_proof(line, proof, root, scheme=DEFAULT_SCHEME):
+    """Check that ``line`` is included under ``root`` using ``proof``."""
+    return _verify_node(leaf_hashes([line], scheme)[0], proof, root, scheme)
+
+
+# === Per-source batches ===
+
+def source_leaf(path, root, lines, scheme=DEFAULT_SCHEME):
+    """Leaf committing to one source file's path, line count and subtree root."""
+    if scheme == LEGACY_SCHEME:
+        raise ValueError("Per-source batches require a v1 Merkle scheme")
+    root_bytes = bytes.fromhex(root[2:] if root.startswith("0x") else root)
+    return _hash_fn(scheme)(_SOURCE + path.encode() + b"\x00" + int(lines).to_bytes(8, "big") + root_bytes)
+
+
+def sort_sources(sources):
+    """Sources in canonical (path) order; each source is a dict with path/root/lines."""
+    return sorted(sources, key=lambda src: src["path"].encode())
+
+
+def compute_batch_root(sources, scheme=DEFAULT_SCHEME):
+    """Root over the path-sorted per-source leaves (None if there are no sources)."""
+    ordered = sort_sources(sources)
+    return root_from_leaves([source_leaf(s["path"], s["root"], s["lines"], scheme) for s in ordered], scheme)
+
+
+def source_proof(sources, path, scheme=DEFAULT_SCHEME):
+    """Inclusion proof of the source ``path`` under the batch root."""
+    ordered = sort_sources(sources)
+    for index, src in enumerate(ordered):
+        if src["path"] == path:
+            leaves = [source_leaf(s["path"], s["root"], s["lines"], scheme) for s in ordered]
+            return proof_from_leaves(leaves, index, scheme)
+    raise KeyError(path)
+
+
+def verify_source_proof(path, root, lines, proof, batch_root, scheme=DEFAULT_SCHEME):
+    """Check that a file with subtree ``root`` and ``lines`` lines is part of ``batch_root``."""
+    return _verify_node(source_leaf(path, root, lines, scheme), proof, batch_root, scheme)
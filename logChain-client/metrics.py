@@ -0,0 +1,270 @@
+"""Per-cycle timings and profiling for the client agent.
+
+Each agent cycle produces one record (bytes/lines read, read/hash/archive/
+upload times, backlog, RSS) kept in a fixed-size ring buffer. Records can be
+exposed through a JSON status file and an optional local HTTP endpoint
+(``/metrics`` in Prometheus text format, ``/status`` as JSON, ``POST
+/profile`` to profile the next cycle).
+"""
+import io
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+# cProfile/pstats and http.server are imported where used: most agents never
+# profile or serve metrics, and the headless agent keeps its startup minimal.
+
+PROFILE_MODES = ("cprofile", "sample")
+
+
+def rss_bytes():
+    """Current resident set size in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+def format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Cycle:
+    """Timer/record for one agent cycle; use ``with cycle.phase("read"):``."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.data = {"started_at": self.started_at, "lines": 0, "bytes": 0, "backlog_bytes": 0}
+
+    def phase(self, name):
+        return _Phase(self.data, name)
+
+    def set(self, **kwargs):
+        self.data.update(kwargs)
+
+    def finish(self):
+        self.data["total_s"] = round(time.perf_counter() - self._t0, 6)
+        hash_s = self.data.get("hash_s") or 0
+        total = self.data["total_s"]
+        self.data["lines_per_sec"] = round(self.data["lines"] / total) if total else 0
+        self.data["hash_lines_per_sec"] = round(self.data["lines"] / hash_s) if hash_s else 0
+        self.data["rss_bytes"] = rss_bytes()
+        return self.data
+
+
+class _Phase:
+    def __init__(self, data, name):
+        self.data = data
+        self.key = f"{name}_s"
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.data[self.key] = round(self.data.get(self.key, 0) + time.perf_counter() - self._t0, 6)
+        return False
+
+
+class CycleRecorder:
+    """Ring buffer of recent cycle records plus lifetime totals."""
+
+    def __init__(self, size=256):
+        self._cycles = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.totals = {"cycles": 0, "lines": 0, "bytes": 0, "errors": 0}
+        self.started_at = time.time()
+
+    def record(self, data):
+        with self._lock:
+            self._cycles.append(data)
+            self.totals["cycles"] += 1
+            self.totals["lines"] += data.get("lines", 0)
+            self.totals["bytes"] += data.get("bytes", 0)
+            if data.get("error"):
+                self.totals["errors"] += 1
+
+    def last(self):
+        with self._lock:
+            return self._cycles[-1] if self._cycles else None
+
+    def cycles(self):
+        with self._lock:
+            return list(self._cycles)
+
+    def status(self):
+        with self._lock:
+            return {
+                "updated_at": time.time(),
+                "uptime_s": round(time.time() - self.started_at, 1),
+                "totals": dict(self.totals),
+                "last_cycle": self._cycles[-1] if self._cycles else None,
+                "recent_cycles": list(self._cycles)[-20:],
+            }
+
+    def write_status_file(self, path):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(tmp, path)
+
+    def prometheus(self):
+        last = self.last() or {}
+        with self._lock:
+            totals = dict(self.totals)
+        lines = [
+            "# TYPE logchain_agent_cycles_total counter",
+            f"logchain_agent_cycles_total {totals['cycles']}",
+            "# TYPE logchain_agent_cycle_errors_total counter",
+            f"logchain_agent_cycle_errors_total {totals['errors']}",
+            "# TYPE logchain_agent_lines_total counter",
+            f"logchain_agent_lines_total {totals['lines']}",
+            "# TYPE logchain_agent_bytes_total counter",
+            f"logchain_agent_bytes_total {totals['bytes']}",
+        ]
+        for key in ("read_s", "hash_s", "archive_s", "upload_s", "anchor_s", "total_s"):
+            if key in last:
+                lines.append(f"# TYPE logchain_agent_last_cycle_{key[:-2]}_seconds gauge")
+                lines.append(f"logchain_agent_last_cycle_{key[:-2]}_seconds {last[key]}")
+        for key in ("lines", "bytes", "backlog_bytes", "lines_per_sec"):
+            if key in last:
+                lines.append(f"# TYPE logchain_agent_last_cycle_{key} gauge")
+                lines.append(f"logchain_agent_last_cycle_{key} {last[key]}")
+        lines.append("# TYPE process_resident_memory_bytes gauge")
+        lines.append(f"process_resident_memory_bytes {rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Statistical profiler sampling one thread's stack every ``interval`` seconds."""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            while frame is not None:
+                code = frame.f_code
+                self.samples[f"{os.path.basename(code.co_filename)}:{code.co_name}"] += 1
+                frame = frame.f_back
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def report(self, limit=20):
+        total = sum(self.samples.values()) or 1
+        return "\n".join(
+            f"{count:6d} {100.0 * count / total:5.1f}%  {name}"
+            for name, count in self.samples.most_common(limit)
+        )
+
+
+class CycleProfiler:
+    """Opt-in profiler for a single cycle (``cprofile`` or ``sample`` mode)."""
+
+    def __init__(self, mode, out_dir="."):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.out_dir = out_dir
+        self._profiler = None
+
+    def __enter__(self):
+        if self.mode == "cprofile":
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if self.mode == "cprofile":
+            import pstats
+
+            self._profiler.disable()
+            self.path = os.path.join(self.out_dir, f"cycle-{stamp}.prof")
+            self._profiler.dump_stats(self.path)
+            buf = io.StringIO()
+            pstats.Stats(self._profiler, stream=buf).sort_stats("cumulative").print_stats(20)
+            self.text = buf.getvalue()
+        else:
+            self._profiler.stop()
+            self.text = self._profiler.report()
+            self.path = os.path.join(self.out_dir, f"cycle-{stamp}.samples.txt")
+            with open(self.path, "w") as f:
+                f.write(self.text + "\n")
+        return False
+
+
+class MetricsServer:
+    """Local HTTP endpoint serving ``/metrics``, ``/status`` and ``POST /profile``."""
+
+    def __init__(self, recorder, port, host="127.0.0.1", on_profile=None):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        recorder_ref = recorder
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, code, body, content_type):
+                payload = body.encode()
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    self._reply(200, recorder_ref.prometheus(), "text/plain; version=0.0.4")
+                elif self.path == "/status":
+                    self._reply(200, json.dumps(recorder_ref.status()), "application/json")
+                else:
+                    self._reply(404, "not found\n", "text/plain")
+
+            def do_POST(self):
+                if self.path.startswith("/profile") and on_profile:
+                    mode = "sample" if "sample" in self.path else "cprofile"
+                    on_profile(mode)
+                    self._reply(202, json.dumps({"profile_next_cycle": mode}), "application/json")
+                else:
+                    self._reply(404, "not found\n", "text/plain")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,162 @@
+"""Compressed rotated log files (logrotate's ``.gz`` / ``.xz`` / ``.zst``).
+
+Compression is detected from the file's magic bytes, not its name, and
+``open_log`` returns a text stream that decompresses in chunks as it is
+read, with the same decoding as a plain log file, so the lines hashed are
+the lines an auditor gets with ``zcat``. ``.zst`` needs the optional
+``zstandard`` package. Archives are hashed as they stream and their lines
+are not kept: later passes (archiving, time index) decompress them again
+through ``ArchiveLines``.
+
+A compressed rotation never changes once written, but logrotate renames it
+every cycle (``app.log.2.gz`` -> ``app.log.3.gz``) and the agent sees every
+file again after a restart. ``RootCache`` remembers the Merkle root of each
+archive by a fingerprint of its compressed bytes, so an archive that is
+already part of an accepted batch is recognised under any name and skipped
+instead of being decompressed and hashed again. Fingerprints are themselves
+memoised by (inode, size, mtime), which a rename keeps, so a known archive
+costs one ``stat``. Archives that have left the log directory are pruned
+from the cache whenever it is saved.
+"""
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+
+from merkle import StreamingRoot
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_MAGIC = (
+    (b"\x1f\x8b", "gz"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zst"),
+)
+READ_CHUNK = 1 << 20
+
+# Raised by a truncated or corrupt archive (e.g. one logrotate is still writing)
+DECOMPRESS_ERRORS = (EOFError, lzma.LZMAError, gzip.BadGzipFile) + (
+    (zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class MissingDecompressor(RuntimeError):
+    """The archive's compression needs an optional package that is not installed."""
+
+
+def compression(path):
+    """``"gz"``, ``"xz"`` or ``"zst"`` if ``path`` is a compressed file, else None."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    for magic, kind in _MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def open_log(path, kind=None):
+    """Text stream over the (decompressed) lines of a log file."""
+    kind = kind or compression(path)
+    if kind == "gz":
+        return gzip.open(path, "rt", encoding="utf-8", errors="ignore")
+    if kind == "xz":
+        return lzma.open(path, "rt", encoding="utf-8", errors="ignore")
+    if kind == "zst":
+        if zstandard is None:
+            raise MissingDecompressor(f"{path} is zstd-compressed; install the 'zstandard' package to read it")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", errors="ignore")
+    return open(path, "r", encoding="utf-8", errors="ignore")
+
+
+class ArchiveLines:
+    """The lines of a compressed log, decompressed again on each pass instead of kept in memory."""
+
+    def __init__(self, path, kind, count):
+        self.path = path
+        self.kind = kind
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        with open_log(self.path, self.kind) as f:
+            yield from f
+
+
+def hash_archive(path, scheme, kind=None):
+    """Stream one compressed file into its Merkle root: ``(ArchiveLines, root)``."""
+    kind = kind or compression(path)
+    tree = StreamingRoot(scheme)
+    count = 0
+    with open_log(path, kind) as f:
+        for line in f:
+            tree.add(line)
+            count += 1
+    return ArchiveLines(path, kind, count), tree.root()
+
+
+def fingerprint(path):
+    """SHA-256 of the compressed bytes."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RootCache:
+    """Roots of compressed archives already in an accepted batch, persisted as JSON at ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.roots = {}  # "scheme:fingerprint" -> {"root", "lines", "path", "batch_id"}
+        self.stats = {}  # "inode:size:mtime_ns" -> fingerprint
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.roots = data.get("roots", {})
+            self.stats = data.get("stats", {})
+        except (OSError, ValueError):
+            pass
+
+    def fingerprint(self, path):
+        st = os.stat(path)
+        key = f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+        if key not in self.stats:
+            self.stats[key] = fingerprint(path)
+        return self.stats[key]
+
+    def get(self, fp, scheme):
+        return self.roots.get(f"{scheme}:{fp}")
+
+    def add(self, fp, scheme, root, lines, name, batch_id):
+        self.roots[f"{scheme}:{fp}"] = {"root": root, "lines": lines, "path": name, "batch_id": batch_id}
+
+    def prune(self, paths):
+        """Forget archives that are no longer among ``paths`` (rotated out and deleted)."""
+        live = set()
+        for path in paths:
+            try:
+                if compression(path):
+                    live.add(self.fingerprint(path))
+            except OSError:
+                pass
+        self.roots = {key: entry for key, entry in self.roots.items() if key.split(":", 1)[1] in live}
+
+    def save(self):
+        # Drop stat entries no archive maps to any more (rotated out and deleted)
+        known = {key.split(":", 1)[1] for key in self.roots}
+        self.stats = {key: fp for key, fp in self.stats.items() if fp in known}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"roots": self.roots, "stats": self.stats}, f)
+        os.replace(tmp, self.path)
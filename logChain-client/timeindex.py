@@ -0,0 +1,308 @@
+"""Sparse on-disk time index: log timestamp -> (batch, file, byte offset, leaf).
+
+While a batch is hashed, every ``stride``-th new line of each file (plus the
+first and last new line) is sampled for a timestamp. Once the backend has
+accepted the batch, those samples are appended to the index, so a time window
+resolves to a few ``(batch, file, leaf range)`` candidates without rescanning
+any logs. Lines are indexed once, in the first batch that contained them.
+
+Layout under ``root``::
+
+    batches.jsonl     one JSON record per batch (id, root, scheme, CID, sources)
+    batches.off       uint64 offset of each record in batches.jsonl (batch N = one seek)
+    YYYY-MM-DD.idx    26-byte entries (ts_ms, batch_no, source_no, leaf, byte_offset),
+                      by the UTC day of the timestamp
+
+Timestamps without a zone are read as local time, both in logs and in
+queries. Lines without a timestamp inherit the previous one, which only ever
+widens a candidate range; ``prove`` filters the exact lines.
+
+    python timeindex.py --from "2024-05-02 14:02" --to "2024-05-02 14:05" --prove
+"""
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import re
+import struct
+import time
+from datetime import datetime, timezone
+
+from merkle import LEGACY_SCHEME, leaf_hashes, proof_from_leaves, compute_merkle_root, source_proof
+from merkle import verify_proof, verify_source_proof
+from rotated import open_log
+
+ENTRY = struct.Struct("<qIHIQ")
+OFFSET = struct.Struct("<Q")
+DAY_MS = 86_400_000
+
+_ISO = re.compile(
+    r"^\[?(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6}))?\s?(Z|[+-]\d{2}:?\d{2})?"
+)
+_SYSLOG = re.compile(r"^([A-Z][a-z]{2}) {1,2}(\d{1,2}) (\d{2}):(\d{2}):(\d{2})")
+_MONTHS = {m: i for i, m in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+
+def parse_ts(line, now=None):
+    """Unix time in ms of the timestamp at the start of ``line`` (ISO 8601 or syslog), or None."""
+    m = _ISO.match(line)
+    if m:
+        year, month, day, hh, mm, ss, frac, zone = m.groups()
+        micro = int((frac or "0").ljust(6, "0"))
+        try:
+            dt = datetime(int(year), int(month), int(day), int(hh), int(mm), int(ss), micro)
+        except ValueError:
+            return None
+        if zone == "Z":
+            dt = dt.replace(tzinfo=timezone.utc)
+        elif zone:
+            sign = 1 if zone[0] == "+" else -1
+            hours, minutes = int(zone[1:3]), int(zone[-2:])
+            return int((dt.replace(tzinfo=timezone.utc).timestamp() - sign * (hours * 3600 + minutes * 60)) * 1000)
+        return int(dt.timestamp() * 1000)
+    m = _SYSLOG.match(line)
+    if m and m.group(1) in _MONTHS:
+        now = now or time.time()
+        year = time.localtime(now).tm_year
+        try:
+            dt = datetime(year, _MONTHS[m.group(1)], int(m.group(2)), int(m.group(3)), int(m.group(4)), int(m.group(5)))
+        except ValueError:
+            return None
+        if dt.timestamp() > now + 86400:  # syslog has no year: December lines read in January
+            dt = dt.replace(year=year - 1)
+        return int(dt.timestamp() * 1000)
+    return None
+
+
+def parse_when(value):
+    """Parse a query bound: ISO date/time (local unless it has a zone) or unix seconds."""
+    try:
+        return int(float(value) * 1000)
+    except ValueError:
+        pass
+    ts = parse_ts(value if len(value) > 10 else value + " 00:00:00")
+    if ts is None:
+        ts = parse_ts(value + ":00")  # "2024-05-02 14:02"
+    if ts is None:
+        raise ValueError(f"Unrecognised time: {value}")
+    return ts
+
+
+class PendingBatch:
+    """Index samples of a batch that has been hashed but not yet accepted by the backend."""
+
+    def __init__(self):
+        self.sources = []  # {"path", "lines", "base"}
+        self.entries = []  # (ts_ms, source_no, leaf, byte_offset)
+        self.marks = {}  # path -> (lines, bytes) indexed once committed
+
+
+class TimeIndex:
+    def __init__(self, root, stride=64):
+        self.root = root
+        self.stride = max(1, int(stride))
+        os.makedirs(root, exist_ok=True)
+        self._records = os.path.join(root, "batches.jsonl")
+        self._offsets = os.path.join(root, "batches.off")
+        # path -> (lines, bytes) already indexed; resets on restart (lines are then indexed again)
+        self._indexed = {}
+
+    # --- write path ------------------------------------------------------
+
+    def scan(self, sources):
+        """Sample timestamps from the new lines of ``sources`` (``[(path, lines)]`` in batch order)."""
+        pending = PendingBatch()
+        base = 0
+        for source_no, (path, lines) in enumerate(sources):
+            pending.sources.append({"path": path, "lines": len(lines), "base": base})
+            base += len(lines)
+            start, offset = self._indexed.get(path, (0, 0))
+            if len(lines) < start:  # truncated or rotated: index from the top again
+                start, offset = 0, 0
+            last_ts = None
+            next_sample = start
+            # Iterated, not indexed: rotated archives are re-decompressed streams (rotated.ArchiveLines)
+            for leaf, line in enumerate(itertools.islice(lines, start, None), start):
+                if leaf >= next_sample or leaf == len(lines) - 1:
+                    ts = parse_ts(line)
+                    if ts is not None:
+                        last_ts = ts
+                        pending.entries.append((ts, source_no, leaf, offset))
+                        next_sample = leaf + self.stride
+                    elif leaf == len(lines) - 1 and last_ts is not None:
+                        pending.entries.append((last_ts, source_no, leaf, offset))
+                offset += len(line.encode())
+            pending.marks[path] = (len(lines), offset)
+        return pending
+
+    def commit(self, pending, batch_id, merkle_root, scheme, cid=None, source_roots=None, device_id=None):
+        """Record ``pending`` under the backend's ``batch_id``; returns the local batch number."""
+        roots = {s["path"]: s["root"] for s in source_roots or []}
+        record = {
+            "batch_id": batch_id,
+            "device_id": device_id,
+            "merkle_root": merkle_root,
+            "scheme": scheme,
+            "cid": cid,
+            "created": int(time.time() * 1000),
+            "sources": [dict(s, root=roots.get(s["path"])) for s in pending.sources],
+        }
+        with open(self._records, "ab") as f:
+            start = f.tell()
+            f.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+        with open(self._offsets, "ab") as f:
+            batch_no = f.tell() // OFFSET.size
+            f.write(OFFSET.pack(start))
+
+        by_day = {}
+        for ts, source_no, leaf, offset in pending.entries:
+            by_day.setdefault(ts // DAY_MS, []).append(ENTRY.pack(ts, batch_no, source_no, leaf, offset))
+        for day, packed in by_day.items():
+            with open(self._day_path(day), "ab") as f:
+                f.write(b"".join(packed))
+        self._indexed.update(pending.marks)
+        return batch_no
+
+    # --- read path -------------------------------------------------------
+
+    def _day_path(self, day):
+        return os.path.join(self.root, datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y-%m-%d") + ".idx")
+
+    def batch(self, batch_no):
+        with open(self._offsets, "rb") as f:
+            f.seek(batch_no * OFFSET.size)
+            (start,) = OFFSET.unpack(f.read(OFFSET.size))
+        with open(self._records, "rb") as f:
+            f.seek(start)
+            return json.loads(f.readline())
+
+    def _entries(self, start_ms, end_ms):
+        # One extra day on each side: the samples bounding a window may sit across midnight
+        for day in range(start_ms // DAY_MS - 1, end_ms // DAY_MS + 2):
+            path = self._day_path(day)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            yield from ENTRY.iter_unpack(data[: len(data) - len(data) % ENTRY.size])
+
+    def query(self, start_ms, end_ms, path_glob=None):
+        """Candidate ``(batch, file, leaf range)`` hits for lines timestamped in ``[start_ms, end_ms]``."""
+        groups = {}
+        for ts, batch_no, source_no, leaf, offset in self._entries(start_ms, end_ms):
+            groups.setdefault((batch_no, source_no), []).append((leaf, ts, offset))
+        hits = []
+        for (batch_no, source_no), samples in sorted(groups.items()):
+            samples.sort()
+            if samples[-1][1] < start_ms or samples[0][1] > end_ms:
+                continue
+            lo = samples[0]
+            for sample in samples:
+                if sample[1] < start_ms:
+                    lo = sample
+            hi = next((leaf for leaf, ts, _ in samples if ts > end_ms and leaf > lo[0]), samples[-1][0] + 1)
+            record = self.batch(batch_no)
+            source = record["sources"][source_no]
+            if path_glob and not fnmatch.fnmatch(source["path"], path_glob):
+                continue
+            hits.append({
+                "batch_no": batch_no,
+                "batch_id": record["batch_id"],
+                "device_id": record.get("device_id"),
+                "path": source["path"],
+                "leaf_start": lo[0],
+                "leaf_end": hi,
+                "byte_offset": lo[2],
+            })
+        return hits
+
+    def prove(self, hit, start_ms, end_ms, store=None, log_dir=None):
+        """Exact lines of ``hit`` within the window, each with its inclusion proof.
+
+        Lines come from the local chunk store when it has the batch, otherwise
+        from the log file itself if it still hashes to the recorded file root.
+        """
+        record = self.batch(hit["batch_no"])
+        scheme = record["scheme"]
+        source = next(s for s in record["sources"] if s["path"] == hit["path"])
+        lines = None
+        if store is not None and record.get("cid") and store.has(record["cid"]):
+            if scheme == LEGACY_SCHEME:
+                lines = store.get_lines(record["cid"])
+            else:
+                lines = store.get_lines(record["cid"], source["base"], source["base"] + source["lines"])
+        elif log_dir and scheme != LEGACY_SCHEME and source.get("root"):
+            try:
+                with open_log(os.path.join(log_dir, source["path"])) as f:
+                    candidate = [f.readline() for _ in range(source["lines"])]
+                if compute_merkle_root(candidate, scheme) == source["root"]:
+                    lines = candidate
+            except OSError:
+                pass
+        if lines is None:
+            raise LookupError(f"Lines of {hit['path']} in batch {hit['batch_id']} are no longer available")
+
+        # Legacy batches are one flat tree over all files; v1 batches have a subtree per file
+        offset = source["base"] if scheme == LEGACY_SCHEME else 0
+        leaves = leaf_hashes(lines, scheme)
+        sources = [{"path": s["path"], "root": s["root"], "lines": s["lines"]} for s in record["sources"]]
+        path_proof = None if scheme == LEGACY_SCHEME else source_proof(sources, source["path"], scheme)
+        root = record["merkle_root"] if scheme == LEGACY_SCHEME else source["root"]
+        out = []
+        ts = None
+        for leaf in range(hit["leaf_start"], hit["leaf_end"]):
+            line = lines[offset + leaf]
+            ts = parse_ts(line) or ts
+            if ts is None or not start_ms <= ts <= end_ms:
+                continue
+            proof = proof_from_leaves(leaves, offset + leaf, scheme)
+            valid = verify_proof(line, proof, root, scheme) and (
+                path_proof is None
+                or verify_source_proof(source["path"], source["root"], source["lines"], path_proof, record["merkle_root"], scheme)
+            )
+            out.append({
+                "leaf": leaf,
+                "ts": ts,
+                "line": line,
+                "proof": proof,
+                "path": None if scheme == LEGACY_SCHEME else source["path"],
+                "valid": valid,
+            })
+        return {"batch_id": hit["batch_id"], "merkle_root": record["merkle_root"], "scheme": scheme,
+                "source_proof": path_proof, "lines": out}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find (and prove) the batches covering a time window")
+    parser.add_argument("--from", dest="start", required=True, help='e.g. "2024-05-02 14:02" (local) or unix seconds')
+    parser.add_argument("--to", dest="end", required=True)
+    parser.add_argument("--path", help="only files matching this glob (relative to LOG_DIR)")
+    parser.add_argument("--prove", action="store_true", help="resolve the exact lines and their inclusion proofs")
+    parser.add_argument("--index-dir", default=os.getenv("TIME_INDEX_DIR", "./timeindex"))
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", "./archive"))
+    parser.add_argument("--log-dir", default=os.getenv("LOG_DIR"))
+    args = parser.parse_args()
+
+    start_ms, end_ms = parse_when(args.start), parse_when(args.end)
+    index = TimeIndex(args.index_dir)
+    started = time.perf_counter()
+    hits = index.query(start_ms, end_ms, args.path)
+    result = {"hits": hits, "query_ms": round((time.perf_counter() - started) * 1000, 2)}
+    if args.prove:
+        from chunkstore import ChunkStore
+
+        store = ChunkStore(args.archive_dir) if os.path.isdir(args.archive_dir) else None
+        proofs = []
+        for hit in hits:
+            try:
+                proofs.append(index.prove(hit, start_ms, end_ms, store, args.log_dir))
+            except LookupError as e:
+                proofs.append({"batch_id": hit["batch_id"], "error": str(e)})
+        result["proofs"] = proofs
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
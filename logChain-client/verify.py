@@ -0,0 +1,313 @@
+"""Offline verifier: recompute batch roots from raw logs and compare with the backend and the chain.
+
+Two inputs are supported:
+
+``files``
+    log files as the agent read them (paths relative to ``--base``, i.e. the
+    agent's LOG_DIR). Each file is streamed through its own worker process,
+    so several files hash in parallel and memory stays at O(log n) nodes per
+    file whatever the file size. With ``--batch-id`` the result is compared
+    file by file with the batch's recorded source roots.
+``archive``
+    every batch in the agent's local chunk store (``ARCHIVE_DIR``) whose CID
+    the backend knows. Expected roots are fetched in bulk from
+    ``GET /batches/export``, and batches are re-hashed in parallel, a window
+    of lines at a time.
+
+With ``--rpc`` and ``--contract`` the expected roots are also checked against
+the ``BatchAnchored`` event log of the contract (batches anchored through a
+device MMR checkpoint appear there only through the checkpoint root).
+
+    python verify.py files --batch-id 6650... --base /var/log syslog nginx/access.log
+    python verify.py archive --archive-dir ./archive --start 2024-05-01 --rpc $RPC --contract 0x...
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+
+from merkle import DEFAULT_SCHEME, LEGACY_SCHEME, StreamingRoot, compute_batch_root
+from rotated import open_log
+
+# keccak256("BatchAnchored(address,bytes32,string,string,uint256,uint256)")
+BATCH_ANCHORED_TOPIC = "0x6315f673e00df458506c4ba242ab8b4b391081a2de5fdd0be1eb9958e6ef7a50"
+WINDOW_LINES = 65536  # lines read from the chunk store at a time
+
+
+# --- hashing (runs in worker processes) ------------------------------------
+
+def _read_lines(path):
+    # Same decoding (and decompression of rotated .gz/.xz/.zst) as the agent's read_sources
+    return open_log(path)
+
+
+def file_root(path, name, scheme):
+    """Stream one file into its Merkle root: ``(name, root, lines, bytes, seconds)``."""
+    started = time.perf_counter()
+    tree = StreamingRoot(scheme)
+    with _read_lines(path) as f:
+        tree.update(f)
+    return name, tree.root(), tree.count, os.path.getsize(path), time.perf_counter() - started
+
+
+def flat_root(paths, scheme):
+    """Legacy batches are one tree over every file in order, so they hash sequentially."""
+    started = time.perf_counter()
+    tree = StreamingRoot(scheme)
+    size = 0
+    for path in paths:
+        with _read_lines(path) as f:
+            tree.update(f)
+        size += os.path.getsize(path)
+    return tree.root(), tree.count, size, time.perf_counter() - started
+
+
+def archived_root(archive_dir, batch):
+    """Recompute an archived batch's root from the chunk store, a window of lines at a time."""
+    from chunkstore import ChunkStore
+
+    started = time.perf_counter()
+    store = ChunkStore(archive_dir, cache_size=4)
+    cid, scheme = batch["ipfs_cid"], batch.get("merkle_scheme") or LEGACY_SCHEME
+    total = store.manifest(cid)["lines"]
+    sources = batch.get("sources")
+    # One streaming tree per source (v1 per-file batches) or a single flat tree
+    bounds = []
+    if sources and scheme != LEGACY_SCHEME:
+        start = 0
+        for src in sources:
+            bounds.append((src["path"], start, start + src["lines"]))
+            start += src["lines"]
+    else:
+        bounds.append((None, 0, total))
+    roots = []
+    size = 0
+    for path, lo, hi in bounds:
+        tree = StreamingRoot(scheme)
+        for pos in range(lo, hi, WINDOW_LINES):
+            lines = store.get_lines(cid, pos, min(hi, pos + WINDOW_LINES))
+            size += sum(len(line.encode()) for line in lines)
+            tree.update(lines)
+        roots.append({"path": path, "root": tree.root(), "lines": tree.count})
+    root = roots[0]["root"] if roots[0]["path"] is None else compute_batch_root(roots, scheme)
+    return batch, root, total, size, time.perf_counter() - started
+
+
+def bounded_map(pool, fn, items, window):
+    """``pool.submit`` over ``items`` with at most ``window`` tasks in flight (keeps memory flat)."""
+    pending = set()
+    for item in items:
+        pending.add(pool.submit(fn, *item))
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in pending:
+        yield future.result()
+
+
+# --- expected roots ---------------------------------------------------------
+
+class Api:
+    def __init__(self, base_url, token=None, email=None, password=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+        if not token and email and password:
+            res = self.session.post(f"{self.base_url}/login", data={"username": email, "password": password}, timeout=10)
+            res.raise_for_status()
+            token = res.json()["access_token"]
+        if not token:
+            raise SystemExit("Set LOGCHAIN_TOKEN or CLIENT_EMAIL/CLIENT_PASSWORD (or pass --token)")
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def get(self, path, **params):
+        res = self.session.get(f"{self.base_url}{path}", params=params, timeout=30)
+        res.raise_for_status()
+        return res.json()
+
+    def export(self, **params):
+        """Stream the batch history (NDJSON) without holding it in memory."""
+        params = {k: v for k, v in params.items() if v is not None}
+        with self.session.get(f"{self.base_url}/batches/export", params=params, stream=True, timeout=60) as res:
+            res.raise_for_status()
+            for line in res.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+
+def chain_roots(rpc_url, contract, from_block=0, step=10_000):
+    """Every root in the contract's ``BatchAnchored`` events, via chunked ``eth_getLogs``."""
+    session = requests.Session()
+
+    def call(method, params):
+        res = session.post(rpc_url, json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params}, timeout=60)
+        res.raise_for_status()
+        body = res.json()
+        if body.get("error"):
+            raise RuntimeError(f"{method}: {body['error']}")
+        return body["result"]
+
+    roots = set()
+    latest = int(call("eth_blockNumber", []), 16)
+    for start in range(from_block, latest + 1, step):
+        logs = call("eth_getLogs", [{
+            "address": contract,
+            "topics": [BATCH_ANCHORED_TOPIC],
+            "fromBlock": hex(start),
+            "toBlock": hex(min(latest, start + step - 1)),
+        }])
+        roots.update(log["topics"][2].lower() for log in logs)
+    return roots
+
+
+# --- reporting ---------------------------------------------------------------
+
+class Report:
+    def __init__(self, onchain=None):
+        self.onchain = onchain
+        self.items = []
+        self.lines = 0
+        self.bytes = 0
+        self.cpu_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def add(self, item, lines, size, seconds, expected=None):
+        self.lines += lines
+        self.bytes += size
+        self.cpu_seconds += seconds
+        if expected is not None:
+            item["status"] = "ok" if item["root"].lower() == expected.lower() else "mismatch"
+            item["expected"] = expected
+            if self.onchain is not None:
+                item["on_chain"] = expected.lower() in self.onchain
+        self.items.append(item)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "checked": len(self.items),
+            "mismatches": sum(1 for i in self.items if i.get("status") == "mismatch"),
+            "missing": sum(1 for i in self.items if i.get("status") == "missing"),
+            "lines": self.lines,
+            "bytes": self.bytes,
+            "seconds": round(elapsed, 3),
+            "mb_per_sec": round(self.bytes / elapsed / 1e6, 2) if elapsed else None,
+            "lines_per_sec": round(self.lines / elapsed) if elapsed else None,
+            "parallel_speedup": round(self.cpu_seconds / elapsed, 2) if elapsed else None,
+        }
+
+
+def verify_files(args, api, report):
+    expected = None
+    scheme = args.scheme
+    if args.batch_id:
+        batch = api.get(f"/batches/{args.batch_id}")
+        scheme = scheme or batch.get("merkle_scheme") or LEGACY_SCHEME
+        expected = {"root": batch["merkle_root"], "sources": api.get(f"/batches/{args.batch_id}/sources")["sources"]}
+    scheme = scheme or DEFAULT_SCHEME
+
+    base = args.base or os.getcwd()
+    names = {os.path.relpath(os.path.abspath(p), base).replace(os.sep, "/"): p for p in args.files}
+    ordered = sorted(names, key=str.encode)
+    if scheme == LEGACY_SCHEME:
+        root, lines, size, seconds = flat_root([names[n] for n in ordered], scheme)
+        report.add({"batch_id": args.batch_id, "root": root}, lines, size, seconds, expected and expected["root"])
+        return
+
+    sources = []
+    recorded = {s["path"]: s for s in (expected or {}).get("sources", [])}
+    with ProcessPoolExecutor(args.workers) as pool:
+        for name, root, lines, size, seconds in bounded_map(
+            pool, file_root, [(names[n], n, scheme) for n in ordered], args.workers * 2
+        ):
+            sources.append({"path": name, "root": root, "lines": lines})
+            want = recorded.get(name)
+            item = {"path": name, "root": root, "lines": lines}
+            if expected is not None and want is None:
+                item["status"] = "not_in_batch"
+            report.add(item, lines, size, seconds, want and want["root"])
+    if expected is not None:
+        for path in set(recorded) - set(names):
+            report.items.append({"path": path, "status": "missing"})
+        batch_root = compute_batch_root(sources, scheme)
+        report.items.append({
+            "batch_id": args.batch_id,
+            "root": batch_root,
+            "expected": expected["root"],
+            "status": "ok" if batch_root and batch_root.lower() == expected["root"].lower() else "mismatch",
+            **({"on_chain": expected["root"].lower() in report.onchain} if report.onchain is not None else {}),
+        })
+
+
+def verify_archive(args, api, report):
+    from chunkstore import ChunkStore
+
+    store = ChunkStore(args.archive_dir)
+
+    def batches():
+        for batch in api.export(device_id=args.device_id, start=args.start, end=args.end, include_archived="true"):
+            if not batch.get("ipfs_cid") or not store.has(batch["ipfs_cid"]):
+                continue
+            if batch.get("source_count"):
+                batch["sources"] = api.get(f"/batches/{batch['id']}/sources")["sources"]
+            yield args.archive_dir, batch
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        for batch, root, lines, size, seconds in bounded_map(pool, archived_root, batches(), args.workers * 2):
+            item = {"batch_id": batch["id"], "device_id": batch.get("device_id"), "root": root, "lines": lines}
+            report.add(item, lines, size, seconds, batch["merkle_root"])
+            if args.progress:
+                s = report.summary()
+                print(f"\r{s['checked']} batches, {s['mb_per_sec']} MB/s, {s['mismatches']} mismatches",
+                      end="", file=sys.stderr, flush=True)
+    if args.progress:
+        print(file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute batch roots from raw logs and compare with the backend/chain")
+    parser.add_argument("--backend", default=os.getenv("BACKEND_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--token", default=os.getenv("LOGCHAIN_TOKEN"))
+    parser.add_argument("--email", default=os.getenv("CLIENT_EMAIL"))
+    parser.add_argument("--password", default=os.getenv("CLIENT_PASSWORD"))
+    parser.add_argument("--rpc", help="JSON-RPC URL to check roots against BatchAnchored events")
+    parser.add_argument("--contract", help="LogAnchor contract address (with --rpc)")
+    parser.add_argument("--from-block", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--progress", action="store_true")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    files = sub.add_parser("files", help="hash log files (optionally against one batch)")
+    files.add_argument("files", nargs="+")
+    files.add_argument("--batch-id", help="backend id of the batch these files make up")
+    files.add_argument("--base", default=os.getenv("LOG_DIR"), help="directory the paths are relative to (LOG_DIR)")
+    files.add_argument("--scheme", help=f"Merkle scheme (default: the batch's, else {DEFAULT_SCHEME})")
+
+    archive = sub.add_parser("archive", help="re-hash every batch in the local chunk store")
+    archive.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", "./archive"))
+    archive.add_argument("--device-id")
+    archive.add_argument("--start", help="ISO time")
+    archive.add_argument("--end", help="ISO time")
+    args = parser.parse_args()
+
+    onchain = chain_roots(args.rpc, args.contract, args.from_block) if args.rpc and args.contract else None
+    needs_api = args.command == "archive" or args.batch_id
+    api = Api(args.backend, args.token, args.email, args.password) if needs_api else None
+    report = Report(onchain)
+    if args.command == "files":
+        verify_files(args, api, report)
+    else:
+        verify_archive(args, api, report)
+
+    result = {"summary": report.summary(), "items": report.items}
+    print(json.dumps(result, indent=2))
+    bad = {"mismatch", "missing", "not_in_batch"}
+    sys.exit(1 if any(i.get("status") in bad for i in report.items) else 0)
+
+
+if __name__ == "__main__":
+    main()
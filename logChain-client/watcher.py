@@ -0,0 +1,218 @@
+"""Change detection for LOG_DIR.
+
+``changes()`` returns the set of files created, modified or rotated in since
+the previous call (everything on the first call), filtered by include and
+exclude globs matched against the path relative to the root. Subdirectories
+are tracked recursively. Files whose batch the backend did not accept are
+handed back with ``requeue()`` and reported again by the next ``changes()``.
+
+``InotifyWatcher`` uses Linux inotify through ctypes, so an idle host does no
+filesystem I/O between cycles. ``PollingWatcher`` is the portable fallback:
+it walks the tree and compares (size, mtime, inode) snapshots.
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import os
+import struct
+
+# inotify constants (<sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+               | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+
+WATCH_MODES = ("auto", "inotify", "poll")
+
+
+def parse_globs(value):
+    """Turn a comma-separated string (or list) of globs into a tuple."""
+    if not value:
+        return ()
+    if isinstance(value, str):
+        value = value.split(",")
+    return tuple(p.strip() for p in value if p.strip())
+
+
+class _BaseWatcher:
+    def __init__(self, root, include=("*",), exclude=()):
+        self.root = os.path.abspath(root)
+        self.include = tuple(include) or ("*",)
+        self.exclude = tuple(exclude)
+        self._primed = False
+        self._requeued = set()
+
+    def matches(self, path):
+        rel = os.path.relpath(path, self.root)
+        name = os.path.basename(path)
+        if any(fnmatch.fnmatch(rel, p) or fnmatch.fnmatch(name, p) for p in self.exclude):
+            return False
+        return any(fnmatch.fnmatch(rel, p) or fnmatch.fnmatch(name, p) for p in self.include)
+
+    def walk(self, on_error=None):
+        """Yield every matching regular file under root."""
+        for dirpath, dirnames, filenames in os.walk(self.root, onerror=on_error):
+            dirnames.sort()
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if self.matches(path) and os.path.isfile(path):
+                    yield path
+
+    def requeue(self, paths):
+        """Report ``paths`` as changed again on the next ``changes()``."""
+        self._requeued.update(paths)
+
+    def _take_requeued(self):
+        requeued = {p for p in self._requeued if os.path.isfile(p)}
+        self._requeued.clear()
+        return requeued
+
+    def close(self):
+        pass
+
+
+class PollingWatcher(_BaseWatcher):
+    """Detect changes by comparing (size, mtime_ns, inode) of every file."""
+
+    mode = "poll"
+
+    def __init__(self, root, include=("*",), exclude=()):
+        super().__init__(root, include, exclude)
+        self._snapshot = {}
+
+    def changes(self):
+        current = {}
+        for path in self.walk():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        changed = {p for p, sig in current.items() if self._snapshot.get(p) != sig}
+        self._snapshot = current
+        self._primed = True
+        return changed | self._take_requeued()
+
+
+class InotifyWatcher(_BaseWatcher):
+    """Recursive inotify watcher (Linux only); raises OSError if unavailable."""
+
+    mode = "inotify"
+
+    def __init__(self, root, include=("*",), exclude=()):
+        super().__init__(root, include, exclude)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wds = {}
+        self._pending = set()
+        self._overflow = False
+        try:
+            self._add_tree(self.root)
+        except OSError:
+            # e.g. fs.inotify.max_user_watches exhausted; let the caller fall back
+            self.close()
+            raise
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch failed for {path}: {os.strerror(err)}")
+        self._wds[wd] = path
+
+    def _add_tree(self, path):
+        """Watch ``path`` and every directory below it; returns files found."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            self._add_watch(dirpath)
+            found.extend(os.path.join(dirpath, f) for f in filenames)
+        return found
+
+    def _read_events(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self._overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self._wds.pop(wd, None)
+                    continue
+                directory = self._wds.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # New (or rotated-in) directory: watch it and pick up its files
+                        try:
+                            self._pending.update(self._add_tree(path))
+                        except OSError:
+                            self._overflow = True
+                    continue
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._pending.discard(path)
+                else:
+                    self._pending.add(path)
+
+    def changes(self):
+        if not self._primed:
+            self._primed = True
+            self._read_events()
+            self._pending.clear()
+            self._requeued.clear()
+            return set(self.walk())
+        self._read_events()
+        if self._overflow:
+            # Kernel queue overflowed; we may have missed events, rescan once
+            self._overflow = False
+            self._pending.clear()
+            self._requeued.clear()
+            return set(self.walk())
+        changed = {p for p in self._pending if self.matches(p) and os.path.isfile(p)}
+        self._pending.clear()
+        return changed | self._take_requeued()
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(root, include=("*",), exclude=(), mode="auto"):
+    """Return an inotify watcher when possible (``auto``), else a polling one."""
+    if mode not in WATCH_MODES:
+        raise ValueError(f"Unknown watch mode: {mode}")
+    if mode in ("auto", "inotify"):
+        try:
+            return InotifyWatcher(root, include, exclude)
+        except (OSError, AttributeError):
+            if mode == "inotify":
+                raise
+    return PollingWatcher(root, include, exclude)